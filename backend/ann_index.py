@@ -0,0 +1,315 @@
+"""
+Approximate nearest neighbour index for large local corpora
+IVF (inverted file) coarse quantizer with product-quantized residuals
+"""
+
+from typing import List, Dict, Optional, Tuple
+from pathlib import Path
+import json
+import os
+
+import numpy as np
+
+
+def kmeans(
+    data: np.ndarray,
+    k: int,
+    iterations: int = 10,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Lloyd's k-means using squared L2 distance
+    
+    Args:
+        data: Training vectors, shape (n, d)
+        k: Number of centroids
+        iterations: Number of refinement passes
+        seed: Random seed for initialisation
+    
+    Returns:
+        Centroids, shape (k, d)
+    """
+    rng = np.random.default_rng(seed)
+    n = len(data)
+    k = min(k, n)
+    centroids = data[rng.choice(n, size=k, replace=False)].copy()
+    data_sq = (data * data).sum(axis=1)
+    
+    for _ in range(iterations):
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2; ||x||^2 doesn't affect argmin
+        distances = (centroids * centroids).sum(axis=1) - 2 * data @ centroids.T
+        assignment = distances.argmin(axis=1)
+        
+        counts = np.bincount(assignment, minlength=k)
+        order = np.argsort(assignment, kind='stable')
+        present, starts = np.unique(assignment[order], return_index=True)
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(data[order], starts, axis=0)
+        
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            # Re-seed empty clusters with the points farthest from their centroid
+            worst = np.argsort(data_sq + distances[np.arange(n), assignment])[-empty.sum():]
+            centroids[empty] = data[worst]
+    
+    return centroids.astype(np.float32)
+
+
+class IVFPQIndex:
+    """
+    Inverted-file index with product quantization (IVF-PQ)
+    
+    Vectors are assigned to the nearest of `nlist` coarse centroids and the
+    residual is compressed to `pq_m` one-byte codes. A query scores only the
+    `nprobe` closest lists, using a per-query lookup table so each candidate
+    costs `pq_m` table reads. Scores approximate the inner product, which is
+    cosine similarity for normalized inputs.
+    
+    Labels are string ids; deletes are tombstones that are dropped the next
+    time the affected list is rewritten.
+    """
+    
+    def __init__(
+        self,
+        dimension: int,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        pq_m: int = 64
+    ):
+        if dimension % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide dimension={dimension}")
+        
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.dsub = dimension // pq_m
+        
+        self.centroids: Optional[np.ndarray] = None  # (nlist, d)
+        self.codebooks: Optional[np.ndarray] = None  # (pq_m, 256, dsub)
+        self._centroid_sq_cache: Optional[np.ndarray] = None
+        self._codes: List[np.ndarray] = []           # per list, (len, pq_m) uint8
+        self._labels: List[np.ndarray] = []          # per list, (len,) int64
+        
+        self._ids: List[str] = []
+        self._label_of: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+    
+    @property
+    def count(self) -> int:
+        return int(self._alive.sum())
+    
+    def train(self, vectors: np.ndarray, max_samples: int = 65536, seed: int = 0):
+        """
+        Learn coarse centroids and PQ codebooks from a sample of vectors
+        
+        Args:
+            vectors: Normalized float32 vectors, shape (n, d)
+            max_samples: Cap on the training sample size
+            seed: Random seed
+        """
+        rng = np.random.default_rng(seed)
+        if len(vectors) > max_samples:
+            vectors = vectors[rng.choice(len(vectors), size=max_samples, replace=False)]
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        
+        self.nlist = min(self.nlist, max(1, len(vectors) // 39))
+        self.centroids = kmeans(vectors, self.nlist, seed=seed)
+        self.nlist = len(self.centroids)
+        self._centroid_sq_cache = None
+        
+        residuals = vectors - self.centroids[self._assign(vectors)]
+        residuals = residuals.reshape(len(vectors), self.pq_m, self.dsub)
+        self.codebooks = np.zeros((self.pq_m, 256, self.dsub), dtype=np.float32)
+        for j in range(self.pq_m):
+            sub = np.ascontiguousarray(residuals[:, j, :])
+            book = kmeans(sub, 256, iterations=8, seed=seed + j)
+            self.codebooks[j, :len(book)] = book
+        
+        self._codes = [np.zeros((0, self.pq_m), dtype=np.uint8) for _ in range(self.nlist)]
+        self._labels = [np.zeros(0, dtype=np.int64) for _ in range(self.nlist)]
+    
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """
+        Insert (or replace) vectors; the index must be trained
+        
+        Args:
+            ids: Vector ids, one per row
+            vectors: Normalized float32 vectors, shape (n, d)
+        """
+        if not self.is_trained:
+            raise RuntimeError("IVFPQIndex.add called before train")
+        if not len(ids):
+            return
+        
+        self.remove(ids)
+        
+        start = len(self._ids)
+        labels = np.arange(start, start + len(ids), dtype=np.int64)
+        for vector_id, label in zip(ids, labels):
+            self._label_of[vector_id] = int(label)
+        self._ids.extend(ids)
+        self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+        
+        vectors = np.asarray(vectors, dtype=np.float32)
+        lists = self._assign(vectors)
+        codes = self._encode(vectors - self.centroids[lists])
+        
+        order = np.argsort(lists, kind='stable')
+        boundaries = np.flatnonzero(np.diff(lists[order])) + 1
+        for group in np.split(order, boundaries):
+            target = int(lists[group[0]])
+            keep = self._alive[self._labels[target]]
+            self._codes[target] = np.concatenate([self._codes[target][keep], codes[group]])
+            self._labels[target] = np.concatenate([self._labels[target][keep], labels[group]])
+    
+    def remove(self, ids: List[str]) -> int:
+        """Tombstone vectors by id, returning how many were present"""
+        removed = 0
+        for vector_id in ids:
+            label = self._label_of.pop(vector_id, None)
+            if label is not None:
+                self._alive[label] = False
+                removed += 1
+        return removed
+    
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Approximate top-k by inner product
+        
+        Args:
+            query: Normalized float32 query vector
+            k: Number of results
+            nprobe: Lists to scan (defaults to self.nprobe); higher is
+                slower but more accurate
+        
+        Returns:
+            List of (id, approximate score), best first
+        """
+        if not self.is_trained or k <= 0:
+            return []
+        
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        coarse = self.centroids @ query
+        # Probe by L2 distance (how vectors were assigned), score by inner product
+        distances = self._centroid_sq - 2 * coarse
+        probe = np.argpartition(distances, nprobe - 1)[:nprobe]
+        
+        # lut[j, c] = <query_j, codebook_j[c]>, flattened for a single gather
+        lut = np.einsum('jcd,jd->jc', self.codebooks, query.reshape(self.pq_m, self.dsub))
+        lut = lut.ravel()
+        offsets = np.arange(self.pq_m, dtype=np.intp) * 256
+        
+        scores = []
+        labels = []
+        for target in probe:
+            codes = self._codes[target]
+            if not len(codes):
+                continue
+            scores.append(coarse[target] + lut[codes + offsets].sum(axis=1))
+            labels.append(self._labels[target])
+        
+        if not scores:
+            return []
+        
+        scores = np.concatenate(scores)
+        labels = np.concatenate(labels)
+        alive = self._alive[labels]
+        scores, labels = scores[alive], labels[alive]
+        if not len(scores):
+            return []
+        
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[labels[i]], float(scores[i])) for i in top]
+    
+    def save(self, path: Path):
+        """Persist the trained index to a directory"""
+        if not self.is_trained:
+            return
+        
+        path.mkdir(parents=True, exist_ok=True)
+        sizes = np.array([len(labels) for labels in self._labels], dtype=np.int64)
+        arrays_tmp = path / "ann.tmp.npz"
+        meta_tmp = path / "ann.tmp.json"
+        
+        with open(arrays_tmp, 'wb') as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                codebooks=self.codebooks,
+                sizes=sizes,
+                codes=np.concatenate(self._codes),
+                labels=np.concatenate(self._labels),
+                alive=self._alive
+            )
+        with open(meta_tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'dimension': self.dimension,
+                'nlist': self.nlist,
+                'nprobe': self.nprobe,
+                'pq_m': self.pq_m,
+                'ids': self._ids
+            }, f)
+        
+        os.replace(arrays_tmp, path / "ann.npz")
+        os.replace(meta_tmp, path / "ann.json")
+    
+    @classmethod
+    def load(cls, path: Path, nprobe: Optional[int] = None) -> Optional["IVFPQIndex"]:
+        """Load an index saved with save(), or None if there isn't one"""
+        if not (path / "ann.npz").exists():
+            return None
+        
+        with open(path / "ann.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = np.load(path / "ann.npz")
+        
+        index = cls(meta['dimension'], meta['nlist'], nprobe or meta['nprobe'], meta['pq_m'])
+        index.centroids = arrays['centroids']
+        index.codebooks = arrays['codebooks']
+        bounds = np.concatenate([[0], np.cumsum(arrays['sizes'])])
+        codes, labels = arrays['codes'], arrays['labels']
+        index._codes = [codes[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        index._labels = [labels[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        index._alive = arrays['alive']
+        index._ids = meta['ids']
+        index._label_of = {
+            vector_id: label
+            for label, vector_id in enumerate(index._ids)
+            if index._alive[label]
+        }
+        return index
+    
+    @property
+    def _centroid_sq(self) -> np.ndarray:
+        if self._centroid_sq_cache is None:
+            self._centroid_sq_cache = (self.centroids * self.centroids).sum(axis=1)
+        return self._centroid_sq_cache
+    
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Nearest coarse centroid for each vector"""
+        distances = self._centroid_sq - 2 * vectors @ self.centroids.T
+        return distances.argmin(axis=1)
+    
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        """Product-quantize residual vectors to (n, pq_m) uint8 codes"""
+        n = len(residuals)
+        residuals = residuals.reshape(n, self.pq_m, self.dsub)
+        codes = np.empty((n, self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            book = self.codebooks[j]
+            distances = (book * book).sum(axis=1) - 2 * residuals[:, j, :] @ book.T
+            codes[:, j] = distances.argmin(axis=1)
+        return codes
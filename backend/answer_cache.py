@@ -0,0 +1,243 @@
+"""
+Semantic cache for generated answers
+Reuses an answer when a new question is a near-duplicate (by embedding
+similarity) of an earlier one that retrieved exactly the same chunks;
+optionally backed by SQLite so worker processes share answers
+"""
+
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import itertools
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import settings
+from models import ChatResponse
+
+# How long a lookup waits for another process's write before counting as a
+# miss. The cache is read on the event loop, so it must never wait long.
+_BUSY_TIMEOUT = 0.05
+
+
+def context_key(chunks: List[Dict]) -> str:
+    """
+    Fingerprint of the retrieved chunks: their ids plus a hash of their text
+    
+    Hashing the text means an answer is invalidated as soon as
+    load_documents re-ingests a document with different content, even
+    though the vector ids stay the same.
+    """
+    digest = hashlib.sha256()
+    for chunk in sorted(chunks, key=lambda c: c['id']):
+        digest.update(chunk['id'].encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(hashlib.sha256(chunk['content'].encode('utf-8')).digest())
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """
+    Bounded LRU of (question embedding, context key) -> ChatResponse
+    
+    With a path, answers are also written to a SQLite table. A memory miss
+    then checks the answers other processes stored for the same context
+    key, so every worker benefits from an answer generated by any of them.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        path: Optional[str] = None
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._ids = itertools.count()
+        # entry id -> (context key, unit vector, response, created)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # context key -> entry ids, so lookups only score comparable entries
+        self._by_context: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.busy = 0
+        
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=_BUSY_TIMEOUT)
+            # WAL: other workers keep reading while one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "context_key TEXT NOT NULL, vector BLOB NOT NULL, response TEXT NOT NULL, "
+                "created REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS answers_context ON answers (context_key)"
+            )
+            self._db.commit()
+    
+    def lookup(
+        self,
+        query_embedding: List[float],
+        key: str,
+        stale: bool = False
+    ) -> Optional[ChatResponse]:
+        """
+        Find a cached answer for a similar question over the same chunks
+        
+        Args:
+            query_embedding: Embedding of the new question
+            key: context_key() of the chunks retrieved for it
+            stale: Also accept entries past their TTL (while the LLM is unavailable)
+        
+        Returns:
+            The cached response with a fresh timestamp, or None
+        """
+        query = self._unit(query_embedding)
+        now = time.time()
+        max_age = float("inf") if stale else self.ttl_seconds
+        
+        with self._lock:
+            candidates = [
+                entry_id for entry_id in self._by_context.get(key, [])
+                if now - self._entries[entry_id][3] <= max_age
+            ]
+            response = None
+            if candidates:
+                vectors = np.stack([self._entries[entry_id][1] for entry_id in candidates])
+                scores = vectors @ query
+                best = int(scores.argmax())
+                if scores[best] >= self.threshold:
+                    entry_id = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    response = self._entries[entry_id][2]
+            
+            if response is None and self._db is not None:
+                response = self._lookup_shared(query, key, now - max_age)
+                if response is not None:
+                    self.disk_hits += 1
+            
+            if response is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return response.model_copy(
+                update={"timestamp": datetime.utcnow().isoformat()}
+            )
+    
+    def store(self, query_embedding: List[float], key: str, response: ChatResponse):
+        """Remember a successful response for later near-duplicate questions"""
+        vector = self._unit(query_embedding)
+        created = time.time()
+        
+        with self._lock:
+            self._remember(key, vector, response, created)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT INTO answers (context_key, vector, response, created) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, vector.tobytes(), response.model_dump_json(), created)
+                    )
+                    # Expired rows, and the oldest beyond max_entries (rowids only grow)
+                    self._db.execute(
+                        "DELETE FROM answers WHERE created < ? OR rowid <= "
+                        "(SELECT MAX(rowid) FROM answers) - ?",
+                        (created - self.ttl_seconds, self.max_entries)
+                    )
+                    self._db.commit()
+                except sqlite3.OperationalError:
+                    # Database busy in another process: keep the answer in memory only
+                    self._db.rollback()
+                    self.busy += 1
+    
+    def clear(self):
+        """Drop every cached answer, in memory and on disk"""
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answers")
+                self._db.commit()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "busy": self.busy,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def _lookup_shared(self, query: np.ndarray, key: str, since: float) -> Optional[ChatResponse]:
+        """Best answer stored since `since` for the context key by any process (lock held)"""
+        try:
+            rows = [
+                row for row in self._db.execute(
+                    "SELECT vector, response, created FROM answers "
+                    "WHERE context_key = ? AND created >= ?",
+                    (key, since)
+                )
+                if len(row[0]) == query.nbytes  # Skip answers cached under another embedding model
+            ]
+        except sqlite3.OperationalError:
+            self.busy += 1
+            return None
+        if not rows:
+            return None
+        
+        vectors = np.stack([np.frombuffer(row[0], dtype=np.float32) for row in rows])
+        scores = vectors @ query
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None
+        
+        response = ChatResponse.model_validate_json(rows[best][1])
+        self._remember(key, vectors[best], response, rows[best][2])
+        return response
+    
+    def _remember(self, key: str, vector: np.ndarray, response: ChatResponse, created: float):
+        """Insert into the memory tier, evicting least recently used (lock held)"""
+        entry_id = next(self._ids)
+        self._entries[entry_id] = (key, vector, response, created)
+        self._by_context.setdefault(key, []).append(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+    
+    def _evict(self, entry_id: int):
+        """Remove one entry from both indexes (lock held)"""
+        key = self._entries.pop(entry_id)[0]
+        siblings = self._by_context[key]
+        siblings.remove(entry_id)
+        if not siblings:
+            del self._by_context[key]
+    
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).astype(np.float32)
+
+
+# Global answer cache (disabled when ANSWER_CACHE_SIZE=0)
+answer_cache = AnswerCache(
+    threshold=settings.answer_cache_threshold,
+    max_entries=settings.answer_cache_size,
+    ttl_seconds=settings.answer_cache_ttl,
+    path=settings.answer_cache_path
+) if settings.answer_cache_size > 0 else None
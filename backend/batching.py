@@ -0,0 +1,166 @@
+"""
+Micro-batching of concurrent calls
+Collects the items that concurrent coroutines submit within a short
+window and hands them to one batched call, so N requests in flight cost
+one model pass or API call instead of N
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+import asyncio
+import logging
+import threading
+import weakref
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Window:
+    """Items waiting on one event loop for the next batch"""
+    
+    def __init__(self):
+        self.waiting: List[tuple] = []  # (items, future)
+        self.size = 0
+        self.timer = None
+        self.in_flight = 0  # Batches sent and not finished yet
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent submit() calls into batched run_batch() calls
+    
+    A batch is sent when `max_batch` items are waiting, or `max_wait`
+    seconds after the first of them arrived, whichever comes first. When
+    no batch is in flight the wait is skipped (callers arriving in the
+    same event-loop tick are still combined), so a lone request pays no
+    batching delay and batches only form under load. A submission larger
+    than max_batch is sent on its own.
+    Each caller gets the results for its own items, or the batch's
+    exception. When `isolate` says an exception may come from one
+    caller's input (a rejected item), each caller's items are retried on
+    their own, so one bad input does not fail everyone batched with it.
+    Batches run concurrently; callers bound the concurrency of run_batch
+    themselves (a thread pool, the resilience limiter).
+    """
+    
+    def __init__(
+        self,
+        run_batch: Callable[[List], Awaitable[Sequence]],
+        max_batch: int = 64,
+        max_wait: float = 0.002,
+        name: str = "batch",
+        isolate: Optional[Callable[[Exception], bool]] = None
+    ):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.isolate = isolate
+        # One window per event loop (worker threads may run their own loops)
+        self._windows: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Window]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self._running = set()  # Batch tasks, referenced until done so they are not collected
+        self.submissions = 0
+        self.items = 0
+        self.batches = 0
+        self.largest = 0
+        self.splits = 0
+    
+    async def submit(self, items: List) -> List:
+        """
+        Add items to the next batch and wait for their results
+        
+        Args:
+            items: Inputs for run_batch (at least one)
+        
+        Returns:
+            run_batch's results for these items, in order
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.submissions += 1
+            window = self._windows.get(loop)
+            if window is None:
+                window = self._windows[loop] = _Window()
+        
+        future = loop.create_future()
+        if window.size + len(items) > self.max_batch and window.waiting:
+            self._flush(loop)
+        window.waiting.append((items, future))
+        window.size += len(items)
+        
+        if window.size >= self.max_batch:
+            self._flush(loop)
+        elif window.timer is None:
+            delay = self.max_wait if window.in_flight else 0
+            window.timer = loop.call_later(delay, self._flush, loop)
+        return await future
+    
+    def stats(self) -> Dict:
+        """Batch counters for monitoring"""
+        return {
+            "submissions": self.submissions,
+            "batches": self.batches,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest,
+            "splits": self.splits,
+        }
+    
+    def _flush(self, loop: asyncio.AbstractEventLoop):
+        """Send everything waiting on this loop as one batch"""
+        window = self._windows[loop]
+        if window.timer is not None:
+            window.timer.cancel()
+            window.timer = None
+        waiting, window.waiting, window.size = window.waiting, [], 0
+        if waiting:
+            window.in_flight += 1
+            task = loop.create_task(self._run(waiting, window))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+    
+    async def _run(self, waiting: List[tuple], window: _Window):
+        batch = [item for items, _ in waiting for item in items]
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.largest = max(self.largest, len(batch))
+        try:
+            try:
+                results = await self.run_batch(batch)
+            except Exception as e:
+                logger.debug("%s batch of %d failed: %s", self.name, len(batch), e)
+                if len(waiting) > 1 and self.isolate is not None and self.isolate(e):
+                    await self._split(waiting)
+                    return
+                for _, future in waiting:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        finally:
+            window.in_flight -= 1
+        
+        start = 0
+        for items, future in waiting:
+            if not future.done():  # The caller may have been cancelled
+                future.set_result(list(results[start:start + len(items)]))
+            start += len(items)
+    
+    async def _split(self, waiting: List[tuple]):
+        """Retry each caller's items on their own, settling each with its own outcome"""
+        with self._lock:
+            self.splits += 1
+        outcomes = await asyncio.gather(
+            *(self.run_batch(items) for items, _ in waiting), return_exceptions=True
+        )
+        for (_, future), outcome in zip(waiting, outcomes):
+            if future.done():
+                continue
+            if isinstance(outcome, asyncio.CancelledError):
+                future.cancel()
+            elif isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(list(outcome))
@@ -0,0 +1,3 @@
+"""
+Offline benchmarks for the RAG backend (run from the backend directory)
+"""
@@ -0,0 +1,112 @@
+"""
+Recall@k vs. QPS: exact local index vs. IVF-PQ approximate index
+
+Uses synthetic 1536-dim vectors with low-rank cluster structure (closer
+to real embeddings than isotropic noise). No network access is needed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ann --vectors 50000 --queries 200
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.common import print_report
+
+
+def synthetic_embeddings(count: int, dimension: int, rank: int = 64, seed: int = 0) -> np.ndarray:
+    """Clustered vectors living near a random low-dimensional subspace"""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((rank, dimension)).astype(np.float32)
+    centers = rng.standard_normal((max(1, count // 200), rank)).astype(np.float32)
+    latent = centers[rng.integers(0, len(centers), count)]
+    latent += 0.5 * rng.standard_normal((count, rank)).astype(np.float32)
+    vectors = latent @ basis + 0.1 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fill(store, vectors: np.ndarray, per_document: int = 1000):
+    for start in range(0, len(vectors), per_document):
+        block = vectors[start:start + per_document]
+        chunks = [
+            {'content': '', 'word_count': 0, 'chunk_index': i}
+            for i in range(len(block))
+        ]
+        store.upsert_chunks(chunks, block, f"doc{start // per_document}")
+
+
+def measure(store, queries: np.ndarray, truth, k: int):
+    found = 0
+    start = time.perf_counter()
+    results = [store.search(query, top_k=k) for query in queries]
+    elapsed = time.perf_counter() - start
+    for expected, result in zip(truth, results):
+        found += len(expected & {r['id'] for r in result})
+    return {
+        "recall_at_k": round(found / (k * len(queries)), 4),
+        "qps": round(len(queries) / elapsed, 1),
+        "mean_latency_ms": round(elapsed / len(queries) * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 4, 10])
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+    os.environ.setdefault("PINECONE_API_KEY", "unused")
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ["LOCAL_INDEX_PATH"] = ""
+    os.environ["EMBEDDING_DIMENSION"] = str(args.dimension)
+    os.environ["ANN_NLIST"] = str(args.nlist)
+    os.environ["ANN_PQ_M"] = str(args.pq_m)
+    os.environ["ANN_MIN_VECTORS"] = str(min(args.vectors, 50000))
+
+    from config import settings
+    from local_index import LocalVectorStore
+
+    corpus = synthetic_embeddings(args.vectors + args.queries, args.dimension)
+    vectors, queries = corpus[:args.vectors], corpus[args.vectors:]
+    ids = np.array([f"doc{i // 1000}_{i % 1000}" for i in range(args.vectors)])
+    truth = [set(ids[np.argsort(-(vectors @ q))[:args.k]]) for q in queries]
+
+    exact = LocalVectorStore(mode="exact", dimension=args.dimension)
+    fill(exact, vectors)
+    report = {
+        "benchmark": "ann",
+        "vectors": args.vectors,
+        "dimension": args.dimension,
+        "k": args.k,
+        "exact": measure(exact, queries, truth, args.k),
+        "ivfpq": []
+    }
+    del exact
+
+    start = time.perf_counter()
+    approx = LocalVectorStore(mode="ivfpq", dimension=args.dimension)
+    fill(approx, vectors)
+    report["ivfpq_build_s"] = round(time.perf_counter() - start, 2)
+
+    for nprobe in args.nprobe:
+        approx.ann.nprobe = nprobe
+        for rerank in args.rerank:
+            settings.ann_rerank_factor = rerank
+            result = measure(approx, queries, truth, args.k)
+            report["ivfpq"].append({"nprobe": nprobe, "rerank_factor": rerank, **result})
+
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Concurrent /api/chat throughput: blocking pipeline vs. async pipeline
+
+Both variants run in a single uvicorn worker against local OpenAI and
+Pinecone stubs. The blocking variant reproduces the original handler,
+which called the synchronous clients from inside `async def chat`.
+
+Usage (from backend/):
+    python -m benchmarks.bench_async_chat --requests 200 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime
+
+from fastapi import FastAPI
+
+from benchmarks.common import chat_payloads, drive, print_report, seed_documents
+from benchmarks.stubs import (
+    StubServer,
+    configure_environment,
+    create_openai_stub,
+    create_pinecone_stub,
+)
+
+
+def build_blocking_app() -> FastAPI:
+    """The pre-async request path: sync clients called on the event loop"""
+    from models import ChatRequest, ChatResponse, SourceChunk
+    from openai_client import generate_answer, generate_embedding
+    from vector_store import vector_store
+
+    app = FastAPI()
+
+    @app.post("/api/chat", response_model=ChatResponse)
+    async def chat(request: ChatRequest):
+        question = request.question.strip()
+        query_embedding = generate_embedding(question)
+        chunks = [
+            chunk for chunk in vector_store.search(query_embedding=query_embedding, top_k=5)
+            if chunk['score'] >= 0.25
+        ]
+        context = "\n\n---\n\n".join(
+            f"[Source {i + 1}: {chunk['document_name']}]\n{chunk['content']}"
+            for i, chunk in enumerate(chunks)
+        )
+        answer = generate_answer(question=question, context=context, conversation_history=[])
+        return ChatResponse(
+            success=True,
+            answer=answer,
+            sources=[
+                SourceChunk(
+                    document_name=chunk['document_name'],
+                    chunk_text=chunk['content'],
+                    similarity=round(chunk['score'], 2)
+                )
+                for chunk in chunks
+            ],
+            timestamp=datetime.utcnow().isoformat()
+        )
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--embedding-latency", type=float, default=0.02)
+    parser.add_argument("--chat-latency", type=float, default=0.3)
+    parser.add_argument("--query-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    openai_stub = StubServer(create_openai_stub(
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency
+    )).start()
+    pinecone_stub = StubServer(create_pinecone_stub(query_latency=args.query_latency)).start()
+    configure_environment(openai_stub.url, pinecone_stub.url)
+    # Measure the pipeline itself, not the caches in front of it
+    os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+    os.environ["ANSWER_CACHE_SIZE"] = "0"
+
+    seed_documents()
+
+    from main import app as async_app
+
+    report = {
+        "benchmark": "async_chat",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "stub_latency_s": {
+            "embedding": args.embedding_latency,
+            "chat": args.chat_latency,
+            "query": args.query_latency
+        },
+        "results": {}
+    }
+    payloads = chat_payloads(args.requests)
+    for name, app in (("blocking", build_blocking_app()), ("async", async_app)):
+        with StubServer(app) as server:
+            report["results"][name] = asyncio.run(
+                drive(
+                    f"{server.url}/api/chat",
+                    payloads,
+                    args.concurrency,
+                    check=lambda response: response.json()["success"]
+                )
+            )
+
+    blocking = report["results"]["blocking"]["throughput_rps"]
+    if blocking:
+        report["speedup"] = round(report["results"]["async"]["throughput_rps"] / blocking, 2)
+
+    openai_stub.stop()
+    pinecone_stub.stop()
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
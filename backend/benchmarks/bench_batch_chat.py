@@ -0,0 +1,150 @@
+"""
+Question throughput: one /api/chat call per question vs. /api/chat/batch
+
+Both modes answer the same questions against local OpenAI and Pinecone
+stubs with at most --concurrency answers being generated at once. Single
+mode pays one embeddings request and one vector query per question;
+batch mode pays one embeddings request per batch and searches it
+together. Batch mode keeps --parallel-batches requests in flight, each
+limited to concurrency / parallel-batches generations, so retrieval for
+one batch overlaps generation for another.
+
+Usage (from backend/):
+    python -m benchmarks.bench_batch_chat --questions 512 --batch-size 64 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.common import QUESTIONS, chat_payloads, drive, print_report, seed_documents
+from benchmarks.stubs import (
+    StubServer,
+    configure_environment,
+    create_openai_stub,
+    create_pinecone_stub,
+)
+
+
+async def drive_batches(url: str, questions: int, batch_size: int, parallel_batches: int) -> dict:
+    """Send the questions as batches, `parallel_batches` requests at a time"""
+    items = [
+        {"question": f"{QUESTIONS[i % len(QUESTIONS)]} (variant {i})"}
+        for i in range(questions)
+    ]
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    limit = asyncio.Semaphore(parallel_batches)
+    answered = 0
+    errors = 0
+
+    async with httpx.AsyncClient(timeout=600) as client:
+        async def send(batch):
+            nonlocal answered, errors
+            async with limit:
+                response = await client.post(url, json={"items": batch})
+            if response.status_code != 200:
+                errors += len(batch)
+                return
+            for result in response.json()["results"]:
+                if result["success"]:
+                    answered += 1
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(batch) for batch in batches))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "questions": questions,
+        "batches": len(batches),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_s": round(answered / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Answers generated at once in both modes")
+    parser.add_argument("--parallel-batches", type=int, default=2)
+    parser.add_argument("--embedding-latency", type=float, default=0.15)
+    parser.add_argument("--chat-latency", type=float, default=0.3)
+    parser.add_argument("--query-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # Small vectors keep the in-process stubs' own CPU time out of the picture
+    openai_stub = StubServer(create_openai_stub(
+        dimension=256,
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency
+    )).start()
+    pinecone_stub = StubServer(create_pinecone_stub(
+        dimension=256,
+        query_latency=args.query_latency
+    )).start()
+    configure_environment(openai_stub.url, pinecone_stub.url)
+    os.environ["EMBEDDING_DIMENSION"] = "256"
+    # Distinct questions, and no caches, so every question does the full pipeline
+    os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+    os.environ["ANSWER_CACHE_SIZE"] = "0"
+    os.environ["CHAT_BATCH_CONCURRENCY"] = str(max(1, args.concurrency // args.parallel_batches))
+
+    seed_documents()
+
+    from main import app
+
+    calls = openai_stub.server.config.app.state.calls
+    report = {
+        "benchmark": "batch_chat",
+        "questions": args.questions,
+        "batch_size": args.batch_size,
+        "concurrency": args.concurrency,
+        "parallel_batches": args.parallel_batches,
+        "stub_latency_s": {
+            "embedding": args.embedding_latency,
+            "chat": args.chat_latency,
+            "query": args.query_latency
+        },
+        "results": {}
+    }
+
+    with StubServer(app) as server:
+        payloads = [
+            {**payload, "question": f"{payload['question']} (variant {i})"}
+            for i, payload in enumerate(chat_payloads(args.questions))
+        ]
+        before = calls["embeddings"]
+        single = asyncio.run(drive(
+            f"{server.url}/api/chat",
+            payloads,
+            args.concurrency,
+            check=lambda response: response.json()["success"]
+        ))
+        single["questions_per_s"] = single.pop("throughput_rps")
+        single["embedding_api_calls"] = calls["embeddings"] - before
+        report["results"]["single"] = single
+
+        before = calls["embeddings"]
+        batch = asyncio.run(drive_batches(
+            f"{server.url}/api/chat/batch", args.questions, args.batch_size, args.parallel_batches
+        ))
+        batch["embedding_api_calls"] = calls["embeddings"] - before
+        report["results"]["batch"] = batch
+
+    if single["questions_per_s"]:
+        report["speedup"] = round(batch["questions_per_s"] / single["questions_per_s"], 2)
+
+    openai_stub.stop()
+    pinecone_stub.stop()
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Chunker memory and throughput on large synthetic files
+
+Writes a synthetic text file, then chunks it once per method in a fresh
+subprocess so each run's peak RSS is measured in isolation. The
+in-memory chunkers read the whole file into a string first, as
+ingestion used to; the streaming chunkers read it through mmap.
+
+Usage (from backend/):
+    python -m benchmarks.bench_chunking --size-mb 200
+"""
+
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import print_report
+
+METHODS = ("words", "paragraphs", "stream_words", "stream_paragraphs", "stream_words_overlap")
+
+
+def write_corpus(path: Path, size_mb: int, seed: int = 0):
+    """Paragraphs of 20-200 words from a fixed vocabulary, written in blocks"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)] + ["Acme", "naïve", "café", "données"]
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            block = "\n\n".join(
+                " ".join(rng.choices(vocabulary, k=rng.randint(20, 200)))
+                for _ in range(200)
+            ) + "\n\n"
+            f.write(block)
+            written += len(block.encode("utf-8"))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+def run_method(method: str, path: Path, words: int, overlap: int) -> dict:
+    """Chunk the file with one method, touching every chunk (child process)"""
+    from chunking import (
+        chunk_text_by_paragraphs,
+        chunk_text_by_words,
+        iter_paragraph_chunks,
+        iter_word_chunks,
+    )
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if method == "words":
+        chunks = chunk_text_by_words(path.read_text(encoding="utf-8"), words)
+    elif method == "paragraphs":
+        chunks = chunk_text_by_paragraphs(path.read_text(encoding="utf-8"), words)
+    elif method == "stream_words":
+        chunks = iter_word_chunks(path, words)
+    elif method == "stream_paragraphs":
+        chunks = iter_paragraph_chunks(path, words)
+    else:
+        chunks = iter_word_chunks(path, words, overlap)
+
+    count = 0
+    total_words = 0
+    for chunk in chunks:
+        count += 1
+        total_words += chunk["word_count"]
+    elapsed = time.perf_counter() - start
+
+    size_mb = path.stat().st_size / (1024 * 1024)
+    return {
+        "chunks": count,
+        "words": total_words,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(size_mb / elapsed, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_over_baseline_mb": round(peak_rss_mb() - baseline, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--words", type=int, default=512)
+    parser.add_argument("--overlap", type=int, default=64)
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--worker", choices=METHODS, help=argparse.SUPPRESS)
+    parser.add_argument("--path", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_method(args.worker, args.path, args.words, args.overlap)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bench_chunking_") as workdir:
+        path = Path(workdir) / "corpus.txt"
+        write_corpus(path, args.size_mb)
+
+        results = {}
+        for method in args.methods:
+            output = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.bench_chunking",
+                    "--worker", method, "--path", str(path),
+                    "--words", str(args.words), "--overlap", str(args.overlap),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[method] = json.loads(output)
+
+        print_report({
+            "benchmark": "chunking",
+            "file_mb": round(path.stat().st_size / (1024 * 1024), 1),
+            "words_per_chunk": args.words,
+            "overlap": args.overlap,
+            "results": results,
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Pinecone query payload and latency, text in metadata vs. local content store
+
+Loads the same synthetic chunks into a stub Pinecone index twice: first
+with chunk text in the vector metadata, then with metadata slimmed to
+the filterable fields and text in the SQLite content store. Reports the
+query response size and PineconeVectorStore.search latency for both.
+The stub scores every vector in Python, which adds the same scan time
+to both runs; keep --chunks small to see the transfer and parsing cost.
+
+Usage (from backend/):
+    python -m benchmarks.bench_content_store --chunks 200 --words 512 --top-k 20
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import percentile, print_report
+from benchmarks.stubs import StubServer, configure_environment, create_pinecone_stub
+
+
+def measure(store, pinecone_url, queries, top_k, include_metadata):
+    """Response bytes of a raw query, and search() latencies in ms"""
+    response = httpx.post(f"{pinecone_url}/query", json={
+        "vector": queries[0], "topK": top_k, "includeMetadata": include_metadata
+    })
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        results = store.search(query, top_k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert len(results) == top_k and results[0]['content']
+    return {
+        "response_bytes": len(response.content),
+        "search_ms_p50": round(statistics.median(latencies), 2),
+        "search_ms_p95": round(percentile(latencies, 95), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--words", type=int, default=512)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=64)
+    args = parser.parse_args()
+
+    pinecone = StubServer(create_pinecone_stub(dimension=args.dimension, query_latency=0)).start()
+    configure_environment("http://127.0.0.1:9", pinecone.url)
+
+    from content_store import ContentStore
+    from vector_store import PineconeVectorStore
+
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    chunks = [
+        {
+            'content': " ".join(rng.choices(vocabulary, k=args.words)),
+            'word_count': args.words,
+            'chunk_index': i
+        }
+        for i in range(args.chunks)
+    ]
+    vectors = [[rng.gauss(0, 1) for _ in range(args.dimension)] for _ in chunks]
+    queries = [[rng.gauss(0, 1) for _ in range(args.dimension)] for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory(prefix="bench_content_store_") as workdir:
+        results = {}
+
+        full = PineconeVectorStore()
+        full.upsert_chunks(chunks, vectors, "synthetic.txt")
+        results["text_in_metadata"] = measure(full, pinecone.url, queries, args.top_k, True)
+
+        slim = PineconeVectorStore(ContentStore(str(Path(workdir) / "content.sqlite")))
+        slim.upsert_chunks(chunks, vectors, "synthetic.txt")  # Overwrites with slim metadata
+        results["content_store"] = measure(slim, pinecone.url, queries, args.top_k, False)
+
+    pinecone.stop()
+    print_report({
+        "benchmark": "content_store",
+        "chunks": args.chunks,
+        "words_per_chunk": args.words,
+        "top_k": args.top_k,
+        "results": results,
+        "payload_reduction": round(
+            results["text_in_metadata"]["response_bytes"] / results["content_store"]["response_bytes"], 1
+        ),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Document API: ingest cost per edit size, and what queries see meanwhile
+
+One --words document is uploaded through PUT /api/documents and then
+edited in steps of increasing size (one word, one paragraph, an append,
+scattered edits, an insertion at the start, a full rewrite). For each
+step the report gives the chunks re-embedded out of the total, the
+embeddings requests the OpenAI stub received and the job time, next to
+a full re-ingest of the same version (delete, then upload) for
+comparison; the embeddings stub takes --latency-per-chunk per text on
+top of its per-request latency. While each job runs, a reader keeps
+asking /api/chat about the document and counts responses whose sources
+mix chunks of the old and new versions (always 0 with the atomic
+version swap). The cost of the visibility check added to every
+retrieval is reported too.
+
+Usage (from backend/):
+    python -m benchmarks.bench_documents --words 100000 --latency-per-chunk 0.005
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import print_report
+from benchmarks.stubs import StubServer, configure_environment, create_openai_stub
+
+DOCUMENT = "handbook.txt"
+
+
+def edits(words: List[str], rng: random.Random) -> Dict[str, List[str]]:
+    """Successive versions of the document, keyed by the edit that produced them"""
+    vocabulary = [f"term{i}" for i in range(5000)]
+    versions = {}
+    current = list(words)
+
+    current[len(current) // 2] = "amended"
+    versions["one_word"] = list(current)
+
+    middle = len(current) // 3
+    current[middle:middle + 200] = rng.choices(vocabulary, k=200)
+    versions["one_paragraph"] = list(current)
+
+    current += rng.choices(vocabulary, k=len(current) // 50)
+    versions["append_2pct"] = list(current)
+
+    for position in range(0, len(current), len(current) // 10):
+        current[position] = "revised"
+    versions["scattered_10_words"] = list(current)
+
+    current = ["Preface", "added", "at", "the", "top."] + current
+    versions["insert_at_start"] = list(current)
+
+    versions["full_rewrite"] = rng.choices(vocabulary, k=len(current))
+    return versions
+
+
+def wait(client: httpx.Client, job: Dict) -> Dict:
+    """Poll a document job until it finishes"""
+    while True:
+        job = client.get(f"/api/documents/jobs/{job['job_id']}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+
+
+def replace(client: httpx.Client, text: str) -> Dict:
+    """PUT the document and wait for its job"""
+    response = client.put(f"/api/documents/{DOCUMENT}", files={"file": (DOCUMENT, text.encode())})
+    job = wait(client, response.json())
+    if job["status"] != "done":
+        raise RuntimeError(f"Document job failed: {job['error']}")
+    return job
+
+
+class Reader(threading.Thread):
+    """Asks about the document until stopped, counting mixed-version answers"""
+
+    def __init__(self, url: str, question: str, old: set, new: set):
+        super().__init__(daemon=True)
+        self.url = url
+        self.question = question
+        self.old = old - new  # Chunk texts only in the old version
+        self.new = new - old
+        self.stopped = threading.Event()
+        self.responses = 0
+        self.mixed = 0
+
+    def run(self):
+        with httpx.Client(base_url=self.url, timeout=60) as client:
+            while not self.stopped.is_set():
+                response = client.post("/api/chat", json={"question": self.question}).json()
+                texts = {source["chunk_text"] for source in response.get("sources") or []}
+                self.responses += 1
+                if texts & self.old and texts & self.new:
+                    self.mixed += 1
+
+
+def chunk_texts(text: str) -> set:
+    from ingestion import default_chunker
+    return {chunk["content"] for chunk in default_chunker(text.encode())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--words", type=int, default=100000, help="Words in the document")
+    parser.add_argument("--embedding-latency", default="lognormal:0.1,0.3")
+    parser.add_argument("--latency-per-chunk", type=float, default=0.005, help="Seconds per text embedded")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_documents_"))
+    openai_app = create_openai_stub(
+        embedding_latency=args.embedding_latency,
+        embedding_latency_per_input=args.latency_per_chunk,
+        chat_latency=0.01,
+        dimension=256
+    )
+    openai_stub = StubServer(openai_app).start()
+    configure_environment(openai_stub.url, "http://127.0.0.1:9")
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "EMBEDDING_DIMENSION": "256",
+        "LOCAL_INDEX_PATH": str(workdir / "local_index"),
+        "BM25_INDEX_PATH": str(workdir / "bm25_index"),
+        "INGEST_MANIFEST_PATH": str(workdir / "manifest.sqlite"),
+        "DOCUMENTS_DIR": str(workdir / "documents"),
+        "DOCUMENT_API_KEY": "bench",
+        "EMBEDDING_CACHE_SIZE": "0",
+        "ANSWER_CACHE_SIZE": "0",
+    })
+
+    from documents import document_manager
+    from main import app
+
+    rng = random.Random(args.seed)
+    words = rng.choices([f"term{i}" for i in range(5000)], k=args.words)
+    report = {
+        "benchmark": "documents",
+        "words": args.words,
+        "embedding_latency": args.embedding_latency,
+        "latency_per_chunk": args.latency_per_chunk,
+        "edits": {},
+    }
+
+    with StubServer(app) as server, httpx.Client(
+        base_url=server.url, headers={"X-API-Key": "bench"}, timeout=60
+    ) as client:
+        text = " ".join(words)
+        replace(client, text)
+
+        for name, version in edits(words, rng).items():
+            new_text = " ".join(version)
+            question = " ".join(version[:8])
+            reader = Reader(server.url, question, chunk_texts(text), chunk_texts(new_text))
+            reader.start()
+            job = replace(client, new_text)
+            reader.stopped.set()
+            reader.join()
+
+            # The same version ingested from scratch
+            wait(client, client.delete(f"/api/documents/{DOCUMENT}").json())
+            full = replace(client, new_text)
+
+            stats = job["stats"]
+            report["edits"][name] = {
+                "chunks_total": stats["chunks_total"],
+                "chunks_embedded": stats["chunks_embedded"],
+                "embedding_requests": stats["embedding_requests"],
+                "job_s": stats["elapsed_s"],
+                "full_reingest_chunks": full["stats"]["chunks_embedded"],
+                "full_reingest_requests": full["stats"]["embedding_requests"],
+                "full_reingest_s": full["stats"]["elapsed_s"],
+                "answers_during_job": reader.responses,
+                "mixed_version_answers": reader.mixed,
+            }
+            text = new_text
+
+        ids = [f"{DOCUMENT}_{i}@{i:012x}" for i in range(20)]
+        start = time.perf_counter()
+        for _ in range(1000):
+            document_manager.hidden(ids)
+        report["visibility_check_us"] = round((time.perf_counter() - start) * 1000, 1)
+
+    openai_stub.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Question embeddings under load: one request each vs. micro-batched requests
+
+C callers embed distinct questions back to back through
+generate_embedding_async, against the OpenAI stub (latency from
+--embedding-latency). Each batching window in --waits is compared with
+batching off, reporting latency percentiles, throughput, the embeddings
+requests the stub received and the mean batch size. --rate-limit caps
+the stub's embeddings requests per second (429 beyond that, retried by
+the resilience layer) to show the effect on rate-limit pressure.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embedding_batching --queries 2000 --concurrency 1 16 64 --waits 1 5 20
+    python -m benchmarks.bench_embedding_batching --concurrency 64 --rate-limit 100
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+from benchmarks.common import print_report, summarize
+from benchmarks.stubs import StubServer, configure_environment, create_openai_stub
+
+
+async def run_load(embed, texts: List[str], concurrency: int) -> Dict:
+    """`concurrency` callers embedding texts back to back"""
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(texts)
+
+    async def caller():
+        nonlocal errors
+        for text in pending:
+            start = time.perf_counter()
+            try:
+                await embed(text)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=2000, help="Questions per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--waits", type=float, nargs="+", default=[1, 5, 20], help="Windows (ms)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--embedding-latency", default="lognormal:0.05,0.3")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Stub embeddings requests/s (0: none)")
+    args = parser.parse_args()
+
+    openai_app = create_openai_stub(embedding_latency=args.embedding_latency, dimension=256)
+    openai_stub = StubServer(openai_app).start()
+    configure_environment(openai_stub.url, "http://127.0.0.1:9")
+    os.environ["EMBEDDING_DIMENSION"] = "256"
+    os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+    os.environ.setdefault("EMBEDDING_DEADLINE", "30")
+    if args.rate_limit:
+        openai_app.state.faults = {"/embeddings": {"rate_limit": args.rate_limit}}
+
+    import openai_client
+    from batching import MicroBatcher
+    from resilience import embeddings_upstream
+
+    variants = [("off", None)] + [
+        (f"wait_{wait:g}ms", MicroBatcher(
+            openai_client._embed_queries_async,
+            max_batch=args.batch_size,
+            max_wait=wait / 1000,
+            name="openai_embeddings"
+        ))
+        for wait in args.waits
+    ]
+
+    async def run_all():
+        results = {}
+        run = 0
+        for concurrency in args.concurrency:
+            results[str(concurrency)] = {}
+            for name, batcher in variants:
+                openai_client.query_batcher = batcher
+                run += 1
+                texts = [f"question {i} of run {run} about pricing" for i in range(args.queries)]
+                calls = openai_app.state.requests.get("/embeddings", 0)
+                retries = embeddings_upstream.retries
+                batches = batcher.batches if batcher else 0
+                result = await run_load(openai_client.generate_embedding_async, texts, concurrency)
+                result["api_requests"] = openai_app.state.requests.get("/embeddings", 0) - calls
+                result["retries_after_429"] = embeddings_upstream.retries - retries
+                if batcher:
+                    sent = batcher.batches - batches
+                    result["mean_batch_size"] = round(args.queries / sent, 2) if sent else 0.0
+                results[str(concurrency)][name] = result
+        return results
+
+    results = asyncio.run(run_all())
+    openai_stub.stop()
+    print_report({
+        "benchmark": "embedding_batching",
+        "queries": args.queries,
+        "batch_size": args.batch_size,
+        "embedding_latency": args.embedding_latency,
+        "rate_limit": args.rate_limit or None,
+        "results": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Document extraction throughput: pages per second per core, by format
+
+Generates a fixture corpus of Markdown, HTML, DOCX, PDF and plain-text
+files (--files per format, --pages pages of --words-per-page words each)
+and runs it through the ingestion pipeline's extraction stage (extract,
+chunk, count tokens; no embedding) with 1 (in-process) and more worker
+processes. A "page" is a page break in DOCX and PDF, a heading section in
+Markdown and HTML, and --words-per-page words of plain text. The report
+gives pages/s, pages/s per core used, input MB/s, and the share of chunks
+carrying a page number or heading. PDF files are generated either way but
+only extracted when pypdf is installed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_extraction --files 40 --pages 20 --processes 1 2 4
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import print_report
+from benchmarks.stubs import configure_environment
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-'
+    'officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-'
+    'officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships/officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+DOCX_STYLES = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles {W}>'
+    '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/>'
+    '<w:pPr><w:outlineLvl w:val="0"/></w:pPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading2"><w:name w:val="heading 2"/>'
+    '<w:pPr><w:outlineLvl w:val="1"/></w:pPr></w:style>'
+    '</w:styles>'
+)
+
+
+def paragraphs(rng: random.Random, vocabulary: List[str], words: int) -> List[str]:
+    """Random text split into paragraphs of about 80 words"""
+    text = rng.choices(vocabulary, k=words)
+    return [" ".join(text[i:i + 80]) for i in range(0, words, 80)]
+
+
+def write_markdown(path: Path, pages: List[List[str]]):
+    lines = ["# Handbook", ""]
+    for number, page in enumerate(pages, start=1):
+        lines += [f"## Section {number}", ""]
+        for paragraph in page:
+            lines += [paragraph, ""]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def write_html(path: Path, pages: List[List[str]]):
+    parts = [
+        "<!DOCTYPE html><html><head><title>Handbook</title>",
+        "<style>body { font-family: sans-serif; }</style></head><body>",
+        "<nav><a href='/'>Home</a></nav><h1>Handbook</h1>",
+    ]
+    for number, page in enumerate(pages, start=1):
+        parts.append(f"<section><h2 id='s{number}'>Section {number}</h2>")
+        parts += [f"<p class='body'>{paragraph}</p>" for paragraph in page]
+        parts.append("</section>")
+    parts.append("<script>window.analytics = [];</script></body></html>")
+    path.write_text("\n".join(parts), encoding="utf-8")
+
+
+def write_docx(path: Path, pages: List[List[str]]):
+    def paragraph(text: str, style: str = None) -> str:
+        properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+        # Word splits paragraphs into several runs
+        words = text.split()
+        runs = "".join(
+            f'<w:r><w:t xml:space="preserve">{" ".join(words[i:i + 20])} </w:t></w:r>'
+            for i in range(0, len(words), 20)
+        )
+        return f"<w:p>{properties}{runs}</w:p>"
+
+    body = [paragraph("Handbook", "Heading1")]
+    for number, page in enumerate(pages, start=1):
+        if number > 1:
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        body.append(paragraph(f"Section {number}", "Heading2"))
+        body += [paragraph(text) for text in page]
+    document = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {W}>'
+        f'<w:body>{"".join(body)}</w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", DOCX_RELS)
+        archive.writestr("word/document.xml", document)
+        archive.writestr("word/styles.xml", DOCX_STYLES)
+
+
+def write_pdf(path: Path, pages: List[List[str]]):
+    """A minimal text PDF: one Helvetica content stream per page"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in pages:
+        lines = []
+        for paragraph in page:
+            words = paragraph.split()
+            lines += [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        escaped = (
+            line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines
+        )
+        stream = ("BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({line}) '" for line in escaped)
+                  + " ET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%EOF\n" % (
+        len(objects) + 1, xref
+    )
+    path.write_bytes(bytes(out))
+
+
+def write_text(path: Path, pages: List[List[str]]):
+    text = "\n\n".join(paragraph for page in pages for paragraph in page)
+    path.write_text(text, encoding="utf-8")
+
+
+WRITERS = {
+    "md": write_markdown,
+    "html": write_html,
+    "docx": write_docx,
+    "pdf": write_pdf,
+    "txt": write_text,
+}
+
+
+def write_fixtures(root: Path, files: int, pages: int, words_per_page: int, seed: int = 0):
+    """`files` documents per format, with the same text in every format"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    for i in range(files):
+        document = [paragraphs(rng, vocabulary, words_per_page) for _ in range(pages)]
+        for extension, write in WRITERS.items():
+            path = root / extension / f"doc{i}.{extension}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write(path, document)
+
+
+async def extract_all(pipeline, paths: List[Path]) -> Dict:
+    """Run files through the pipeline's extraction stage, timing it"""
+    started = time.perf_counter()
+    chunks = failed = with_page = with_heading = 0
+    async for _, result in pipeline._extract([(path,) for path in paths]):
+        if isinstance(result, Exception):
+            failed += 1
+            continue
+        chunks += len(result)
+        with_page += sum(1 for chunk in result if 'page' in chunk)
+        with_heading += sum(1 for chunk in result if 'heading' in chunk)
+    return {
+        "elapsed_s": time.perf_counter() - started,
+        "chunks": chunks,
+        "failed": failed,
+        "with_page": with_page,
+        "with_heading": with_heading,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=40, help="Files per format")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per file")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument(
+        "--processes", type=int, nargs="+",
+        default=sorted({1, 2, os.cpu_count() or 1}),
+        help="Worker process counts to compare (1 = in-process)"
+    )
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_extraction_"))
+    corpus = workdir / "docs"
+    write_fixtures(corpus, args.files, args.pages, args.words_per_page)
+
+    configure_environment("http://127.0.0.1:9", "http://127.0.0.1:9")
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ["LOCAL_INDEX_PATH"] = ""
+    os.environ["INGEST_MANIFEST_PATH"] = str(workdir / "manifest.sqlite")
+    os.environ["BM25_INDEX_PATH"] = str(workdir / "bm25_index")
+
+    from ingestion import IngestionPipeline
+    from vector_store import vector_store
+
+    formats = list(WRITERS)
+    skipped = {}
+    if importlib.util.find_spec("pypdf") is None:
+        formats.remove("pdf")
+        skipped["pdf"] = "pypdf not installed (pip install pypdf)"
+
+    cores = os.cpu_count() or 1
+    report = {
+        "benchmark": "extraction",
+        "cpu_count": cores,
+        "files_per_format": args.files,
+        "pages_per_file": args.pages,
+        "words_per_page": args.words_per_page,
+        "skipped": skipped,
+        "runs": {},
+    }
+
+    for processes in args.processes:
+        pipeline = IngestionPipeline(vector_store, lexical=None, processes=processes)
+        # Start the workers (and their imports) outside the timed runs
+        started = time.perf_counter()
+        asyncio.run(extract_all(pipeline, [corpus / "txt" / "doc0.txt"] * processes * 2))
+        run = {"startup_s": round(time.perf_counter() - started, 3)}
+
+        for extension in formats:
+            paths = sorted((corpus / extension).iterdir())
+            result = asyncio.run(extract_all(pipeline, paths))
+            pages = args.files * args.pages
+            pages_per_s = pages / result["elapsed_s"]
+            megabytes = sum(path.stat().st_size for path in paths) / 1e6
+            run[extension] = {
+                "pages": pages,
+                "chunks": result["chunks"],
+                "failed": result["failed"],
+                "elapsed_s": round(result["elapsed_s"], 3),
+                "pages_per_s": round(pages_per_s, 1),
+                "pages_per_s_per_core": round(pages_per_s / min(processes, cores), 1),
+                "input_mb_per_s": round(megabytes / result["elapsed_s"], 2),
+                "chunks_with_page": round(result["with_page"] / max(result["chunks"], 1), 3),
+                "chunks_with_heading": round(result["with_heading"] / max(result["chunks"], 1), 3),
+            }
+        pipeline.close()
+        report["runs"][f"processes_{processes}"] = run
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
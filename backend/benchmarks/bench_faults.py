@@ -0,0 +1,167 @@
+"""
+/api/chat under injected upstream faults, with and without the resilience layer
+
+Local OpenAI and Pinecone stubs fail on demand (503s, 429s with
+Retry-After, hung requests, a full completions outage). Each scenario is
+run twice against the same app: once with resilience.py's deadlines,
+retries, circuit breakers and stale answers, and once configured like
+the SDKs' own behaviour (two retries, no overall deadline, no breaker,
+no stale answers). Every request's latency is recorded, failed ones
+included, together with the status codes and the requests the stubs saw.
+
+Usage (from backend/):
+    python -m benchmarks.bench_faults --requests 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import chat_payloads, percentile, print_report, seed_documents
+from benchmarks.stubs import (
+    StubServer,
+    configure_environment,
+    create_openai_stub,
+    create_pinecone_stub,
+)
+
+SCENARIOS = {
+    "healthy": ({}, {}),
+    "chat_503_20pct": ({"/chat/completions": {"error_rate": 0.2}}, {}),
+    "chat_429_retry_after": (
+        {"/chat/completions": {"error_rate": 0.3, "status": 429, "retry_after": 1}}, {}
+    ),
+    "chat_hangs_10pct": ({"/chat/completions": {"hang_rate": 0.1, "hang": 10.0}}, {}),
+    "pinecone_503_20pct": ({}, {"/query": {"error_rate": 0.2}}),
+    "chat_outage": ({"/chat/completions": {"error_rate": 1.0}}, {}),
+}
+
+
+async def drive_all(url: str, payloads: List[Dict], concurrency: int) -> Dict:
+    """POST every payload, keeping the latency of failed requests too"""
+    results = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=300) as client:
+        async def worker():
+            while True:
+                try:
+                    payload = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    status = (await client.post(url, json=payload)).status_code
+                except httpx.HTTPError:
+                    status = "transport_error"
+                results.append((status, time.perf_counter() - start))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies = [latency for _, latency in results]
+    answered = [latency for status, latency in results if status == 200]
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "success_rate": round(len(answered) / len(results), 3),
+        "statuses": dict(Counter(str(status) for status, _ in results)),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def configure(layer: bool, args):
+    """Switch the global upstreams between the resilience layer and SDK-like retries"""
+    from config import settings
+    from resilience import UPSTREAMS
+
+    settings.serve_stale_answers = layer
+    settings.openai_timeout = args.attempt_timeout if layer else 600.0
+    for upstream in UPSTREAMS:
+        upstream.max_retries = settings.upstream_max_retries if layer else 2
+        upstream.deadline = {
+            "openai_embeddings": settings.embedding_deadline,
+            "openai_chat": settings.chat_deadline,
+            "pinecone": settings.pinecone_deadline,
+        }[upstream.name] if layer else 600.0
+        upstream.breaker.failure_threshold = settings.upstream_breaker_failures if layer else 10 ** 9
+        upstream.breaker.record_success()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--chat-latency", type=float, default=0.2)
+    parser.add_argument("--attempt-timeout", type=float, default=2.0, help="OPENAI_TIMEOUT with the layer")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    openai_app = create_openai_stub(embedding_latency=0.01, chat_latency=args.chat_latency)
+    pinecone_app = create_pinecone_stub(query_latency=0.01)
+    openai_stub = StubServer(openai_app).start()
+    pinecone_stub = StubServer(pinecone_app).start()
+    configure_environment(openai_stub.url, pinecone_stub.url)
+    os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+    os.environ.setdefault("EMBEDDING_DEADLINE", "3")
+    os.environ.setdefault("CHAT_DEADLINE", "8")
+    os.environ.setdefault("PINECONE_DEADLINE", "2")
+    os.environ.setdefault("UPSTREAM_BREAKER_RESET", "2")
+
+    seed_documents()
+
+    from answer_cache import answer_cache
+    from main import app
+
+    report = {
+        "benchmark": "faults",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "chat_latency_s": args.chat_latency,
+        "results": {}
+    }
+    payloads = chat_payloads(args.requests)
+    with StubServer(app) as server:
+        # Warm the answer cache, then expire everything: fresh lookups miss,
+        # so every request reaches the LLM unless it is unavailable
+        asyncio.run(drive_all(f"{server.url}/api/chat", payloads[:12], 4))
+        answer_cache.ttl_seconds = 0
+
+        for name in args.scenarios:
+            openai_faults, pinecone_faults = SCENARIOS[name]
+            report["results"][name] = {}
+            for variant, layer in (("sdk_retries", False), ("resilience", True)):
+                configure(layer, args)
+                openai_app.state.faults = openai_faults
+                pinecone_app.state.faults = pinecone_faults
+                openai_app.state.requests.clear()
+                pinecone_app.state.requests.clear()
+                hits = answer_cache.hits
+
+                result = asyncio.run(drive_all(f"{server.url}/api/chat", payloads, args.concurrency))
+                result["stale_answers"] = answer_cache.hits - hits
+                result["upstream_requests"] = {
+                    "chat": openai_app.state.requests.get("/chat/completions", 0),
+                    "embeddings": openai_app.state.requests.get("/embeddings", 0),
+                    "pinecone_query": pinecone_app.state.requests.get("/query", 0),
+                }
+                report["results"][name][variant] = result
+
+    openai_stub.stop()
+    pinecone_stub.stop()
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Exact-term lookups: vector-only vs. hybrid (vector + BM25) retrieval
+
+Every synthetic chunk mentions one unique code (like a product name or
+policy id). Queries name the code, but their embeddings are noisy copies
+of the target chunk's, as when the code itself carries little semantic
+signal. Reports hit rate at several top_k values and BM25 lookup latency.
+No network access is needed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_hybrid --chunks 20000 --queries 500 --noise 4
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import print_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--noise", type=float, default=4.0,
+                        help="Query embedding noise relative to the signal")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5, 10])
+    args = parser.parse_args()
+
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ["LOCAL_INDEX_PATH"] = ""
+    os.environ["BM25_INDEX_PATH"] = ""
+    os.environ["EMBEDDING_DIMENSION"] = str(args.dimension)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    os.environ.setdefault("PINECONE_API_KEY", "pc-stub")
+
+    from bm25_index import BM25Index
+    from local_index import LocalVectorStore
+    from retrieval import fuse_results
+
+    rng = np.random.default_rng(0)
+    words = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(5000)]
+
+    vectors = rng.standard_normal((args.chunks, args.dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = [
+        {
+            'content': " ".join(words.choices(vocabulary, k=args.words)) + f" code{i}x",
+            'word_count': args.words + 1,
+            'chunk_index': i
+        }
+        for i in range(args.chunks)
+    ]
+
+    store = LocalVectorStore(None, dimension=args.dimension)
+    store.upsert_chunks(chunks, vectors, "synthetic")
+    lexical = BM25Index()
+    start = time.perf_counter()
+    lexical.add((f"synthetic_{i}", chunk['content']) for i, chunk in enumerate(chunks))
+    index_seconds = time.perf_counter() - start
+
+    targets = rng.choice(args.chunks, size=args.queries, replace=False)
+    questions = [
+        f"What does code{i}x say about {' '.join(words.choices(vocabulary, k=3))}?"
+        for i in targets
+    ]
+    noise = rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    noise *= args.noise / np.linalg.norm(noise, axis=1, keepdims=True)
+    query_vectors = vectors[targets] + noise
+
+    depth = max(max(args.top_k), 20)
+    start = time.perf_counter()
+    lexical_results = [lexical.search(question, depth) for question in questions]
+    lexical_us = (time.perf_counter() - start) / args.queries * 1e6
+    vector_results = [store.search(vector, top_k=depth) for vector in query_vectors]
+
+    async def fetch(ids):
+        return {chunk['id']: chunk for chunk in store.fetch(ids)}
+
+    report = {
+        "benchmark": "hybrid",
+        "chunks": args.chunks,
+        "queries": args.queries,
+        "noise": args.noise,
+        "bm25_index_seconds": round(index_seconds, 2),
+        "bm25_mean_lookup_us": round(lexical_us, 1),
+        "hit_rate": {}
+    }
+    for k in args.top_k:
+        vector_hits = 0
+        hybrid_hits = 0
+        for target, vector, vector_result, lexical_result in zip(
+            targets, query_vectors, vector_results, lexical_results
+        ):
+            expected = f"synthetic_{target}"
+            vector_hits += expected in {chunk['id'] for chunk in vector_result[:k]}
+            found = {chunk['id'] for chunk in vector_result}
+            fetched = asyncio.run(fetch([i for i, _ in lexical_result if i not in found]))
+            fused = fuse_results(vector.tolist(), vector_result, lexical_result, fetched, k)
+            hybrid_hits += expected in {chunk['id'] for chunk in fused}
+        report["hit_rate"][f"top_{k}"] = {
+            "vector": round(vector_hits / args.queries, 3),
+            "hybrid": round(hybrid_hits / args.queries, 3)
+        }
+
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
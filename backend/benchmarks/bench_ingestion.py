@@ -0,0 +1,78 @@
+"""
+Ingestion throughput: cold load vs. incremental re-runs
+
+Generates a synthetic corpus, ingests it into a temporary local index
+through a stub embeddings API, then re-runs over the unchanged corpus and
+after editing a few files, reporting time and embedding calls per run.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ingestion --files 2000 --words 1500
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import print_report, write_corpus
+from benchmarks.stubs import StubServer, configure_environment, create_openai_stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=1500)
+    parser.add_argument("--edits", type=int, default=10)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_ingestion_"))
+    corpus = workdir / "docs"
+    write_corpus(corpus, args.files, args.words)
+
+    openai_stub = StubServer(create_openai_stub(
+        embedding_latency=args.embedding_latency,
+        dimension=256
+    )).start()
+    configure_environment(openai_stub.url, "http://127.0.0.1:9")
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ["LOCAL_INDEX_PATH"] = ""
+    os.environ["EMBEDDING_DIMENSION"] = "256"
+    os.environ["INGEST_MANIFEST_PATH"] = str(workdir / "manifest.sqlite")
+
+    from ingestion import IngestionPipeline
+    from vector_store import vector_store
+
+    calls = openai_stub.server.config.app.state.calls
+    pipeline = IngestionPipeline(vector_store)
+
+    async def run_all():
+        runs = {}
+        for name in ("cold", "unchanged"):
+            before = calls["embeddings"]
+            runs[name] = await pipeline.run(corpus)
+            runs[name]["embedding_api_calls"] = calls["embeddings"] - before
+
+        # Append a sentence to a few files: only their last chunk changes
+        for path in sorted(corpus.rglob("*.txt"))[:args.edits]:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(" an appended sentence")
+        before = calls["embeddings"]
+        runs["edited"] = await pipeline.run(corpus)
+        runs["edited"]["embedding_api_calls"] = calls["embeddings"] - before
+        return runs
+
+    report = {
+        "benchmark": "ingestion",
+        "files": args.files,
+        "words_per_file": args.words,
+        "runs": asyncio.run(run_all()),
+    }
+    pipeline.close()
+    openai_stub.stop()
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Query embedding latency: embeddings API vs. a local CPU model
+
+The remote path calls generate_embedding_async against the OpenAI stub,
+whose latency follows --remote-latency (a stubs.latency_sampler spec).
+The local path uses LocalEmbeddings with the given model ("hashing", or a
+sentence-transformers model if it is installed), with and without
+micro-batching. Each is measured one query at a time and with
+--concurrency callers in flight. The embedding cache is off.
+
+Usage (from backend/):
+    python -m benchmarks.bench_local_embeddings --queries 500 --concurrency 64
+    python -m benchmarks.bench_local_embeddings --model all-MiniLM-L6-v2 --dimension 384
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from benchmarks.common import print_report, summarize
+from benchmarks.stubs import StubServer, configure_environment, create_openai_stub
+
+TOPICS = ["pricing", "security", "onboarding", "refunds", "deployment", "integrations", "roadmap"]
+
+
+def queries(count: int) -> List[str]:
+    return [f"What is the {TOPICS[i % len(TOPICS)]} policy for product {i}?" for i in range(count)]
+
+
+async def measure(embed: Callable[[str], Awaitable], texts: List[str], concurrency: int) -> Dict:
+    """Embed every text with at most `concurrency` calls in flight"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text: str):
+        async with semaphore:
+            start = time.perf_counter()
+            await embed(text)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in texts))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--remote-latency", default="lognormal:0.08,0.5")
+    parser.add_argument("--model", default="hashing", help="Local model: hashing or a sentence-transformers name")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    openai_stub = StubServer(create_openai_stub(
+        embedding_latency=args.remote_latency, dimension=args.dimension
+    )).start()
+    configure_environment(openai_stub.url, "http://127.0.0.1:9")
+    os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+    os.environ["EMBEDDING_DIMENSION"] = str(args.dimension)
+
+    from local_embeddings import LocalEmbeddings
+    from openai_client import generate_embedding_async
+
+    texts = queries(args.queries)
+    batched = LocalEmbeddings(
+        args.model, args.dimension, threads=args.threads,
+        max_batch=args.batch_size, max_wait=args.batch_wait_ms / 1000
+    )
+    unbatched = LocalEmbeddings(args.model, args.dimension, threads=args.threads, max_batch=1)
+    load_start = time.perf_counter()
+    batched.model
+    unbatched.model
+    load_seconds = time.perf_counter() - load_start
+
+    async def local(embedder: LocalEmbeddings):
+        return lambda text: embedder.embed_async([text])
+
+    async def run_all():
+        results = {}
+        variants = (
+            ("remote", lambda text: generate_embedding_async(text)),
+            ("local_unbatched", await local(unbatched)),
+            ("local_batched", await local(batched)),
+        )
+        for name, embed in variants:
+            await measure(embed, texts[:20], 4)  # Warm connections and model
+            results[name] = {
+                "sequential": await measure(embed, texts, 1),
+                f"concurrency_{args.concurrency}": await measure(embed, texts, args.concurrency),
+            }
+        results["local_unbatched"]["batching"] = unbatched.stats()
+        results["local_batched"]["batching"] = batched.stats()
+        return results
+
+    report = {
+        "benchmark": "local_embeddings",
+        "queries": args.queries,
+        "concurrency": args.concurrency,
+        "remote_latency": args.remote_latency,
+        "local_model": args.model,
+        "dimension": args.dimension,
+        "local_model_load_s": round(load_seconds, 3),
+        "results": asyncio.run(run_all()),
+    }
+    remote = report["results"]["remote"]["sequential"]["p50_ms"]
+    local_p50 = report["results"]["local_batched"]["sequential"]["p50_ms"]
+    if local_p50:
+        report["p50_speedup_sequential"] = round(remote / local_p50, 1)
+
+    openai_stub.stop()
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Memory and recall of float16 / int8 / truncated local index storage
+
+Fills the local index with the same synthetic vectors in each storage
+format and reports bytes per vector, GB per million vectors, search QPS
+and recall@k against exact float32 search. The vectors are clustered and
+have a decaying per-dimension spectrum, the way Matryoshka-trained
+models (text-embedding-3-*) front-load information; truncation figures
+on isotropic random vectors would be meaningless. No network access is
+needed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_quantization --vectors 50000 --dims 512 256
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.bench_ann import fill
+from benchmarks.common import print_report
+
+
+def matryoshka_embeddings(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors whose variance decays along the dimensions"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 200), dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)]
+    vectors += 0.6 * rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors *= (1.0 + np.arange(dimension, dtype=np.float32) / 32.0) ** -0.75
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def measure(store, queries: np.ndarray, truth, k: int):
+    found = 0
+    start = time.perf_counter()
+    results = [store.search(query, top_k=k) for query in queries]
+    elapsed = time.perf_counter() - start
+    for expected, result in zip(truth, results):
+        found += len(expected & {r['id'] for r in result})
+    bytes_per_vector = store.codec.bytes_per_vector(store.dimension)
+    return {
+        "dtype": store.codec.dtype,
+        "dimensions": store.dimension,
+        "bytes_per_vector": bytes_per_vector,
+        "gb_per_million": round(bytes_per_vector * 1e6 / 1e9, 3),
+        "recall_at_k": round(found / (k * len(queries)), 4),
+        "qps": round(len(queries) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--dims", type=int, nargs="*", default=[768, 512, 256],
+                        help="Truncated widths to try (each with every dtype)")
+    parser.add_argument("--noise", type=float, default=0.3,
+                        help="Query = stored vector + this much Gaussian noise")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+    os.environ.setdefault("PINECONE_API_KEY", "unused")
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ["LOCAL_INDEX_PATH"] = ""
+    os.environ["EMBEDDING_DIMENSION"] = str(args.dimension)
+
+    from local_index import LocalVectorStore
+    from quantization import DTYPES, VectorCodec
+
+    vectors = matryoshka_embeddings(args.vectors, args.dimension)
+    rng = np.random.default_rng(1)
+    sources = rng.integers(0, args.vectors, args.queries)
+    queries = vectors[sources] + args.noise * rng.standard_normal(
+        (args.queries, args.dimension)
+    ).astype(np.float32) / np.sqrt(args.dimension)
+    ids = np.array([f"doc{i // 1000}_{i % 1000}" for i in range(args.vectors)])
+    truth = [set(ids[np.argsort(-(vectors @ q))[:args.k]]) for q in queries]
+
+    results = []
+    for dimensions in [None, *args.dims]:
+        for dtype in DTYPES:
+            store = LocalVectorStore(
+                mode="exact", dimension=args.dimension, codec=VectorCodec(dtype, dimensions)
+            )
+            fill(store, vectors)
+            results.append(measure(store, queries, truth, args.k))
+            del store
+
+    print_report({
+        "benchmark": "quantization",
+        "vectors": args.vectors,
+        "dimension": args.dimension,
+        "k": args.k,
+        "baseline": "exact float32 search at full dimension",
+        "results": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Follow-up retrieval with and without query rewriting; request payload size
+
+Builds a synthetic catalogue: one chunk per (product, topic), each naming
+its product and topic amid filler text. Each conversation opens with
+"Tell me about <product>" and continues with follow-ups that only refer
+to it ("What about its pricing?", "And security?"). Retrieval for the
+follow-ups, as asked and as rewritten by the heuristic rewriter, is
+compared on hit rate at several top_k values, precision@k, and the
+context tokens that must be sent before the right chunk is included.
+Also reports the /api/chat request body per turn when the client re-sends
+its history vs. only sending conversation_id. Embeddings are the stubs'
+bag-of-words hashes; no network access is needed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_query_rewrite --products 200 --conversations 500
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.common import print_report
+from benchmarks.stubs import hashed_embedding
+
+TOPICS = ["pricing", "security", "integrations", "support", "deployment", "roadmap", "licensing"]
+
+FOLLOW_UPS = [
+    "What about its {topic}?",
+    "How does it handle {topic}?",
+    "And {topic}?",
+    "Tell me more about their {topic}",
+    "{topic}?",
+]
+
+SYLLABLES = ["ac", "me", "flo", "zen", "tri", "qua", "nex", "vo", "lu", "kor", "sha", "rin", "dex", "pi"]
+
+
+def product_names(count: int, rng: random.Random):
+    names = set()
+    while len(names) < count:
+        stem = "".join(rng.choices(SYLLABLES, k=3)).capitalize()
+        names.add(stem + rng.choice(["Flow", "Edge", "Hub", "Bot"]))
+    return sorted(names)
+
+
+def make_chunk(rng: random.Random, vocabulary, name: str, topic: str, words: int) -> str:
+    tokens = rng.choices(vocabulary, k=words) + [name, name, topic, topic]
+    rng.shuffle(tokens)
+    return " ".join(tokens)
+
+
+def retrieve(store, lexical, fuse_results, queries, dimension: int, depth: int, hybrid: bool):
+    """Top `depth` chunk ids per query, vector-only or fused with BM25 as retrieval.py does"""
+    results = []
+    for query in queries:
+        vector = hashed_embedding(query, dimension)
+        found = store.search(np.asarray(vector, dtype=np.float32), top_k=depth)
+        if hybrid:
+            lexical_result = lexical.search(query, depth)
+            known = {chunk['id'] for chunk in found}
+            fetched = {chunk['id']: chunk for chunk in store.fetch(
+                [i for i, _ in lexical_result if i not in known]
+            )}
+            found = fuse_results(vector, found, lexical_result, fetched, depth)
+        results.append([chunk['id'] for chunk in found])
+    return results
+
+
+def summarize(found_ids, targets, tokens_per_chunk: int, top_k, depth: int):
+    positions = [ids.index(t) + 1 if t in ids else None for ids, t in zip(found_ids, targets)]
+    summary = {}
+    for k in top_k:
+        hits = sum(1 for p in positions if p is not None and p <= k)
+        summary[f"hit_rate_top_{k}"] = round(hits / len(targets), 3)
+        summary[f"precision_at_{k}"] = round(hits / (k * len(targets)), 3)
+    # Chunks that have to be sent to include the answer (misses count as depth)
+    needed = [p if p is not None else depth for p in positions]
+    summary["mean_context_tokens_to_answer"] = round(statistics.mean(needed) * tokens_per_chunk, 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=6, help="Turns per conversation (for payload size)")
+    parser.add_argument("--words", type=int, default=40, help="Filler words per chunk")
+    parser.add_argument("--answer-words", type=int, default=120, help="Words per answer (for payload size)")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5])
+    args = parser.parse_args()
+
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ["LOCAL_INDEX_PATH"] = ""
+    os.environ["BM25_INDEX_PATH"] = ""
+    os.environ["EMBEDDING_DIMENSION"] = str(args.dimension)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    os.environ.setdefault("PINECONE_API_KEY", "pc-stub")
+
+    from bm25_index import BM25Index
+    from local_index import LocalVectorStore
+    from query_rewriter import heuristic_rewrite
+    from retrieval import fuse_results
+
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    names = product_names(args.products, rng)
+
+    chunks = []
+    for name in names:
+        for topic in TOPICS:
+            chunks.append({
+                'content': make_chunk(rng, vocabulary, name, topic, args.words),
+                'word_count': args.words + 4,
+                'chunk_index': len(chunks)
+            })
+    vectors = np.asarray(
+        [hashed_embedding(chunk['content'], args.dimension) for chunk in chunks], dtype=np.float32
+    )
+    store = LocalVectorStore(None, dimension=args.dimension)
+    store.upsert_chunks(chunks, vectors, "catalogue")
+    lexical = BM25Index()
+    lexical.add((f"catalogue_{i}", chunk['content']) for i, chunk in enumerate(chunks))
+
+    raw, rewritten, targets = [], [], []
+    rewrite_seconds = 0.0
+    for _ in range(args.conversations):
+        product = rng.randrange(len(names))
+        topic = rng.randrange(len(TOPICS))
+        history = [{"question": f"Tell me about {names[product]}", "answer": "..."}]
+        question = rng.choice(FOLLOW_UPS).format(topic=TOPICS[topic])
+        start = time.perf_counter()
+        query = heuristic_rewrite(question, history)
+        rewrite_seconds += time.perf_counter() - start
+        raw.append(question)
+        rewritten.append(query)
+        targets.append(f"catalogue_{product * len(TOPICS) + topic}")
+
+    depth = max(max(args.top_k), 20)
+    tokens_per_chunk = int((args.words + 4) * 1.3)  # ~1.3 tokens per English word
+    report = {
+        "benchmark": "query_rewrite",
+        "chunks": len(chunks),
+        "follow_ups": args.conversations,
+        "examples": [{"asked": q, "rewritten": r} for q, r in list(zip(raw, rewritten))[:3]],
+        "rewrite_us_per_question": round(rewrite_seconds / args.conversations * 1e6, 1),
+    }
+    for mode, hybrid in (("vector", False), ("hybrid", True)):
+        report[mode] = {
+            "as_asked": summarize(
+                retrieve(store, lexical, fuse_results, raw, args.dimension, depth, hybrid),
+                targets, tokens_per_chunk, args.top_k, depth
+            ),
+            "rewritten": summarize(
+                retrieve(store, lexical, fuse_results, rewritten, args.dimension, depth, hybrid),
+                targets, tokens_per_chunk, args.top_k, depth
+            ),
+        }
+
+    # Request bodies over a conversation: the client re-sending every earlier
+    # turn (the previous frontend sent the last six messages) vs. sending its id
+    answer = " ".join(rng.choices(vocabulary, k=args.answer_words))
+    history_bytes, id_bytes = [], []
+    history = []
+    for turn in range(args.turns):
+        question = rng.choice(FOLLOW_UPS).format(topic=rng.choice(TOPICS))
+        history_bytes.append(len(json.dumps({
+            "question": question, "conversation_history": history[-6:]
+        })))
+        id_bytes.append(len(json.dumps({
+            "question": question, "conversation_id": "0" * 32
+        })))
+        history.append({"question": question, "answer": answer})
+    report["request_bytes_per_turn"] = {
+        "turns": args.turns,
+        "answer_words": args.answer_words,
+        "with_history": round(statistics.mean(history_bytes)),
+        "with_conversation_id": round(statistics.mean(id_bytes)),
+    }
+
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Re-ranking: added latency vs. prompt tokens saved
+
+Builds synthetic retrieval results: per question, RERANK_CANDIDATES chunks
+with similar retrieval scores, of which one answers the question, one is
+a near-copy of it (overlapping windows) and a few share some of its terms.
+Compares sending the top RETRIEVAL_TOP_K by retrieval score against
+re-ranking down to RERANK_TOP_K: prompt tokens (as packed by
+context_builder with an unlimited budget), how often a chunk with the
+whole answer is included, and the re-ranking time per question, one at a
+time and batched. No network access is needed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_rerank --questions 512 --candidates 20 --keep 3
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import time
+
+from benchmarks.common import print_report
+
+
+def make_chunk(rng, vocabulary, words, extra=()):
+    """Filler text in sentences, with the extra terms scattered through it"""
+    tokens = rng.choices(vocabulary, k=words) + list(extra)
+    rng.shuffle(tokens)
+    sentences = [" ".join(tokens[i:i + 15]) for i in range(0, len(tokens), 15)]
+    return ". ".join(sentence.capitalize() for sentence in sentences) + "."
+
+
+def make_question(rng, vocabulary, index, candidates, words):
+    """One question, its candidates best first, and the terms an answer must contain"""
+    topic = [f"topic{index}x{j}" for j in range(3)]
+    question = f"How does {topic[0]} {topic[1]} handle {topic[2]}?"
+
+    answer = make_chunk(rng, vocabulary, words, topic * 2)
+    texts = [answer]
+    # Overlapping window: mostly the same sentences
+    sentences = answer.split(". ")
+    texts.append(". ".join(sentences[:-2] + [make_chunk(rng, vocabulary, 30)]))
+    for _ in range(3):
+        texts.append(make_chunk(rng, vocabulary, words, rng.sample(topic, 1)))
+    while len(texts) < candidates:
+        texts.append(make_chunk(rng, vocabulary, words))
+
+    chunks = [
+        {
+            'id': f"q{index}_{i}",
+            'content': text,
+            'document_name': f"doc{index}",
+            'chunk_index': i,
+            'score': rng.uniform(0.3, 0.5) + (0.05 if i < 2 else 0.0)
+        }
+        for i, text in enumerate(texts)
+    ]
+    chunks.sort(key=lambda chunk: chunk['score'], reverse=True)
+    return question, chunks, topic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=512)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--baseline-top-k", type=int, default=5)
+    parser.add_argument("--keep", type=int, default=3)
+    parser.add_argument("--words", type=int, default=150, help="Words per chunk")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ["LOCAL_INDEX_PATH"] = ""
+    os.environ["BM25_INDEX_PATH"] = ""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    os.environ.setdefault("PINECONE_API_KEY", "pc-stub")
+
+    from context_builder import pack_context
+    from reranker import Reranker
+    from config import settings
+
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    cases = [
+        make_question(rng, vocabulary, i, args.candidates, args.words)
+        for i in range(args.questions)
+    ]
+    reranker = Reranker(
+        weight=settings.rerank_weight,
+        diversity=settings.rerank_diversity,
+        min_score=settings.rerank_min_score
+    )
+
+    # Quiet the per-call log line while timing
+    with contextlib.redirect_stdout(io.StringIO()):
+        single_ms = []
+        reranked = []
+        for question, chunks, _ in cases:
+            start = time.perf_counter()
+            reranked.append(reranker.rerank(question, chunks, args.keep))
+            single_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        for offset in range(0, len(cases), args.batch_size):
+            batch = cases[offset:offset + args.batch_size]
+            reranker.rerank_batch([q for q, _, _ in batch], [c for _, c, _ in batch], args.keep)
+        batched_ms = (time.perf_counter() - start) * 1000 / len(cases)
+
+    def summarize(selections):
+        tokens = []
+        hits = 0
+        for (question, _, topic), chunks in zip(cases, selections):
+            packed = pack_context(question, chunks, budget=1_000_000)
+            tokens.append(packed.report["total"])
+            hits += any(
+                all(term in chunk['content'].lower() for term in topic) for chunk in chunks
+            )
+        return {
+            "chunks_per_prompt": round(statistics.mean(len(s) for s in selections), 2),
+            "mean_prompt_tokens": round(statistics.mean(tokens), 1),
+            "answer_included": round(hits / len(cases), 3)
+        }
+
+    baseline = summarize([chunks[:args.baseline_top_k] for _, chunks, _ in cases])
+    rerank = summarize(reranked)
+    single_ms.sort()
+    print_report({
+        "benchmark": "rerank",
+        "questions": args.questions,
+        "candidates": args.candidates,
+        "scorer": reranker.name,
+        f"top_{args.baseline_top_k}_by_score": baseline,
+        f"reranked_top_{args.keep}": rerank,
+        "prompt_tokens_saved": round(
+            1 - rerank["mean_prompt_tokens"] / baseline["mean_prompt_tokens"], 3
+        ),
+        "rerank_ms_per_question": {
+            "single_p50": round(single_ms[len(single_ms) // 2], 3),
+            "single_p95": round(single_ms[int(len(single_ms) * 0.95)], 3),
+            f"batched_{args.batch_size}_mean": round(batched_ms, 3)
+        }
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Cold start: import time, time to accept requests, time to ready, first request
+
+Starts the API in fresh `uvicorn` processes against local OpenAI and
+Pinecone stubs, several times, and reports:
+
+- import_ms: `import main` in a fresh interpreter
+- listening_ms: process start until GET / answers
+- ready_ms: process start until GET /ready returns 200
+- first_chat_ms: the first /api/chat, sent as soon as the server listens
+  (before the background connect finishes, so it connects on demand)
+- warm_chat_ms: the same question once the server is ready
+
+The stub Pinecone control plane waits --control-latency seconds per call,
+standing in for the list/describe round trips a real index costs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --runs 5 --control-latency 0.3
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import QUESTIONS, print_report, seed_documents
+from benchmarks.stubs import (
+    StubServer,
+    configure_environment,
+    create_openai_stub,
+    create_pinecone_stub,
+    free_port,
+)
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+
+def import_time_ms() -> float:
+    """Time `import main` in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", (
+            "import time; start = time.perf_counter(); import main; "
+            "print((time.perf_counter() - start) * 1000)"
+        )],
+        cwd=BACKEND_DIR, env=os.environ, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def wait_for(client: httpx.Client, url: str, start: float, timeout: float = 60) -> float:
+    """Poll url until it returns 200; ms since start"""
+    while time.perf_counter() - start < timeout:
+        try:
+            if client.get(url).status_code == 200:
+                return (time.perf_counter() - start) * 1000
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} not available after {timeout}s")
+
+
+def launch(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=os.environ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def cold_start() -> dict:
+    """Two fresh servers: one left to become ready, one asked a question at once"""
+    payload = {"question": QUESTIONS[0], "conversation_history": []}
+    result = {}
+    with httpx.Client(timeout=60) as client:
+        port = free_port()
+        start = time.perf_counter()
+        server = launch(port)
+        try:
+            result["listening_ms"] = round(wait_for(client, f"http://127.0.0.1:{port}/", start), 1)
+            result["ready_ms"] = round(wait_for(client, f"http://127.0.0.1:{port}/ready", start), 1)
+            sent = time.perf_counter()
+            client.post(f"http://127.0.0.1:{port}/api/chat", json=payload).raise_for_status()
+            result["warm_chat_ms"] = round((time.perf_counter() - sent) * 1000, 1)
+        finally:
+            server.terminate()
+            server.wait()
+
+        port = free_port()
+        start = time.perf_counter()
+        server = launch(port)
+        try:
+            wait_for(client, f"http://127.0.0.1:{port}/", start)
+            sent = time.perf_counter()
+            response = client.post(f"http://127.0.0.1:{port}/api/chat", json=payload)
+            assert response.status_code == 200 and response.json()["success"], response.text
+            result["first_chat_ms"] = round((time.perf_counter() - sent) * 1000, 1)
+        finally:
+            server.terminate()
+            server.wait()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--control-latency", type=float, default=0.3)
+    parser.add_argument("--chat-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    openai_stub = StubServer(create_openai_stub(chat_latency=args.chat_latency)).start()
+    pinecone_stub = StubServer(create_pinecone_stub(control_latency=args.control_latency)).start()
+    configure_environment(openai_stub.url, pinecone_stub.url)
+    os.environ["ANSWER_CACHE_SIZE"] = "0"
+    os.environ["LOG_LEVEL"] = "WARNING"
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as workdir:
+        os.environ["CONTENT_STORE_PATH"] = str(Path(workdir) / "content.sqlite")
+        os.environ["BM25_INDEX_PATH"] = str(Path(workdir) / "bm25")
+        seed_documents()
+
+        imports = [import_time_ms() for _ in range(args.runs)]
+        runs = [cold_start() for _ in range(args.runs)]
+
+    openai_stub.stop()
+    pinecone_stub.stop()
+
+    def median(key):
+        return round(sorted(run[key] for run in runs)[len(runs) // 2], 1)
+
+    print_report({
+        "benchmark": "startup",
+        "runs": args.runs,
+        "stub_control_latency_s": args.control_latency,
+        "import_ms": round(sorted(imports)[len(imports) // 2], 1),
+        "listening_ms": median("listening_ms"),
+        "ready_ms": median("ready_ms"),
+        "first_chat_ms": median("first_chat_ms"),
+        "warm_chat_ms": median("warm_chat_ms"),
+        "samples": runs,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Time-to-first-token: /api/chat vs. /api/chat/stream
+
+Runs the app against local OpenAI and Pinecone stubs and reports, per
+endpoint, when the first sources and first answer token reach the client
+and when the response completes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_streaming --requests 100 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import chat_payloads, percentile, print_report, seed_documents
+from benchmarks.stubs import (
+    StubServer,
+    configure_environment,
+    create_openai_stub,
+    create_pinecone_stub,
+)
+
+
+def latency_summary(samples: List[float]) -> Dict:
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+async def measure(url: str, payloads: List[Dict], concurrency: int, stream: bool) -> Dict:
+    first_source: List[float] = []
+    first_token: List[float] = []
+    total: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        async def one(payload):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                if not stream:
+                    response = await client.post(url, json=payload)
+                    if response.status_code != 200 or not response.json()["success"]:
+                        errors += 1
+                        return
+                    elapsed = time.perf_counter() - start
+                    # The whole answer arrives at once
+                    first_source.append(elapsed)
+                    first_token.append(elapsed)
+                    total.append(elapsed)
+                    return
+
+                event = None
+                marks = {}
+                async with client.stream("POST", url, json=payload) as response:
+                    async for line in response.aiter_lines():
+                        if line.startswith("event: "):
+                            event = line[len("event: "):]
+                        elif line.startswith("data: "):
+                            marks.setdefault(event, time.perf_counter() - start)
+                if response.status_code != 200 or "error" in marks or "token" not in marks:
+                    errors += 1
+                    return
+                first_source.append(marks["sources"])
+                first_token.append(marks["token"])
+                total.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(payload) for payload in payloads))
+
+    return {
+        "errors": errors,
+        "time_to_sources": latency_summary(first_source),
+        "time_to_first_token": latency_summary(first_token),
+        "total": latency_summary(total),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--chat-latency", type=float, default=1.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    openai_stub = StubServer(create_openai_stub(
+        chat_latency=args.chat_latency,
+        first_token_latency=args.first_token_latency,
+    )).start()
+    pinecone_stub = StubServer(create_pinecone_stub()).start()
+    configure_environment(openai_stub.url, pinecone_stub.url)
+    os.environ["ANSWER_CACHE_SIZE"] = "0"
+
+    seed_documents()
+
+    from main import app
+
+    payloads = chat_payloads(args.requests)
+    with StubServer(app) as server:
+        report = {
+            "benchmark": "streaming",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "stub_chat_latency_s": args.chat_latency,
+            "stub_first_token_latency_s": args.first_token_latency,
+            "results": {
+                "chat": asyncio.run(measure(
+                    f"{server.url}/api/chat", payloads, args.concurrency, stream=False
+                )),
+                "chat_stream": asyncio.run(measure(
+                    f"{server.url}/api/chat/stream", payloads, args.concurrency, stream=True
+                )),
+            }
+        }
+
+    openai_stub.stop()
+    pinecone_stub.stop()
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Release benchmark: ingestion, /api/chat latency per concurrency, per-stage breakdown
+
+Runs the whole backend offline against the OpenAI and Pinecone stubs,
+with upstream latencies drawn from configurable distributions (see
+stubs.latency_sampler), and reports as JSON:
+
+- ingestion through load_documents() over the sample documents plus a
+  synthetic corpus: a full load, then an incremental re-run
+- /api/chat at each --concurrency level: p50/p95/p99 latency, throughput
+  and errors. The embedding and answer caches are off unless --caches is
+  given, so every request runs the whole pipeline
+- per-stage time for each level (rewrite, embed, search, ... serialize),
+  from the app's rag_stage_seconds histograms: mean, bucket-estimated
+  p50/p95/p99, and share of the mean request latency
+
+With --baseline, p95 latency, throughput, errors and ingestion rate are
+compared with an earlier report, and the exit status is 1 when any of
+them regressed by more than --tolerance, so releases can be gated on it.
+
+Usage (from backend/):
+    python -m benchmarks.bench_suite --requests 300 --concurrency 1 8 32 --output baseline.json
+    python -m benchmarks.bench_suite --baseline baseline.json --tolerance 0.15
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.common import DOCUMENTS_DIR, chat_payloads, drive, print_report, write_corpus
+from benchmarks.stubs import (
+    StubServer,
+    configure_environment,
+    create_openai_stub,
+    create_pinecone_stub,
+)
+
+
+def stage_histograms(metrics_url: str) -> Dict[str, Dict]:
+    """Cumulative rag_stage_seconds buckets, sum and count per stage"""
+    stages = {}
+    for family in text_string_to_metric_families(httpx.get(metrics_url).text):
+        if family.name != "rag_stage_seconds":
+            continue
+        for sample in family.samples:
+            entry = stages.setdefault(
+                sample.labels["stage"], {"buckets": {}, "sum": 0.0, "count": 0.0}
+            )
+            if sample.name.endswith("_bucket"):
+                entry["buckets"][float(sample.labels["le"])] = sample.value
+            elif sample.name.endswith("_sum"):
+                entry["sum"] = sample.value
+            elif sample.name.endswith("_count"):
+                entry["count"] = sample.value
+    return stages
+
+
+def histogram_quantile(q: float, buckets: Dict[float, float]) -> float:
+    """Quantile from cumulative bucket counts, interpolated within a bucket (as Prometheus does)"""
+    bounds = sorted(buckets)
+    rank = q * buckets[bounds[-1]]
+    lower, below = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank and count > below:
+            if math.isinf(bound):
+                return lower
+            return lower + (bound - lower) * (rank - below) / (count - below)
+        lower, below = bound, count
+    return lower
+
+
+def stage_breakdown(before: Dict, after: Dict, mean_latency_ms: float) -> Dict:
+    """Per-stage timings for the samples recorded between two scrapes"""
+    breakdown = {}
+    for stage, end in after.items():
+        start = before.get(stage, {"buckets": {}, "sum": 0.0, "count": 0.0})
+        count = end["count"] - start["count"]
+        if count <= 0:
+            continue
+        buckets = {
+            bound: value - start["buckets"].get(bound, 0.0) for bound, value in end["buckets"].items()
+        }
+        mean_ms = (end["sum"] - start["sum"]) / count * 1000
+        breakdown[stage] = {
+            "count": int(count),
+            "mean_ms": round(mean_ms, 2),
+            "p50_ms": round(histogram_quantile(0.50, buckets) * 1000, 2),
+            "p95_ms": round(histogram_quantile(0.95, buckets) * 1000, 2),
+            "p99_ms": round(histogram_quantile(0.99, buckets) * 1000, 2),
+            "share_of_latency": round(mean_ms / mean_latency_ms, 3) if mean_latency_ms else 0.0,
+        }
+    return breakdown
+
+
+def run_ingestion(corpus: Path) -> Dict:
+    """A full load_documents() run, then an incremental one over the unchanged corpus"""
+    from load_documents import load_documents
+
+    runs = {}
+    # load_documents reports progress on stdout, which carries the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        for name, force in (("full", True), ("incremental", False)):
+            stats = load_documents(corpus, force=force)
+            elapsed = stats["elapsed_s"]
+            runs[name] = {
+                "elapsed_s": elapsed,
+                "files": stats["files_seen"],
+                "chunks_embedded": stats["chunks_embedded"],
+                "embedding_requests": stats["embedding_requests"],
+                "chunks_per_s": round(stats["chunks_total"] / elapsed, 1) if elapsed else 0.0,
+            }
+    return runs
+
+
+def regressions(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Metrics that got worse than the baseline by more than `tolerance` (a fraction)"""
+    found = []
+    for level, now in report["chat"].items():
+        then = baseline.get("chat", {}).get(level)
+        if not then:
+            continue
+        if now["p95_ms"] > then["p95_ms"] * (1 + tolerance):
+            found.append(f"chat concurrency={level}: p95 {then['p95_ms']}ms -> {now['p95_ms']}ms")
+        if now["throughput_rps"] < then["throughput_rps"] * (1 - tolerance):
+            found.append(
+                f"chat concurrency={level}: throughput "
+                f"{then['throughput_rps']} -> {now['throughput_rps']} req/s"
+            )
+        if now["errors"] > then["errors"]:
+            found.append(f"chat concurrency={level}: errors {then['errors']} -> {now['errors']}")
+    for name, now in report.get("ingestion", {}).items():
+        then = baseline.get("ingestion", {}).get(name)
+        if then and now["chunks_per_s"] < then["chunks_per_s"] * (1 - tolerance):
+            found.append(
+                f"ingestion {name}: {then['chunks_per_s']} -> {now['chunks_per_s']} chunks/s"
+            )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300, help="Chat requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--files", type=int, default=200, help="Synthetic files added to the corpus")
+    parser.add_argument("--words", type=int, default=1500, help="Words per synthetic file")
+    parser.add_argument("--embedding-latency", default="lognormal:0.03,0.4")
+    parser.add_argument("--chat-latency", default="lognormal:0.4,0.5")
+    parser.add_argument("--query-latency", default="lognormal:0.02,0.4")
+    parser.add_argument("--vector-backend", choices=["pinecone", "local"], default="pinecone")
+    parser.add_argument("--caches", action="store_true", help="Keep the embedding and answer caches on")
+    parser.add_argument("--output", type=Path, help="Also write the report to this file")
+    parser.add_argument("--baseline", type=Path, help="Earlier report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_suite_"))
+    corpus = workdir / "docs"
+    shutil.copytree(DOCUMENTS_DIR, corpus)
+    write_corpus(corpus / "synthetic", args.files, args.words)
+
+    openai_stub = StubServer(create_openai_stub(
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency
+    )).start()
+    pinecone_stub = StubServer(create_pinecone_stub(query_latency=args.query_latency)).start()
+    configure_environment(openai_stub.url, pinecone_stub.url)
+    os.environ["VECTOR_BACKEND"] = args.vector_backend
+    os.environ["METRICS_ENABLED"] = "true"
+    os.environ["LOCAL_INDEX_PATH"] = str(workdir / "local_index")
+    os.environ["BM25_INDEX_PATH"] = str(workdir / "bm25_index")
+    os.environ["CONTENT_STORE_PATH"] = str(workdir / "content_store.sqlite")
+    os.environ["INGEST_MANIFEST_PATH"] = str(workdir / "manifest.sqlite")
+    if not args.caches:
+        os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+        os.environ["ANSWER_CACHE_SIZE"] = "0"
+
+    report = {
+        "benchmark": "suite",
+        "config": {
+            "requests": args.requests,
+            "vector_backend": args.vector_backend,
+            "caches": args.caches,
+            "corpus_files": sum(1 for path in corpus.rglob("*") if path.is_file()),
+            "latency": {
+                "embedding": args.embedding_latency,
+                "chat": args.chat_latency,
+                "query": args.query_latency,
+            },
+        },
+        "ingestion": run_ingestion(corpus),
+        "chat": {},
+        "stages": {},
+    }
+
+    from main import app
+
+    with StubServer(app) as server:
+        url = f"{server.url}/api/chat"
+        asyncio.run(drive(url, chat_payloads(args.warmup), 4))
+        for level in args.concurrency:
+            before = stage_histograms(f"{server.url}/metrics")
+            result = asyncio.run(drive(url, chat_payloads(args.requests), level))
+            after = stage_histograms(f"{server.url}/metrics")
+            report["chat"][str(level)] = result
+            report["stages"][str(level)] = stage_breakdown(before, after, result["mean_ms"])
+
+    openai_stub.stop()
+    pinecone_stub.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        report["baseline"] = str(args.baseline)
+        report["tolerance"] = args.tolerance
+        report["regressions"] = regressions(
+            report, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance
+        )
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print_report(report)
+
+    if report.get("regressions"):
+        for line in report["regressions"]:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Multi-worker throughput and cross-worker cache sharing (serve.py)
+
+Starts `serve.py` with each requested worker count against OpenAI stubs
+running in their own processes, with the local vector index, and reports:
+
+- throughput: /api/chat requests/sec for unique questions (answer cache
+  off, so every request runs the full pipeline), and the speed-up and
+  efficiency relative to one worker
+- sharing: each sample question is asked once, then again many times;
+  counts the embedding and chat completion calls the repeats still caused,
+  for serve.py (shared SQLite caches) vs. plain `uvicorn --workers`
+  (per-process caches)
+
+Scaling is bounded by the cores available to the workers, the load
+generator and the stubs together; run it on a machine with spare cores.
+
+Usage (from backend/):
+    python -m benchmarks.bench_workers --workers 1 2 4 --requests 2000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import QUESTIONS, drive, print_report, seed_documents
+from benchmarks.stubs import StubProcess, configure_environment, create_openai_stub, free_port
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+
+def start_server(workers: int, shared: bool, env: dict):
+    """serve.py (shared caches) or plain uvicorn (per-process caches); waits until ready"""
+    port = free_port()
+    if shared:
+        command = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers),
+                   "--port", str(port), "--log-level", "warning"]
+    server = subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    ready = 0
+    with httpx.Client(timeout=10) as client:
+        # Consecutive 200s so that (most likely) every worker has connected
+        while ready < 4 * workers:
+            if time.time() > deadline:
+                server.terminate()
+                raise RuntimeError("server did not become ready")
+            try:
+                ready = ready + 1 if client.get(f"{url}/ready").status_code == 200 else 0
+            except httpx.TransportError:
+                ready = 0
+            time.sleep(0.01)
+    return server, url
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    server.wait()
+
+
+def calls(openai_url: str) -> dict:
+    return httpx.get(f"{openai_url}/calls").json()
+
+
+def throughput(workers: int, args, env: dict) -> dict:
+    env = {**env, "ANSWER_CACHE_SIZE": "0"}
+    server, url = start_server(workers, shared=True, env=env)
+    try:
+        payloads = [
+            {"question": f"{QUESTIONS[i % len(QUESTIONS)]} (request {i})", "conversation_history": []}
+            for i in range(args.requests)
+        ]
+        asyncio.run(drive(f"{url}/api/chat", payloads[:args.concurrency], args.concurrency))  # Warm-up
+        return asyncio.run(drive(
+            f"{url}/api/chat", payloads, args.concurrency,
+            check=lambda response: response.json()["success"]
+        ))
+    finally:
+        stop_server(server)
+
+
+def sharing(workers: int, shared: bool, args, env: dict, openai_url: str) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bench_workers_cache_") as cache_dir:
+        if shared:
+            env = {
+                **env,
+                "EMBEDDING_CACHE_PATH": str(Path(cache_dir) / "embeddings.sqlite"),
+                "ANSWER_CACHE_PATH": str(Path(cache_dir) / "answers.sqlite"),
+            }
+        server, url = start_server(workers, shared=shared, env=env)
+        try:
+            first = [{"question": question, "conversation_history": []} for question in QUESTIONS]
+            asyncio.run(drive(f"{url}/api/chat", first, 1))
+            before = calls(openai_url)
+            repeats = first * args.repeats
+            asyncio.run(drive(f"{url}/api/chat", repeats, args.concurrency))
+            after = calls(openai_url)
+        finally:
+            stop_server(server)
+    return {
+        "repeat_requests": len(repeats),
+        "embedding_calls": after["embeddings"] - before["embeddings"],
+        "chat_calls": after["chat"] - before["chat"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=20, help="Times each sample question is repeated")
+    parser.add_argument("--chat-latency", type=float, default=0.05)
+    parser.add_argument("--embedding-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    openai_stub = StubProcess(
+        create_openai_stub, chat_latency=args.chat_latency, embedding_latency=args.embedding_latency
+    ).start()
+    configure_environment(openai_stub.url, "http://127.0.0.1:9")
+
+    with tempfile.TemporaryDirectory(prefix="bench_workers_") as workdir:
+        os.environ.update({
+            "VECTOR_BACKEND": "local",
+            "LOCAL_INDEX_PATH": str(Path(workdir) / "index"),
+            "BM25_INDEX_PATH": "",
+            "LOG_LEVEL": "WARNING",
+        })
+        seed_documents()
+        env = dict(os.environ)
+
+        results = []
+        for workers in args.workers:
+            run = {"workers": workers, "throughput": throughput(workers, args, env)}
+            run["sharing"] = {
+                "shared_sqlite": sharing(workers, True, args, env, openai_stub.url),
+                "per_process": sharing(workers, False, args, env, openai_stub.url),
+            }
+            results.append(run)
+
+    openai_stub.stop()
+
+    baseline = results[0]["throughput"]["throughput_rps"] / results[0]["workers"]
+    for run in results:
+        speedup = run["throughput"]["throughput_rps"] / baseline if baseline else 0.0
+        run["speedup"] = round(speedup, 2)
+        run["efficiency"] = round(speedup / run["workers"], 2)
+
+    print_report({
+        "benchmark": "workers",
+        "cpu_count": os.cpu_count(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "stub_chat_latency_s": args.chat_latency,
+        "results": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Shared helpers for driving the API under load and summarising results
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+
+DOCUMENTS_DIR = Path(__file__).parent.parent / "documents"
+
+QUESTIONS = [
+    "When was Acme Tech Solutions founded?",
+    "What products does Acme Tech offer?",
+    "What is AcmeFlow?",
+    "What are the HR policies at Acme?",
+    "What is the remote work policy?",
+    "What does InsightEdge do?",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict:
+    """Latency percentiles (ms) and throughput for one benchmark run"""
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def drive(
+    url: str,
+    payloads: List[Dict],
+    concurrency: int,
+    check: Optional[Callable[[httpx.Response], bool]] = None
+) -> Dict:
+    """POST every payload to url with at most `concurrency` requests in flight"""
+    latencies: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def worker():
+            nonlocal errors
+            while True:
+                try:
+                    payload = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=payload)
+                    ok = response.status_code == 200 and (check is None or check(response))
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return summarize(latencies, elapsed, errors)
+
+
+def chat_payloads(count: int) -> List[Dict]:
+    """Cycle through the sample questions"""
+    return [
+        {"question": QUESTIONS[i % len(QUESTIONS)], "conversation_history": []}
+        for i in range(count)
+    ]
+
+
+def write_corpus(root: Path, files: int, words: int, seed: int = 0):
+    """Write `files` random-word text files under root, spread over 20 folders"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    for i in range(files):
+        path = root / f"section{i % 20}" / f"doc{i}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(" ".join(rng.choices(vocabulary, k=words)), encoding="utf-8")
+
+
+def print_report(report: Dict):
+    print(json.dumps(report, indent=2))
+
+
+def seed_documents() -> int:
+    """Chunk, embed and upsert the sample documents through the backend modules"""
+    from chunking import chunk_text_by_words
+    from config import settings
+    from openai_client import generate_batch_embeddings
+    from vector_store import vector_store
+
+    total = 0
+    for path in sorted(DOCUMENTS_DIR.glob("*.txt")):
+        chunks = chunk_text_by_words(path.read_text(encoding="utf-8"), settings.chunk_size)
+        embeddings = generate_batch_embeddings([chunk["content"] for chunk in chunks])
+        total += vector_store.upsert_chunks(chunks, embeddings, path.name)
+    return total
@@ -0,0 +1,434 @@
+"""
+Local stand-ins for the OpenAI and Pinecone HTTP APIs
+
+The stubs speak just enough of each wire protocol for the official
+clients to work against them, with configurable artificial latency
+(fixed or drawn from a distribution) and injectable faults, so
+benchmarks can run without network access or API keys.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def hashed_embedding(text: str, dimension: int) -> List[float]:
+    """
+    Deterministic bag-of-words embedding so similar texts score higher
+
+    Component 0 is a shared bias that lifts cosine scores between short
+    questions and long chunks into the range real embeddings produce
+    (roughly 0.3-0.6), so retrieval clears SIMILARITY_THRESHOLD.
+    """
+    vector = [0.0] * dimension
+    vector[0] = 8.0
+    for word in set(re.findall(r"\w+", text.lower())):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        bucket = 1 + int.from_bytes(digest[:4], "little") % (dimension - 1)
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def latency_sampler(spec: Union[float, str], seed: int = 0) -> Callable[[], float]:
+    """
+    Seconds to wait per request, fixed or drawn from a distribution
+
+    `spec` is a number of seconds, or one of "uniform:LOW,HIGH",
+    "normal:MEAN,SD", "lognormal:MEDIAN,SIGMA" and "exponential:MEAN".
+    Samples are never negative. Long-tailed distributions (lognormal,
+    exponential) are closer to what the real APIs do than a constant.
+    """
+    if isinstance(spec, (int, float)) or ":" not in str(spec):
+        delay = float(spec)
+        return lambda: delay
+
+    kind, _, params = str(spec).partition(":")
+    values = [float(value) for value in params.split(",")]
+    rng = random.Random(seed)
+    draw = {
+        "uniform": lambda: rng.uniform(values[0], values[1]),
+        "normal": lambda: rng.gauss(values[0], values[1]),
+        "lognormal": lambda: values[0] * math.exp(rng.gauss(0.0, values[1])),
+        "exponential": lambda: rng.expovariate(1.0 / values[0]) if values[0] else 0.0,
+    }.get(kind)
+    if draw is None:
+        raise ValueError(f"Unknown latency distribution: {spec!r}")
+    return lambda: max(0.0, draw())
+
+
+def install_faults(app: FastAPI, seed: int = 0):
+    """
+    Let a stub fail on demand: `app.state.faults` maps a path to its faults
+
+    Each entry may set `error_rate` (share of requests answered with
+    `status`, default 503, plus a Retry-After header when `retry_after` is
+    set), `hang_rate` (share that stall for `hang` seconds first) and
+    `rate_limit` (requests per second; more within a second get a 429).
+    Change them in-process, or with POST /faults {path: {...}} for a stub
+    in another process; {} clears them.
+    """
+    app.state.faults = {}
+    app.state.requests = {}  # Requests per path, failed ones included
+    recent: Dict[str, List[float]] = {}  # Accepted request times per rate-limited path
+    rng = random.Random(seed)
+
+    @app.post("/faults")
+    async def set_faults(request: Request):
+        app.state.faults = await request.json()
+        return app.state.faults
+
+    @app.middleware("http")
+    async def inject(request: Request, call_next):
+        path = request.url.path
+        app.state.requests[path] = app.state.requests.get(path, 0) + 1
+        fault = app.state.faults.get(path)
+        if fault:
+            if fault.get("rate_limit"):
+                now = time.monotonic()
+                window = [t for t in recent.get(path, []) if now - t < 1.0]
+                recent[path] = window
+                if len(window) >= fault["rate_limit"]:
+                    return JSONResponse(
+                        status_code=429,
+                        content={"error": {"message": "rate limited", "type": "rate_limit"}},
+                        headers={"retry-after": "1"}
+                    )
+                window.append(now)
+            if rng.random() < fault.get("hang_rate", 0.0):
+                await asyncio.sleep(fault.get("hang", 30.0))
+            if rng.random() < fault.get("error_rate", 0.0):
+                headers = {}
+                if fault.get("retry_after") is not None:
+                    headers["retry-after"] = str(fault["retry_after"])
+                return JSONResponse(
+                    status_code=fault.get("status", 503),
+                    content={"error": {"message": "injected fault", "type": "stub_fault"}},
+                    headers=headers
+                )
+        return await call_next(request)
+
+
+def create_openai_stub(
+    dimension: int = 1536,
+    embedding_latency: Union[float, str] = 0.02,
+    chat_latency: Union[float, str] = 0.3,
+    first_token_latency: Union[float, str] = 0.05,
+    embedding_latency_per_input: float = 0.0,
+    answer: str = "Acme Tech Solutions was founded in 2015. (Source: company_history.txt)"
+) -> FastAPI:
+    """
+    Build an app serving /embeddings and /chat/completions
+
+    Non-streaming completions take `chat_latency`. Streaming completions
+    send the first token after `first_token_latency` and spread the rest
+    over the remaining time, so both modes finish together. Latencies
+    take any latency_sampler() spec and are drawn per request; embedding
+    requests also take `embedding_latency_per_input` per text sent.
+    """
+    app = FastAPI()
+    app.state.calls = {"embeddings": 0, "chat": 0}
+    embedding_delay = latency_sampler(embedding_latency, seed=1)
+    chat_delay = latency_sampler(chat_latency, seed=2)
+    first_token_delay = latency_sampler(first_token_latency, seed=3)
+    install_faults(app)
+
+    @app.get("/calls")
+    async def calls():
+        return app.state.calls
+
+    @app.post("/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        app.state.calls["embeddings"] += 1
+        await asyncio.sleep(embedding_delay() + embedding_latency_per_input * len(inputs))
+        return {
+            "object": "list",
+            "model": body.get("model", "stub"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": hashed_embedding(text, dimension)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        }
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls["chat"] += 1
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_completion(body.get("model", "stub"), chat_delay(), first_token_delay()),
+                media_type="text/event-stream"
+            )
+        await asyncio.sleep(chat_delay())
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    async def stream_completion(model: str, total: float, first_token: float):
+        tokens = [word + " " for word in answer.split(" ")]
+        interval = max(0.0, total - first_token) / max(1, len(tokens) - 1)
+        await asyncio.sleep(first_token)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(interval)
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def _matches_filter(metadata: Dict, filter_dict: Optional[Dict]) -> bool:
+    """Evaluate the subset of Pinecone's filter language used by the backend"""
+    for field, condition in (filter_dict or {}).items():
+        value = metadata.get(field)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$nin" in condition and value in condition["$nin"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def create_pinecone_stub(
+    index_name: str = "acme-docs",
+    dimension: int = 1536,
+    query_latency: Union[float, str] = 0.01,
+    control_latency: Union[float, str] = 0.0
+) -> FastAPI:
+    """Build an app serving the Pinecone control plane (delayed by `control_latency`) and data plane"""
+    app = FastAPI()
+    query_delay = latency_sampler(query_latency, seed=4)
+    control_delay = latency_sampler(control_latency, seed=5)
+    install_faults(app)
+    vectors: Dict[str, Dict] = {}
+    app.state.vectors = vectors
+
+    def describe(host: str) -> Dict:
+        return {
+            "name": index_name,
+            "dimension": dimension,
+            "metric": "cosine",
+            "host": host,
+            "spec": {"serverless": {"cloud": "aws", "region": "us-east-1"}},
+            "status": {"ready": True, "state": "Ready"}
+        }
+
+    @app.get("/indexes")
+    async def list_indexes(request: Request):
+        await asyncio.sleep(control_delay())
+        return {"indexes": [describe(str(request.base_url).rstrip("/"))]}
+
+    @app.get("/indexes/{name}")
+    async def describe_index(name: str, request: Request):
+        await asyncio.sleep(control_delay())
+        return describe(str(request.base_url).rstrip("/"))
+
+    @app.post("/vectors/upsert")
+    async def upsert(request: Request):
+        body = await request.json()
+        for vector in body["vectors"]:
+            vectors[vector["id"]] = vector
+        return {"upsertedCount": len(body["vectors"])}
+
+    @app.post("/vectors/delete")
+    async def delete(request: Request):
+        body = await request.json()
+        if body.get("deleteAll"):
+            vectors.clear()
+        for vector_id in body.get("ids") or []:
+            vectors.pop(vector_id, None)
+        if body.get("filter"):
+            for vector_id in [
+                vid for vid, v in vectors.items()
+                if _matches_filter(v.get("metadata", {}), body["filter"])
+            ]:
+                del vectors[vector_id]
+        return {}
+
+    @app.get("/vectors/fetch")
+    async def fetch(request: Request):
+        ids = request.query_params.getlist("ids")
+        return {
+            "vectors": {vid: vectors[vid] for vid in ids if vid in vectors},
+            "namespace": ""
+        }
+
+    @app.post("/describe_index_stats")
+    async def describe_index_stats():
+        return {
+            "namespaces": {"": {"vectorCount": len(vectors)}},
+            "dimension": dimension,
+            "indexFullness": 0.0,
+            "totalVectorCount": len(vectors)
+        }
+
+    @app.post("/query")
+    async def query(request: Request):
+        body = await request.json()
+        query_vector = body["vector"]
+        query_norm = math.sqrt(sum(v * v for v in query_vector)) or 1.0
+        scored = []
+        for vector in vectors.values():
+            metadata = vector.get("metadata", {})
+            if not _matches_filter(metadata, body.get("filter")):
+                continue
+            values = vector["values"]
+            norm = math.sqrt(sum(v * v for v in values)) or 1.0
+            score = sum(a * b for a, b in zip(query_vector, values)) / (norm * query_norm)
+            scored.append((score, vector))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        await asyncio.sleep(query_delay())
+        matches = []
+        for score, vector in scored[:body["topK"]]:
+            match = {"id": vector["id"], "score": score, "values": []}
+            if body.get("includeMetadata"):
+                match["metadata"] = vector.get("metadata", {})
+            matches.append(match)
+        return {"matches": matches, "namespace": ""}
+
+    return app
+
+
+def free_port() -> int:
+    """Ask the OS for an unused local TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """Run an ASGI app with uvicorn on a background thread"""
+
+    def __init__(self, app, port: Optional[int] = None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(
+            app,
+            host="127.0.0.1",
+            port=self.port,
+            log_level="warning",
+            access_log=False,
+            limit_concurrency=10000,
+            backlog=4096
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError(f"Server on port {self.port} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _run_stub(factory, kwargs: Dict, port: int):
+    uvicorn.run(
+        factory(**kwargs),
+        host="127.0.0.1",
+        port=port,
+        log_level="warning",
+        access_log=False,
+        limit_concurrency=10000,
+        backlog=4096
+    )
+
+
+class StubProcess:
+    """
+    Run a stub app in its own process
+
+    Use this instead of StubServer when the code under test runs in
+    several processes, so the stub does not compete with the load
+    generator for one interpreter's GIL.
+    """
+
+    def __init__(self, factory, **kwargs):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = multiprocessing.get_context("spawn").Process(
+            target=_run_stub, args=(factory, kwargs, self.port), daemon=True
+        )
+
+    def start(self) -> "StubProcess":
+        self.process.start()
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                if time.time() > deadline or not self.process.is_alive():
+                    raise RuntimeError(f"Stub on port {self.port} did not start")
+                time.sleep(0.05)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def configure_environment(openai_url: str, pinecone_url: str):
+    """Point config.Settings at the stubs; call before importing backend modules"""
+    os.environ["OPENAI_API_KEY"] = "sk-stub"
+    os.environ["OPENAI_BASE_URL"] = openai_url
+    os.environ["PINECONE_API_KEY"] = "pc-stub"
+    os.environ["PINECONE_HOST"] = pinecone_url
+    os.environ["PINECONE_INDEX_HOST"] = pinecone_url
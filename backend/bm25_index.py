@@ -0,0 +1,352 @@
+"""
+In-process BM25 inverted index over chunk text
+Complements embedding search with exact-term matching (product names,
+policy codes), is updated incrementally at ingestion time and persisted
+next to the other local data
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import Counter
+from pathlib import Path
+import json
+import logging
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+_WORDS = re.compile(r"\w+")
+
+# Function words carry no lexical signal and would match every chunk
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been
+before being below between both but by can could did do does doing down
+during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just me more most my no nor not of
+off on once only or other our ours out over own same she should so some
+such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while
+who whom why will with would you your yours
+""".split())
+
+# Postings and document tables grow geometrically, like the local vector index
+_INITIAL_CAPACITY = 4
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords"""
+    return [word for word in _WORDS.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Return array with room for at least size items"""
+    if size <= len(array):
+        return array
+    grown = np.empty(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class BM25Index:
+    """
+    Okapi BM25 over vector ids, with per-term postings held in NumPy arrays
+    
+    Documents are rows; deleting a document tombstones its row and its
+    postings are dropped at the next compaction. Searches score only the
+    postings of the query terms, so a lookup touches a few thousand
+    integers rather than the whole corpus.
+    """
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._reset()
+        
+        if self.path and (self.path / "bm25.json").exists():
+            self._load()
+    
+    def _reset(self):
+        self._terms: Dict[str, int] = {}
+        self._postings: List[np.ndarray] = []   # term -> doc rows (int32)
+        self._frequencies: List[np.ndarray] = []  # term -> term frequency (uint16)
+        self._sizes: List[int] = []             # term -> postings used
+        self._df = np.zeros(0, dtype=np.int32)  # term -> live documents containing it
+        self._ids: List[Optional[str]] = []     # row -> vector id (None once deleted)
+        self._rows: Dict[str, int] = {}
+        self._lengths = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self._alive = np.zeros(_INITIAL_CAPACITY, dtype=bool)
+        self._doc_terms: List[Optional[np.ndarray]] = []
+        self._total_length = 0
+        self._deleted = 0
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def add(self, documents: Iterable[Tuple[str, str]]):
+        """
+        Index (vector id, text) pairs, replacing any previous text for an id
+        
+        Args:
+            documents: Pairs of vector id and chunk content
+        """
+        # A repeated id keeps its last text
+        tokenized = [
+            (vector_id, Counter(tokenize(text))) for vector_id, text in dict(documents).items()
+        ]
+        
+        with self._lock:
+            self._remove_rows([self._rows[v] for v, _ in tokenized if v in self._rows])
+            
+            # Collect (term, row, frequency) for the whole batch, then append
+            # each term's new postings with one slice assignment
+            term_column = []
+            row_column = []
+            frequency_column = []
+            lookup = self._terms.get
+            for vector_id, counts in tokenized:
+                row = len(self._ids)
+                self._ids.append(vector_id)
+                self._rows[vector_id] = row
+                term_ids = [lookup(term) for term in counts]
+                if None in term_ids:
+                    term_ids = [self._term_id(term) for term in counts]
+                term_column.extend(term_ids)
+                row_column.extend([row] * len(term_ids))
+                frequency_column.extend(counts.values())
+                self._doc_terms.append(np.array(term_ids, dtype=np.int32))
+            
+            rows_added = len(tokenized)
+            first_row = len(self._ids) - rows_added
+            lengths = np.array([sum(counts.values()) for _, counts in tokenized], dtype=np.int32)
+            self._lengths = _grow(self._lengths, len(self._ids))
+            self._lengths[first_row:len(self._ids)] = lengths
+            self._alive = _grow(self._alive, len(self._ids))
+            self._alive[first_row:len(self._ids)] = True
+            self._total_length += int(lengths.sum())
+            if not term_column:
+                return
+            
+            terms = np.array(term_column, dtype=np.int32)
+            order = np.argsort(terms, kind='stable')
+            terms = terms[order]
+            rows = np.array(row_column, dtype=np.int32)[order]
+            frequencies = np.minimum(np.array(frequency_column)[order], 65535).astype(np.uint16)
+            unique_terms, starts, counts = np.unique(terms, return_index=True, return_counts=True)
+            self._df[unique_terms] += counts.astype(np.int32)
+            
+            postings = self._postings
+            sizes = self._sizes
+            for term_id, start, count in zip(unique_terms.tolist(), starts.tolist(), counts.tolist()):
+                size = sizes[term_id]
+                end = size + count
+                if end > len(postings[term_id]):
+                    postings[term_id] = _grow(postings[term_id], end)
+                    self._frequencies[term_id] = _grow(self._frequencies[term_id], end)
+                postings[term_id][size:end] = rows[start:start + count]
+                self._frequencies[term_id][size:end] = frequencies[start:start + count]
+                sizes[term_id] = end
+    
+    def remove(self, vector_ids: Iterable[str]):
+        """Drop documents by vector id (unknown ids are ignored)"""
+        with self._lock:
+            self._remove_rows([self._rows[v] for v in set(vector_ids) if v in self._rows])
+    
+    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float]]:
+        """
+        Rank documents by BM25 score for the query's terms
+        
+        Args:
+            query: Free-text query
+            top_k: Number of results
+        
+        Returns:
+            (vector id, score) pairs, best first; empty if no term matches
+        """
+        with self._lock:
+            term_ids = [
+                self._terms[term] for term in set(tokenize(query))
+                if term in self._terms
+            ]
+            live = len(self._rows)
+            if not term_ids or not live or top_k <= 0:
+                return []
+            
+            average_length = self._total_length / live
+            rows = []
+            weights = []
+            for term_id in term_ids:
+                df = int(self._df[term_id])
+                if not df:
+                    continue
+                size = self._sizes[term_id]
+                docs = self._postings[term_id][:size]
+                tf = self._frequencies[term_id][:size].astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[docs] / average_length)
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                rows.append(docs)
+                weights.append(idf * tf * (self.k1 + 1) / (tf + norm))
+            
+            if not rows:
+                return []
+            rows = np.concatenate(rows)
+            weights = np.concatenate(weights)
+            
+            # Aggregate per document: dense when postings are large relative
+            # to the corpus, sort-based otherwise
+            if len(rows) * 8 > len(self._ids):
+                scores = np.bincount(rows, weights=weights, minlength=len(self._ids))
+                candidates = np.flatnonzero(scores)
+                scores = scores[candidates]
+            else:
+                candidates, inverse = np.unique(rows, return_inverse=True)
+                scores = np.bincount(inverse, weights=weights)
+            
+            alive = self._alive[candidates]
+            candidates = candidates[alive]
+            scores = scores[alive]
+            if not len(scores):
+                return []
+            
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[candidates[i]], float(scores[i])) for i in top]
+    
+    def clear(self):
+        """Drop every document"""
+        with self._lock:
+            self._reset()
+    
+    def save(self):
+        """Compact and persist the index atomically"""
+        if not self.path:
+            return
+        
+        with self._lock:
+            self._compact()
+            self.path.mkdir(parents=True, exist_ok=True)
+            
+            terms = list(self._terms)
+            sizes = np.array(self._sizes, dtype=np.int64)
+            arrays_tmp = self.path / "bm25.tmp.npz"
+            meta_tmp = self.path / "bm25.tmp.json"
+            
+            with open(arrays_tmp, 'wb') as f:
+                np.savez(
+                    f,
+                    offsets=np.concatenate([[0], np.cumsum(sizes)]),
+                    postings=np.concatenate(
+                        [p[:s] for p, s in zip(self._postings, self._sizes)] or [np.zeros(0, np.int32)]
+                    ),
+                    frequencies=np.concatenate(
+                        [f[:s] for f, s in zip(self._frequencies, self._sizes)] or [np.zeros(0, np.uint16)]
+                    ),
+                    lengths=self._lengths[:len(self._ids)]
+                )
+            with open(meta_tmp, 'w', encoding='utf-8') as f:
+                json.dump({'ids': self._ids, 'terms': terms}, f)
+            
+            os.replace(arrays_tmp, self.path / "bm25.npz")
+            os.replace(meta_tmp, self.path / "bm25.json")
+    
+    def _load(self):
+        """Restore a previously saved index"""
+        with open(self.path / "bm25.json", 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        arrays = np.load(self.path / "bm25.npz")
+        offsets = arrays['offsets']
+        postings = arrays['postings']
+        frequencies = arrays['frequencies']
+        
+        self._ids = data['ids']
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._terms = {term: i for i, term in enumerate(data['terms'])}
+        self._postings = [postings[offsets[i]:offsets[i + 1]].copy() for i in range(len(self._terms))]
+        self._frequencies = [frequencies[offsets[i]:offsets[i + 1]].copy() for i in range(len(self._terms))]
+        self._sizes = [len(p) for p in self._postings]
+        self._df = np.diff(offsets).astype(np.int32)
+        self._lengths = _grow(arrays['lengths'].astype(np.int32), _INITIAL_CAPACITY)
+        self._alive = _grow(np.ones(len(self._ids), dtype=bool), _INITIAL_CAPACITY)
+        self._total_length = int(self._lengths[:len(self._ids)].sum())
+        
+        # Per-document term lists (needed to update df on delete), grouped
+        # from the postings in one sort
+        term_of_posting = np.repeat(np.arange(len(self._terms), dtype=np.int32), np.diff(offsets))
+        order = np.argsort(postings, kind='stable')
+        bounds = np.searchsorted(postings[order], np.arange(len(self._ids) + 1))
+        grouped = term_of_posting[order]
+        self._doc_terms = [grouped[bounds[i]:bounds[i + 1]] for i in range(len(self._ids))]
+        logger.info(
+            "Loaded BM25 index: %d chunks, %d terms from %s", len(self), len(self._terms), self.path
+        )
+    
+    def _term_id(self, term: str) -> int:
+        """Look up or allocate a term (lock held)"""
+        term_id = self._terms.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            self._terms[term] = term_id
+            self._postings.append(np.empty(_INITIAL_CAPACITY, dtype=np.int32))
+            self._frequencies.append(np.empty(_INITIAL_CAPACITY, dtype=np.uint16))
+            self._sizes.append(0)
+            self._df = _grow(self._df, term_id + 1)
+            self._df[term_id] = 0
+        return term_id
+    
+    def _remove_rows(self, rows: List[int]):
+        """Tombstone rows and compact once a quarter of them are dead (lock held)"""
+        for row in rows:
+            del self._rows[self._ids[row]]
+            self._ids[row] = None
+            self._alive[row] = False
+            self._df[self._doc_terms[row]] -= 1
+            self._doc_terms[row] = None
+            self._total_length -= int(self._lengths[row])
+            self._deleted += 1
+        
+        if self._deleted > 1000 and self._deleted * 4 > len(self._ids):
+            self._compact()
+    
+    def _compact(self):
+        """Drop tombstoned rows and their postings (lock held)"""
+        if not self._deleted:
+            return
+        
+        keep = self._alive[:len(self._ids)]
+        new_row = np.cumsum(keep, dtype=np.int64) - 1
+        for term_id, size in enumerate(self._sizes):
+            docs = self._postings[term_id][:size]
+            alive = keep[docs]
+            self._postings[term_id] = new_row[docs[alive]].astype(np.int32)
+            self._frequencies[term_id] = self._frequencies[term_id][:size][alive]
+            self._sizes[term_id] = len(self._postings[term_id])
+        
+        kept_rows = np.flatnonzero(keep)
+        self._lengths = _grow(self._lengths[kept_rows], _INITIAL_CAPACITY)
+        self._alive = _grow(np.ones(len(kept_rows), dtype=bool), _INITIAL_CAPACITY)
+        self._ids = [self._ids[row] for row in kept_rows]
+        self._doc_terms = [self._doc_terms[row] for row in kept_rows]
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._deleted = 0
+
+
+# Global lexical index for hybrid retrieval (None when HYBRID_SEARCH is off)
+lexical_index = BM25Index(
+    path=settings.bm25_index_path,
+    k1=settings.bm25_k1,
+    b=settings.bm25_b
+) if settings.hybrid_search else None
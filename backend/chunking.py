@@ -1,9 +1,15 @@
 """
 Text chunking utilities for document processing
-Implements 512-word chunking as per requirements
+Implements 512-word chunking as per requirements, plus streaming
+chunkers that read files through mmap in bounded memory and a
+token-based mode that packs whole sentences up to a token budget
 """
 
-from typing import List, Dict
+from typing import List, Dict, Iterator, Union
+from contextlib import contextmanager
+from pathlib import Path
+import mmap
+import re
 
 
 def count_words(text: str) -> int:
@@ -83,3 +89,349 @@ def chunk_text_by_paragraphs(text: str, max_words: int = 512) -> List[Dict[str,
         })
     
     return chunks
+
+
+Source = Union[str, Path, bytes, bytearray, memoryview]
+
+_NON_SPACE = re.compile(rb'\S')
+
+# Consumed regions of a mapping are dropped from RSS in steps of this size
+_RELEASE_BYTES = 16 * 1024 * 1024
+
+
+def _compile_words(pattern: bytes) -> re.Pattern:
+    """Compile with possessive quantifiers (Python 3.11+) to skip backtracking"""
+    try:
+        return re.compile(pattern.replace(b'+', b'++').replace(b'}', b'}+'))
+    except re.error:
+        return re.compile(pattern)
+
+
+def _release(data, start: int, end: int) -> int:
+    """
+    Drop already-chunked pages of a read-only mapping from resident memory
+    
+    Returns the new release watermark. The pages stay valid and are simply
+    re-read from the file if touched again.
+    """
+    if not isinstance(data, mmap.mmap) or not hasattr(mmap, 'MADV_DONTNEED'):
+        return start
+    end -= end % mmap.PAGESIZE
+    if end - start >= _RELEASE_BYTES:
+        data.madvise(mmap.MADV_DONTNEED, start, end - start)
+        return end
+    return start
+
+
+@contextmanager
+def _open_source(source: Source):
+    """Yield a bytes-like view of a file (memory-mapped) or an in-memory buffer"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield source
+        return
+    
+    with open(source, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            yield b''
+            return
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def _decode_words(raw: bytes) -> str:
+    """Join whitespace-separated words with single spaces"""
+    return b' '.join(raw.split()).decode('utf-8', errors='replace')
+
+
+def _iter_paragraphs(data) -> Iterator[tuple]:
+    """Yield (stripped bytes, byte start, byte end) for each blank-line separated paragraph"""
+    pos = 0
+    size = len(data)
+    while pos < size:
+        end = data.find(b'\n\n', pos)
+        if end == -1:
+            end = size
+        raw = data[pos:end]
+        stripped = raw.strip()
+        if stripped:
+            start = pos + (len(raw) - len(raw.lstrip()))
+            yield stripped, start, start + len(stripped)
+        pos = end + 2
+
+
+def iter_word_chunks(
+    source: Source,
+    words_per_chunk: int = 512,
+    overlap: int = 0
+) -> Iterator[Dict[str, any]]:
+    """
+    Stream word chunks from a file without loading it whole
+    
+    Each chunk is matched by a compiled regex directly against the mmap, so
+    memory stays proportional to one chunk regardless of file size. With
+    overlap=0 the chunks match chunk_text_by_words (words are split on
+    ASCII whitespace).
+    
+    Args:
+        source: File path, or a bytes-like buffer of UTF-8 text
+        words_per_chunk: Number of words per chunk
+        overlap: Words shared between consecutive chunks
+    
+    Yields:
+        Chunks with content, word_count, chunk_index and the byte range
+        [byte_start, byte_end) they cover in the source
+    """
+    if not 0 <= overlap < words_per_chunk:
+        raise ValueError("overlap must be in [0, words_per_chunk)")
+    
+    stride = words_per_chunk - overlap
+    chunk_re = _compile_words(rb'\S+(?:\s+\S+){0,%d}' % (words_per_chunk - 1))
+    stride_re = _compile_words(rb'(?:\S+\s+){%d}' % stride)
+    
+    with _open_source(source) as data:
+        start = _NON_SPACE.search(data)
+        pos = start.start() if start else len(data)
+        chunk_index = 0
+        released = 0
+        
+        while True:
+            match = chunk_re.match(data, pos)
+            if not match:
+                return
+            
+            content = _decode_words(match.group())
+            yield {
+                'content': content,
+                'word_count': content.count(' ') + 1,
+                'chunk_index': chunk_index,
+                'byte_start': match.start(),
+                'byte_end': match.end()
+            }
+            chunk_index += 1
+            
+            # Stop once a chunk reaches the end of the text, so overlap
+            # never produces a trailing chunk contained in the previous one
+            following = _NON_SPACE.search(data, match.end())
+            if not following:
+                return
+            if overlap:
+                pos = stride_re.match(data, pos).end()
+            else:
+                pos = following.start()
+            released = _release(data, released, pos)
+
+
+def iter_paragraph_chunks(
+    source: Source,
+    max_words: int = 512,
+    overlap_paragraphs: int = 0
+) -> Iterator[Dict[str, any]]:
+    """
+    Stream paragraph-packed chunks from a file without loading it whole
+    
+    Paragraphs are separated by blank lines ("\\n\\n") and packed up to
+    max_words as in chunk_text_by_paragraphs.
+    
+    Args:
+        source: File path, or a bytes-like buffer of UTF-8 text
+        max_words: Maximum words per chunk (a single longer paragraph
+            still becomes its own chunk)
+        overlap_paragraphs: Trailing paragraphs repeated at the start of
+            the next chunk, as many as fit under max_words with the
+            paragraph that follows them
+    
+    Yields:
+        Chunks with content, word_count, chunk_index, byte_start, byte_end
+    """
+    current = []  # (text, word count, byte start, byte end)
+    current_words = 0
+    carried = 0  # Leading paragraphs of current repeated from the previous chunk
+    chunk_index = 0
+    
+    def emit():
+        return {
+            'content': '\n\n'.join(text for text, _, _, _ in current),
+            'word_count': current_words,
+            'chunk_index': chunk_index,
+            'byte_start': current[0][2],
+            'byte_end': current[-1][3]
+        }
+    
+    with _open_source(source) as data:
+        released = 0
+        
+        for raw, start, end in _iter_paragraphs(data):
+            paragraph = raw.decode('utf-8', errors='replace')
+            para_words = count_words(paragraph)
+            
+            # If adding this paragraph exceeds limit, finalize current chunk
+            if current_words + para_words > max_words and current:
+                if len(current) > carried:
+                    yield emit()
+                    chunk_index += 1
+                    current = current[-overlap_paragraphs:] if overlap_paragraphs else []
+                    current_words = sum(words for _, words, _, _ in current)
+                # The overlap counts against max_words: drop what would not fit
+                while current and current_words + para_words > max_words:
+                    current_words -= current.pop(0)[1]
+                carried = len(current)
+            
+            current.append((paragraph, para_words, start, end))
+            current_words += para_words
+            released = _release(data, released, current[0][2])
+        
+        # Add remaining chunk, unless it only repeats the previous one's end
+        if len(current) > carried:
+            yield emit()
+
+
+# Sentence ends: terminal punctuation, optionally closed by a quote or bracket
+_SENTENCE_BREAK = re.compile(rb'(?<=[.!?])\s+|(?<=[.!?]["\')\]])\s+')
+
+# Paragraphs tokenized per batch call
+_TOKENIZE_BATCH = 256
+
+
+def _iter_sentences(data) -> Iterator[tuple]:
+    """Yield (text, byte start, byte end, paragraph number) for each sentence"""
+    for paragraph_number, (raw, start, _) in enumerate(_iter_paragraphs(data)):
+        offset = 0
+        for match in _SENTENCE_BREAK.finditer(raw):
+            yield raw[offset:match.start()].decode('utf-8', errors='replace'), \
+                start + offset, start + match.start(), paragraph_number
+            offset = match.end()
+        yield raw[offset:].decode('utf-8', errors='replace'), \
+            start + offset, start + len(raw), paragraph_number
+
+
+def iter_token_chunks(
+    source: Source,
+    max_tokens: int = 512,
+    overlap_tokens: int = 0,
+    tokenizer=None
+) -> Iterator[Dict[str, any]]:
+    """
+    Stream chunks packed by token count, never cutting through a sentence
+    
+    Sentences are packed greedily up to max_tokens; paragraph breaks are
+    kept as blank lines inside a chunk. A sentence longer than max_tokens
+    is split on token boundaries. Sentences are tokenized in batches and
+    their counts cached, so repeated boilerplate is only encoded once.
+    
+    Args:
+        source: File path, or a bytes-like buffer of UTF-8 text
+        max_tokens: Token budget per chunk
+        overlap_tokens: Up to this many tokens of trailing whole sentences
+            are repeated at the start of the next chunk
+        tokenizer: Token counter (defaults to tokenizer.tokenizer)
+    
+    Yields:
+        Chunks with content, word_count, token_count (sum of sentence
+        counts), chunk_index, byte_start, byte_end
+    """
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be in [0, max_tokens)")
+    if tokenizer is None:
+        from tokenizer import tokenizer
+    
+    current = []  # (text, tokens, byte start, byte end, paragraph number)
+    current_tokens = 0
+    chunk_index = 0
+    
+    def emit():
+        parts = [current[0][0]]
+        for previous, unit in zip(current, current[1:]):
+            parts.append('\n\n' if unit[4] != previous[4] else ' ')
+            parts.append(unit[0])
+        content = ''.join(parts)
+        return {
+            'content': content,
+            'word_count': count_words(content),
+            'token_count': current_tokens,
+            'chunk_index': chunk_index,
+            'byte_start': current[0][2],
+            'byte_end': current[-1][3]
+        }
+    
+    def units(batch):
+        counts = tokenizer.count_batch([text for text, _, _, _ in batch])
+        for (text, start, end, paragraph), tokens in zip(batch, counts):
+            if tokens <= max_tokens:
+                yield text, tokens, start, end, paragraph
+                continue
+            pieces = tokenizer.split(text, max_tokens)
+            for piece, piece_tokens in zip(pieces, tokenizer.count_batch(pieces, cache=False)):
+                yield piece, piece_tokens, start, end, paragraph
+    
+    with _open_source(source) as data:
+        released = 0
+        batch = []
+        paragraphs = 0
+        sentences = _iter_sentences(data)
+        
+        while True:
+            sentence = next(sentences, None)
+            if sentence is not None:
+                if batch and sentence[3] != batch[-1][3]:
+                    paragraphs += 1
+                batch.append(sentence)
+                if paragraphs < _TOKENIZE_BATCH:
+                    continue
+            if not batch:
+                break
+            
+            for unit in units(batch):
+                if current and current_tokens + unit[1] > max_tokens:
+                    yield emit()
+                    chunk_index += 1
+                    
+                    # Carry trailing whole sentences into the next chunk
+                    carried = 0
+                    keep = len(current)
+                    while keep > 0 and carried + current[keep - 1][1] <= overlap_tokens:
+                        keep -= 1
+                        carried += current[keep][1]
+                    current = current[keep:]
+                    while current and carried + unit[1] > max_tokens:
+                        carried -= current.pop(0)[1]
+                    current_tokens = carried
+                
+                current.append(unit)
+                current_tokens += unit[1]
+            
+            batch = []
+            paragraphs = 0
+            if current:
+                released = _release(data, released, current[0][2])
+            if sentence is None:
+                break
+        
+        # Add remaining chunk
+        if current:
+            yield emit()
+
+
+def chunk_text_by_tokens(
+    text: str,
+    max_tokens: int = 512,
+    overlap_tokens: int = 0,
+    tokenizer=None
+) -> List[Dict[str, any]]:
+    """
+    Split text into chunks of at most max_tokens tokens
+    
+    Args:
+        text: Input text to chunk
+        max_tokens: Token budget per chunk
+        overlap_tokens: Tokens of trailing sentences repeated in the next chunk
+        tokenizer: Token counter (defaults to tokenizer.tokenizer)
+    
+    Returns:
+        List of chunks with content, word_count, token_count, chunk_index
+    """
+    return list(iter_token_chunks(text.encode('utf-8'), max_tokens, overlap_tokens, tokenizer))
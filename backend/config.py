@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -8,21 +8,130 @@ class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str
     openai_model: str = "gpt-3.5-turbo"
-    embedding_model: str = "text-embedding-3-small"
+    embedding_model: str = "text-embedding-3-small"  # Or "local:hashing" / "local:<sentence-transformers model>"
     embedding_dimension: int = 1536
+    openai_base_url: Optional[str] = None
+    openai_max_connections: int = 100
+    openai_timeout: float = 60.0  # Per attempt (see *_DEADLINE for whole calls)
+    openai_max_concurrency: int = 64  # Calls in flight per API (embeddings, chat)
+    embedding_batch_size: int = 64  # Concurrent question embeddings sent as one request (1 disables)
+    embedding_batch_wait_ms: float = 5.0  # How long they are collected while a request is in flight
+    
+    # Local embeddings (EMBEDDING_MODEL=local:...)
+    local_embedding_threads: int = 2  # Inference threads
+    local_embedding_batch_size: int = 64  # Max texts per forward pass
+    local_embedding_batch_wait_ms: float = 2.0  # How long concurrent queries are collected
+    local_embedding_backend: str = "torch"  # sentence-transformers backend: "torch" or "onnx"
+    
+    # Upstream resilience (OpenAI and Pinecone calls)
+    embedding_deadline: float = 10.0  # Seconds per call, including retries
+    embedding_batch_deadline: float = 120.0  # Bulk embedding calls (ingestion, batch endpoint)
+    chat_deadline: float = 60.0
+    pinecone_deadline: float = 5.0
+    upstream_max_retries: int = 3
+    upstream_backoff_base: float = 0.25  # First retry waits up to this; doubles each time
+    upstream_backoff_max: float = 8.0
+    upstream_breaker_failures: int = 5  # Transient failures in a row that open the circuit
+    upstream_breaker_reset: float = 30.0  # Seconds the circuit stays open before a probe
+    serve_stale_answers: bool = True  # Answer from expired cache entries while OpenAI is down
+    
+    # Query embedding cache (size 0 disables it)
+    embedding_cache_size: int = 10000
+    embedding_cache_ttl: float = 86400.0
+    embedding_cache_path: Optional[str] = None
+    
+    # Semantic answer cache (size 0 disables it)
+    answer_cache_size: int = 1000
+    answer_cache_threshold: float = 0.92
+    answer_cache_ttl: float = 3600.0
+    answer_cache_path: Optional[str] = None  # SQLite file shared by all workers
+    
+    # Server-side conversations (CONVERSATION_MAX=0 disables them)
+    conversation_max: int = 10000  # Conversations kept in memory
+    conversation_max_turns: int = 20
+    conversation_ttl: float = 86400.0
+    conversation_store_path: Optional[str] = None  # SQLite file shared by all workers
+    query_rewrite: str = "heuristic"  # Follow-up rewriting: "off", "heuristic" or "llm"
+    query_rewrite_model: Optional[str] = None  # Defaults to openai_model
+    
+    # Vector store ("pinecone" or "local")
+    vector_backend: str = "pinecone"
+    local_index_path: str = "data/local_index"
+    local_index_mode: str = "exact"  # "exact" or "ivfpq"
+    local_vector_dtype: str = "float32"  # "float32", "float16" or "int8"
+    local_vector_dimensions: Optional[int] = None  # Keep the first N dims (text-embedding-3-* only)
+    ann_nlist: int = 1024
+    ann_nprobe: int = 16
+    ann_pq_m: int = 64
+    ann_rerank_factor: int = 4
+    ann_min_vectors: int = 50000
+    
+    # Hybrid retrieval: BM25 lexical index fused with vector search
+    hybrid_search: bool = False  # Opt-in; keeps a BM25 index in each process
+    bm25_index_path: str = "data/bm25_index"
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    retrieval_top_k: int = 5
+    hybrid_candidates: int = 20  # Results taken from each ranking before fusion
+    rrf_k: int = 60
+    
+    # Re-ranking: over-fetch candidates, re-score on CPU, keep the best few
+    rerank_enabled: bool = False
+    rerank_candidates: int = 20  # Retrieved per question before re-ranking
+    rerank_top_k: int = 3  # Kept per question after re-ranking
+    rerank_min_score: float = 0.0  # Drop candidates below this relevance
+    rerank_weight: float = 0.5  # Share of relevance from the re-ranking signal vs. retrieval score
+    rerank_diversity: float = 0.3  # MMR trade-off: 0 = relevance only
+    rerank_model: Optional[str] = None  # Local cross-encoder (needs sentence-transformers)
     
     # Pinecone
     pinecone_api_key: str
     pinecone_environment: str = "gcp-starter"
     pinecone_index_name: str = "acme-docs"
+    pinecone_host: Optional[str] = None
+    pinecone_index_host: Optional[str] = None
+    pinecone_pool_threads: int = 32
+    content_store_path: Optional[str] = None  # SQLite file for chunk text; unset keeps it in metadata
     
     # API
     api_host: str = "0.0.0.0"
     api_port: int = 8000
+    api_workers: int = 0  # serve.py worker processes; 0 = one per CPU core
     cors_origins: str = "http://localhost:3000,http://localhost:3001"
+    chat_batch_max_items: int = 256
+    chat_batch_concurrency: int = 16  # Answers generated at once per batch request
+    
+    # Observability
+    log_level: str = "INFO"  # DEBUG adds per-chunk scores and stage timings
+    log_format: str = "text"  # "text" or "json"
+    metrics_enabled: bool = True  # Prometheus metrics on GET /metrics
     
     # Chunking
     chunk_size: int = 512
+    chunk_overlap: int = 0
+    chunk_unit: str = "words"  # "words" or "tokens"
+    tokenizer_encoding: Optional[str] = None  # Defaults to embedding_model's encoding
+    tokenizer_cache_size: int = 65536
+    
+    # Prompt token budget (system prompt + history + context + question)
+    context_token_budget: int = 3000
+    history_token_budget: int = 800
+    context_min_chunk_tokens: int = 64  # Smallest truncated chunk/answer worth sending
+    
+    # Ingestion
+    ingest_manifest_path: str = "data/ingest_manifest.sqlite"
+    ingest_batch_size: int = 256
+    ingest_batch_tokens: int = 100000
+    ingest_concurrency: int = 4
+    ingest_queue_size: int = 2048
+    ingest_processes: int = 0  # Text extraction processes; 0 = one per CPU core, 1 = in-process
+    
+    # Document management API (/api/documents; off until DOCUMENT_API_KEY is set)
+    documents_dir: Optional[str] = None  # Where documents are kept; defaults to backend/documents
+    document_workers: int = 2  # Background ingestion jobs at once (0 disables the API)
+    document_max_bytes: int = 10_000_000  # Largest accepted upload
+    document_api_key: Optional[str] = None  # Required as X-API-Key on document endpoints
+    document_jobs_kept: int = 1000  # Finished jobs remembered for GET /api/documents/jobs/{id}
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,125 @@
+"""
+Local chunk text store for the Pinecone backend
+Keeps chunk content out of Pinecone metadata: queries return only ids and
+scores, and the chunk fields are read here in one bulk lookup
+"""
+
+from typing import Dict, Iterable, List
+from pathlib import Path
+import sqlite3
+import threading
+
+from vector_base import chunk_vector_id
+
+# Bound parameters per IN (...) query; SQLite's default limit is 999 on older builds
+_MAX_VARIABLES = 900
+
+
+class ContentStore:
+    """SQLite table of chunk fields keyed by vector id"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        
+        db = self._connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT PRIMARY KEY, document_name TEXT NOT NULL, chunk_index INTEGER NOT NULL, "
+            "word_count INTEGER NOT NULL, token_count INTEGER, content TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_name)")
+        # Structural metadata from document extraction (added after the first release)
+        columns = {row[1] for row in db.execute("PRAGMA table_info(chunks)")}
+        for column, kind in (("page", "INTEGER"), ("heading", "TEXT")):
+            if column not in columns:
+                db.execute(f"ALTER TABLE chunks ADD COLUMN {column} {kind}")
+        db.commit()
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection: WAL lets searches read while ingestion writes"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA mmap_size=268435456")  # Serve hot pages from the page cache
+            self._local.db = db
+        return db
+    
+    def put(self, chunks: Iterable[Dict], document_name: str) -> int:
+        """
+        Insert or replace chunk fields
+        
+        Args:
+            chunks: Chunk dicts (content, word_count, chunk_index and
+                optionally token_count, page and heading)
+            document_name: Source document of every chunk
+        
+        Returns:
+            Number of chunks written
+        """
+        rows = [
+            (
+                chunk_vector_id(chunk, document_name), document_name, chunk['chunk_index'], chunk['word_count'],
+                chunk.get('token_count'), chunk['content'], chunk.get('page'), chunk.get('heading')
+            )
+            for chunk in chunks
+        ]
+        db = self._connection()
+        with self._write_lock, db:
+            db.executemany(
+                "INSERT OR REPLACE INTO chunks (id, document_name, chunk_index, word_count, "
+                "token_count, content, page, heading) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+    
+    def get_many(self, vector_ids: List[str]) -> Dict[str, Dict]:
+        """Chunk fields by vector id, for the ids that are stored"""
+        db = self._connection()
+        found = {}
+        for start in range(0, len(vector_ids), _MAX_VARIABLES):
+            batch = vector_ids[start:start + _MAX_VARIABLES]
+            placeholders = ",".join("?" * len(batch))
+            for row in db.execute(
+                "SELECT id, document_name, chunk_index, word_count, token_count, content, "
+                f"page, heading FROM chunks WHERE id IN ({placeholders})",
+                batch
+            ):
+                fields = found[row[0]] = {
+                    'document_name': row[1],
+                    'content': row[5],
+                    'word_count': row[3],
+                    'token_count': row[4],
+                    'chunk_index': row[2]
+                }
+                if row[6] is not None:
+                    fields['page'] = row[6]
+                if row[7] is not None:
+                    fields['heading'] = row[7]
+        return found
+    
+    def delete(self, vector_ids: List[str]) -> int:
+        """Delete chunks by vector id"""
+        db = self._connection()
+        with self._write_lock, db:
+            for start in range(0, len(vector_ids), _MAX_VARIABLES):
+                batch = vector_ids[start:start + _MAX_VARIABLES]
+                db.execute(
+                    f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                )
+        return len(vector_ids)
+    
+    def delete_document(self, document_name: str) -> int:
+        """Delete every chunk of a document, returning how many were removed"""
+        db = self._connection()
+        with self._write_lock, db:
+            return db.execute(
+                "DELETE FROM chunks WHERE document_name = ?", (document_name,)
+            ).rowcount
+    
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
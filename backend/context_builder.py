@@ -0,0 +1,192 @@
+"""
+Token-budgeted prompt assembly
+Packs the highest-scoring retrieved chunks and the most recent history
+turns into a fixed prompt token budget, dropping text repeated across
+overlapping chunks
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+import re
+
+from config import settings
+from openai_client import MAX_HISTORY_TURNS, build_messages
+from tokenizer import tokenizer
+
+
+# Chat format overhead per message (role and delimiters), per OpenAI's guidance
+MESSAGE_OVERHEAD_TOKENS = 4
+
+CHUNK_SEPARATOR = "\n\n---\n\n"
+
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+
+class PackedContext(NamedTuple):
+    """Result of packing a prompt into the token budget"""
+    context: str                # Context block for build_messages
+    chunks: List[Dict]          # Retrieved chunks that made it in, best first
+    history: List[dict]         # History turns that made it in, oldest first
+    report: Dict[str, int]      # Tokens spent per section
+
+
+def source_header(position: int, chunk: Dict) -> str:
+    """Label introducing each chunk in the context block, with its page and headings if known"""
+    label = chunk['document_name']
+    if chunk.get('page'):
+        label += f", page {chunk['page']}"
+    if chunk.get('heading'):
+        label += f", {chunk['heading']}"
+    return f"[Source {position}: {label}]\n"
+
+
+def _normalize(sentence: str) -> str:
+    return " ".join(sentence.split()).casefold()
+
+
+def dedupe_chunks(chunks: List[Dict]) -> List[Dict]:
+    """
+    Drop sentences already present in a higher-scoring chunk
+    
+    Overlapping chunk windows (CHUNK_OVERLAP) and repeated boilerplate
+    would otherwise be paid for twice. Chunks left with no new text are
+    removed; trimmed chunks are copies with `content` rewritten and
+    `token_count` cleared.
+    
+    Args:
+        chunks: Retrieved chunks, best first
+    
+    Returns:
+        Chunks in the same order with repeated sentences removed
+    """
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        sentences = _SENTENCE_BREAK.split(chunk['content'].strip())
+        kept = []
+        for sentence in sentences:
+            key = _normalize(sentence)
+            if key and key not in seen:
+                seen.add(key)
+                kept.append(sentence)
+        
+        if not kept:
+            continue
+        if len(kept) == len(sentences):
+            unique.append(chunk)
+        else:
+            unique.append({**chunk, 'content': " ".join(kept), 'token_count': None})
+    return unique
+
+
+def _message_tokens(texts: List[str]) -> int:
+    counts = tokenizer.count_batch(texts, cache=False)
+    return sum(counts) + MESSAGE_OVERHEAD_TOKENS * len(texts)
+
+
+def _pack_history(history: List[dict], budget: int) -> List[dict]:
+    """Newest turns first while they fit; the oldest kept answer may be cut"""
+    packed = []
+    remaining = budget
+    for turn in reversed(history[-MAX_HISTORY_TURNS:]):
+        question = turn.get("question", "")
+        answer = turn.get("answer", "")
+        question_tokens, answer_tokens = tokenizer.count_batch([question, answer], cache=False)
+        cost = question_tokens + answer_tokens + 2 * MESSAGE_OVERHEAD_TOKENS
+        
+        if cost > remaining:
+            room = remaining - question_tokens - 2 * MESSAGE_OVERHEAD_TOKENS
+            if room >= settings.context_min_chunk_tokens:
+                packed.append({
+                    "question": question,
+                    "answer": tokenizer.split(answer, room)[0]
+                })
+            break
+        
+        packed.append(turn)
+        remaining -= cost
+    
+    packed.reverse()
+    return packed
+
+
+def pack_context(
+    question: str,
+    chunks: List[Dict],
+    conversation_history: Optional[List[dict]] = None,
+    budget: Optional[int] = None,
+    history_budget: Optional[int] = None
+) -> PackedContext:
+    """
+    Fit retrieved chunks and history into the prompt token budget
+    
+    The system prompt, prompt template and question are always included.
+    History gets at most `history_budget` tokens, newest turns first; the
+    rest of the budget is filled with chunks in retrieval order, after
+    removing repeated sentences. The chunk that crosses the budget is
+    truncated if enough room is left, and packing stops there.
+    
+    Args:
+        question: User's question
+        chunks: Retrieved chunks, best first
+        conversation_history: Previous turns as {"question", "answer"} dicts
+        budget: Total prompt tokens (defaults to CONTEXT_TOKEN_BUDGET)
+        history_budget: Cap for history tokens (defaults to HISTORY_TOKEN_BUDGET)
+    
+    Returns:
+        PackedContext with the context string, the chunks and history turns
+        used, and a per-section token report
+    """
+    budget = budget or settings.context_token_budget
+    history_budget = settings.history_token_budget if history_budget is None else history_budget
+    
+    # Everything but context and history: system prompt, template, question
+    fixed = _message_tokens([m["content"] for m in build_messages(question, "", None)])
+    
+    history = _pack_history(
+        conversation_history or [],
+        min(history_budget, max(0, budget - fixed))
+    )
+    history_tokens = _message_tokens([
+        text for turn in history
+        for text in (turn.get("question", ""), turn.get("answer", ""))
+    ]) if history else 0
+    
+    # Stored token counts are reused; only trimmed or legacy chunks are encoded
+    candidates = dedupe_chunks(chunks)
+    uncounted = [chunk['content'] for chunk in candidates if not chunk.get('token_count')]
+    counted = iter(tokenizer.count_batch(uncounted, cache=False))
+    token_counts = [chunk.get('token_count') or next(counted) for chunk in candidates]
+    
+    separator_tokens = tokenizer.count(CHUNK_SEPARATOR)
+    remaining = budget - fixed - history_tokens
+    parts = []
+    used = []
+    for chunk, chunk_tokens in zip(candidates, token_counts):
+        header = source_header(len(parts) + 1, chunk)
+        overhead = tokenizer.count(header) + (separator_tokens if parts else 0)
+        cost = overhead + chunk_tokens
+        
+        if cost > remaining:
+            room = remaining - overhead
+            if room >= settings.context_min_chunk_tokens:
+                parts.append(header + tokenizer.split(chunk['content'], room)[0])
+                used.append(chunk)
+                remaining -= overhead + room
+            break
+        
+        parts.append(header + chunk['content'])
+        used.append(chunk)
+        remaining -= cost
+    
+    context_tokens = budget - fixed - history_tokens - remaining
+    report = {
+        "budget": budget,
+        "fixed": fixed,
+        "history": history_tokens,
+        "context": context_tokens,
+        "total": fixed + history_tokens + context_tokens,
+        "chunks_used": len(used),
+        "chunks_dropped": len(chunks) - len(used),
+        "history_turns": len(history)
+    }
+    return PackedContext(CHUNK_SEPARATOR.join(parts), used, history, report)
@@ -0,0 +1,202 @@
+"""
+Server-side conversation history
+Keeps the recent turns of each conversation, and the standalone query each
+follow-up was rewritten to, so clients send only the new question and
+their conversation id; optionally backed by SQLite so workers share them
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+from collections import OrderedDict
+from pathlib import Path
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import settings
+
+
+class Turn(NamedTuple):
+    """A question being answered within a conversation"""
+    conversation_id: Optional[str]
+    question: str           # As asked
+    query: str              # Standalone form used for retrieval
+    history: List[dict]     # Earlier turns (question, answer, query), oldest first
+
+
+class ConversationStore:
+    """
+    Recent turns per conversation id, with memoized query rewrites
+    
+    Without a path, conversations live in an in-memory LRU. With a path,
+    SQLite (WAL) is the only copy, so a follow-up reaching a different
+    worker process still sees every earlier turn. Turns older than
+    ttl_seconds are forgotten.
+    """
+    
+    def __init__(
+        self,
+        max_conversations: int = 10000,
+        max_turns: int = 20,
+        ttl_seconds: float = 86400,
+        path: Optional[str] = None
+    ):
+        self.max_conversations = max_conversations
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        # conversation id -> {"turns": [(question, answer, query, created)], "rewrites": {...}}
+        self._conversations: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rewrite_hits = 0
+        self.rewrite_misses = 0
+        
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            # WAL: other workers keep reading while one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "conversation_id TEXT NOT NULL, position INTEGER NOT NULL, question TEXT NOT NULL, "
+                "answer TEXT NOT NULL, query TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (conversation_id, position))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS turns_created ON turns (created)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rewrites ("
+                "conversation_id TEXT NOT NULL, position INTEGER NOT NULL, question TEXT NOT NULL, "
+                "query TEXT NOT NULL, PRIMARY KEY (conversation_id, position, question))"
+            )
+            self._db.commit()
+    
+    @staticmethod
+    def new_id() -> str:
+        """A fresh conversation id"""
+        return uuid.uuid4().hex
+    
+    def history(self, conversation_id: str) -> List[dict]:
+        """Earlier turns of a conversation, oldest first (empty if unknown or expired)"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT question, answer, query FROM turns WHERE conversation_id = ? AND created >= ? "
+                    "ORDER BY position DESC LIMIT ?",
+                    (conversation_id, cutoff, self.max_turns)
+                ).fetchall()
+                return [
+                    {"question": question, "answer": answer, "query": query}
+                    for question, answer, query in reversed(rows)
+                ]
+            
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return []
+            self._conversations.move_to_end(conversation_id)
+            return [
+                {"question": question, "answer": answer, "query": query}
+                for question, answer, query, created in conversation["turns"]
+                if created >= cutoff
+            ]
+    
+    def append(self, turn: Turn, answer: str):
+        """Record an answered turn (and forget rewrites made for the previous state)"""
+        if turn.conversation_id is None:
+            return
+        created = time.time()
+        position = len(turn.history)
+        
+        with self._lock:
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO turns VALUES (?, "
+                    "(SELECT COALESCE(MAX(position), -1) + 1 FROM turns WHERE conversation_id = ?), "
+                    "?, ?, ?, ?)",
+                    (turn.conversation_id, turn.conversation_id, turn.question, answer, turn.query, created)
+                )
+                self._db.execute(
+                    "DELETE FROM turns WHERE created < ? OR (conversation_id = ? AND position < "
+                    "(SELECT MAX(position) FROM turns WHERE conversation_id = ?) + 1 - ?)",
+                    (created - self.ttl_seconds, turn.conversation_id, turn.conversation_id, self.max_turns)
+                )
+                self._db.execute(
+                    "DELETE FROM rewrites WHERE conversation_id = ? AND position <= ?",
+                    (turn.conversation_id, position)
+                )
+                self._db.commit()
+                return
+            
+            conversation = self._conversations.setdefault(
+                turn.conversation_id, {"turns": [], "rewrites": {}}
+            )
+            self._conversations.move_to_end(turn.conversation_id)
+            conversation["turns"].append((turn.question, answer, turn.query, created))
+            del conversation["turns"][:-self.max_turns]
+            conversation["rewrites"].clear()
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+    
+    def cached_rewrite(self, conversation_id: str, position: int, question: str) -> Optional[str]:
+        """Standalone query already computed for this question at this point of the conversation"""
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT query FROM rewrites WHERE conversation_id = ? AND position = ? AND question = ?",
+                    (conversation_id, position, question)
+                ).fetchone()
+                query = row[0] if row else None
+            else:
+                conversation = self._conversations.get(conversation_id)
+                query = conversation["rewrites"].get((position, question)) if conversation else None
+            
+            if query is None:
+                self.rewrite_misses += 1
+            else:
+                self.rewrite_hits += 1
+            return query
+    
+    def store_rewrite(self, conversation_id: str, position: int, question: str, query: str):
+        """Memoize a rewrite until the conversation moves on"""
+        with self._lock:
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO rewrites VALUES (?, ?, ?, ?)",
+                    (conversation_id, position, question, query)
+                )
+                self._db.commit()
+                return
+            
+            conversation = self._conversations.setdefault(
+                conversation_id, {"turns": [], "rewrites": {}}
+            )
+            conversation["rewrites"][(position, question)] = query
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+    
+    def stats(self) -> Dict:
+        """Conversation count and rewrite memo counters for monitoring"""
+        with self._lock:
+            if self._db is not None:
+                count = self._db.execute(
+                    "SELECT COUNT(DISTINCT conversation_id) FROM turns"
+                ).fetchone()[0]
+            else:
+                count = len(self._conversations)
+        lookups = self.rewrite_hits + self.rewrite_misses
+        return {
+            "conversations": count,
+            "rewrite_hits": self.rewrite_hits,
+            "rewrite_misses": self.rewrite_misses,
+            "rewrite_hit_rate": round(self.rewrite_hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global conversation store (disabled when CONVERSATION_MAX=0)
+conversations = ConversationStore(
+    max_conversations=settings.conversation_max,
+    max_turns=settings.conversation_max_turns,
+    ttl_seconds=settings.conversation_ttl,
+    path=settings.conversation_store_path
+) if settings.conversation_max > 0 else None
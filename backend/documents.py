@@ -0,0 +1,298 @@
+"""
+Live document management
+Uploads, replacements and deletions from the /api/documents endpoints are
+queued as jobs and ingested by a pool of background workers; only changed
+chunks are re-embedded, and each document switches versions in one step
+"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import uuid
+
+import metrics
+from config import settings
+from extractors import supported_extensions
+from ingestion import LEASE_POLL_SECONDS, LEASE_SECONDS, IngestionPipeline
+from load_documents import DOCUMENTS_DIR
+from models import DocumentInfo, DocumentJob
+from vector_store import vector_store
+
+
+logger = logging.getLogger(__name__)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class DocumentManager:
+    """
+    Queue of document jobs drained by `workers` background tasks
+    
+    Uploaded files are written under `root` (so load_documents.py sees the
+    same tree) and ingested with IngestionPipeline.ingest_document: new
+    vectors are hidden until the whole version is stored, then published
+    in one manifest transaction. Jobs live in the shared ingestion
+    manifest, so every serve.py worker can report them. A job runs while
+    holding its document's lease there, so jobs for one document never
+    overlap, even on different workers; a job that a newer one for the
+    same document has replaced before it started is skipped as superseded.
+    """
+    
+    def __init__(
+        self,
+        pipeline: IngestionPipeline,
+        root: Path,
+        workers: int = 2,
+        jobs_kept: int = 1000
+    ):
+        self.pipeline = pipeline
+        self.manifest = pipeline.manifest
+        self.root = root
+        self.workers = workers
+        self.jobs_kept = jobs_kept
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.superseded = 0
+    
+    def start(self):
+        """Start the workers on the running event loop (idempotent)"""
+        if self._tasks:
+            return
+        # Jobs queued by workers that have since exited will never run
+        finished = datetime.utcnow().isoformat()
+        for owner in self.manifest.job_owners():
+            if owner != os.getpid() and not _process_alive(owner):
+                self.manifest.fail_jobs(owner, "Interrupted: its worker exited", finished)
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"document-worker-{i}")
+            for i in range(self.workers)
+        ]
+    
+    async def stop(self):
+        """Cancel the workers; queued jobs are dropped and recorded as failed"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self.manifest.fail_jobs(
+            os.getpid(), "Interrupted: the server stopped", datetime.utcnow().isoformat()
+        )
+        self.pipeline.close()
+    
+    def document_name(self, name: str) -> str:
+        """
+        Normalize a document name, rejecting anything that is not a file under root
+        
+        Raises:
+            ValueError: for absolute paths, '..', or unsupported file types
+        """
+        path = PurePosixPath(name.strip())
+        if not path.parts or path.is_absolute() or ".." in path.parts or "\\" in name:
+            raise ValueError(f"Invalid document name: {name!r}")
+        if path.suffix.lower() not in supported_extensions():
+            raise ValueError(
+                f"Unsupported document type {path.suffix!r} "
+                f"(supported: {', '.join(supported_extensions())})"
+            )
+        return path.as_posix()
+    
+    def exists(self, document_name: str) -> bool:
+        """Whether the document is indexed, on disk, or about to be uploaded"""
+        return (
+            document_name in self.manifest.chunk_counts()
+            or (self.root / document_name).is_file()
+            or self.manifest.pending_jobs().get(document_name) == "upsert"
+        )
+    
+    def submit(self, document_name: str, content: Optional[bytes]) -> DocumentJob:
+        """
+        Queue an upload (content) or deletion (None) of a document
+        
+        Args:
+            document_name: Normalized name (see document_name())
+            content: The new version's file contents, or None to delete
+        
+        Returns:
+            The queued job
+        """
+        self.start()
+        job = DocumentJob(
+            job_id=uuid.uuid4().hex[:12],
+            document_name=document_name,
+            action="delete" if content is None else "upsert",
+            created=datetime.utcnow().isoformat()
+        )
+        self.manifest.add_job(job.model_dump(), os.getpid(), self.jobs_kept)
+        self._queue.put_nowait((job, content))
+        return job
+    
+    def job(self, job_id: str) -> Optional[DocumentJob]:
+        job = self.manifest.job(job_id)
+        return DocumentJob(**job) if job is not None else None
+    
+    def documents(self) -> List[DocumentInfo]:
+        """Indexed documents, plus ones whose first upload is still running"""
+        counts = self.manifest.chunk_counts()
+        pending = self.manifest.pending_jobs()
+        names = sorted(set(counts) | {
+            name for name, action in pending.items() if action == "upsert"
+        })
+        return [
+            DocumentInfo(
+                document_name=name,
+                chunks=counts.get(name, 0),
+                pending=name in pending
+            )
+            for name in names
+        ]
+    
+    def hidden(self, vector_ids: List[str]) -> Set[str]:
+        """Ids of vectors that are staged or retired and must not be served"""
+        return self.manifest.hidden(vector_ids) if vector_ids else set()
+    
+    def hidden_count(self) -> int:
+        """Vectors hidden right now, which searches over-fetch to make up for"""
+        return self.manifest.staged_count()
+    
+    def stats(self) -> Dict:
+        """Queue and job counters for monitoring (jobs run by this worker)"""
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending_documents": len(self.manifest.pending_jobs()),
+            "completed": self.completed,
+            "failed": self.failed,
+            "superseded": self.superseded,
+        }
+    
+    async def _worker(self):
+        while True:
+            job, content = await self._queue.get()
+            try:
+                await self._run(job, content)
+            finally:
+                self._queue.task_done()
+    
+    async def _run(self, job: DocumentJob, content: Optional[bytes]):
+        """Run one job under its document's lease, unless a newer job replaced it"""
+        name = job.document_name
+        async with self._lease(name, job.job_id):
+            latest = await asyncio.to_thread(self.manifest.latest_job, name)
+            if latest != job.job_id:
+                job.status = "superseded"
+                job.finished = datetime.utcnow().isoformat()
+                self.superseded += 1
+                await asyncio.to_thread(self.manifest.update_job, job.model_dump())
+                metrics.record_document_job(job.action, job.status)
+                return
+            
+            job.status = "running"
+            await asyncio.to_thread(self.manifest.update_job, job.model_dump())
+            path = self.root / name
+            try:
+                if content is None:
+                    # File first: if we stop halfway, load_documents.py prunes the rest
+                    await asyncio.to_thread(path.unlink, missing_ok=True)
+                    job.stats = await self.pipeline.remove_document(name)
+                else:
+                    signature = await asyncio.to_thread(self._write, path, content)
+                    job.stats = await self.pipeline.ingest_document(name, path, signature)
+                job.status = "done"
+                self.completed += 1
+                logger.info("Document %s %s: %s", job.action, name, job.stats)
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+                self.failed += 1
+                logger.exception("Document %s %s failed: %s", job.action, name, e)
+            finally:
+                job.finished = datetime.utcnow().isoformat()
+                await asyncio.shield(
+                    asyncio.to_thread(self.manifest.update_job, job.model_dump())
+                )
+            metrics.record_document_job(job.action, job.status, job.stats)
+    
+    @asynccontextmanager
+    async def _lease(self, document_name: str, holder: str):
+        """Hold the document's lease in the manifest, renewing it until the block exits"""
+        while not await asyncio.to_thread(
+            self.manifest.acquire_lease, document_name, holder, LEASE_SECONDS
+        ):
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+        
+        async def renew():
+            while True:
+                await asyncio.sleep(LEASE_SECONDS / 3)
+                await asyncio.to_thread(
+                    self.manifest.acquire_lease, document_name, holder, LEASE_SECONDS
+                )
+        
+        renewer = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+            await asyncio.shield(
+                asyncio.to_thread(self.manifest.release_lease, document_name, holder)
+            )
+    
+    @staticmethod
+    def _write(path: Path, content: bytes) -> Tuple[int, int]:
+        """Replace a file atomically, returning its (size, mtime_ns)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        temporary.write_bytes(content)
+        os.replace(temporary, path)
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+
+def disabled_reason() -> Optional[str]:
+    """Why the document API cannot run in this deployment, or None if it can"""
+    if settings.document_workers <= 0:
+        return "DOCUMENT_WORKERS=0"
+    if not settings.document_api_key:
+        return "set DOCUMENT_API_KEY to enable /api/documents"
+    # Indexes held in each process: an update would only reach one worker's copy,
+    # and each worker would overwrite the others' files when it saves
+    unshared = []
+    if settings.vector_backend == "local":
+        unshared.append("the local vector index")
+    if settings.hybrid_search:
+        unshared.append("the BM25 index")
+    if settings.api_workers > 1 and unshared:
+        return (
+            f"{' and '.join(unshared)} cannot be updated live by {settings.api_workers} "
+            f"serve.py workers; run one worker, or use Pinecone with HYBRID_SEARCH=false"
+        )
+    return None
+
+
+# Global document manager (None when disabled; see disabled_reason())
+_disabled = disabled_reason()
+document_manager = DocumentManager(
+    IngestionPipeline(vector_store),
+    DOCUMENTS_DIR,
+    workers=settings.document_workers,
+    jobs_kept=settings.document_jobs_kept
+) if _disabled is None else None
+
+if _disabled is not None and settings.document_workers > 0:
+    logger.warning("Document API disabled: %s", _disabled)
@@ -0,0 +1,154 @@
+"""
+Bounded cache for query embeddings
+In-memory LRU with TTL expiry, optionally backed by SQLite so warm
+restarts keep their hits and worker processes share them
+"""
+
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from array import array
+from pathlib import Path
+import hashlib
+import sqlite3
+import threading
+import time
+
+# How long a lookup waits for another process's write before counting as a
+# miss. The cache is read on the event loop, so it must never wait long.
+_BUSY_TIMEOUT = 0.05
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different repeats share a key"""
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """LRU + TTL cache of embedding vectors keyed on (model, normalized text)"""
+    
+    def __init__(
+        self,
+        model: str,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400,
+        path: Optional[str] = None
+    ):
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.busy = 0
+        
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=_BUSY_TIMEOUT)
+            # WAL: other workers keep reading while one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created)"
+            )
+            self._db.commit()
+    
+    def key(self, text: str) -> str:
+        """Cache key for a text under the current embedding model"""
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.model}:{digest}"
+    
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for text, or None on a miss"""
+        key = self.key(text)
+        now = time.time()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, vector = entry
+                if now - created <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector.tolist()
+                del self._entries[key]
+            
+            if self._db is not None:
+                row = self._read(key)
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    vector = array('f')
+                    vector.frombytes(row[0])
+                    self._remember(key, row[1], vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector.tolist()
+            
+            self.misses += 1
+            return None
+    
+    def set(self, text: str, embedding: List[float]):
+        """Store an embedding (float32) in memory and, if enabled, on disk"""
+        key = self.key(text)
+        created = time.time()
+        vector = array('f', embedding)
+        
+        with self._lock:
+            self._remember(key, created, vector)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, created) VALUES (?, ?, ?)",
+                        (key, vector.tobytes(), created)
+                    )
+                    self._db.execute(
+                        "DELETE FROM embeddings WHERE created < ?",
+                        (created - self.ttl_seconds,)
+                    )
+                    self._db.commit()
+                except sqlite3.OperationalError:
+                    # Database busy in another process: keep the entry in memory only
+                    self._db.rollback()
+                    self.busy += 1
+    
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "busy": self.busy,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def _read(self, key: str) -> Optional[tuple]:
+        """(vector bytes, created) stored on disk for key; None if absent or busy (lock held)"""
+        try:
+            return self._db.execute(
+                "SELECT vector, created FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            self.busy += 1
+            return None
+    
+    def _remember(self, key: str, created: float, vector: array):
+        """Insert into the memory tier, evicting least recently used (lock held)"""
+        self._entries[key] = (created, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,407 @@
+"""
+Text extraction for PDF, DOCX, HTML, Markdown and plain-text documents
+Each extractor streams a file as sections (a page, or the text under a
+heading) that are chunked independently, so every chunk carries the page
+number and heading it came from
+"""
+
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Union
+from html.parser import HTMLParser
+from pathlib import Path
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+
+from chunking import Source, iter_token_chunks, iter_word_chunks
+from config import settings
+from tokenizer import tokenizer
+
+
+class Section(NamedTuple):
+    """A run of text that chunks do not cross"""
+    source: Union[Path, bytes]  # UTF-8 text, or the file itself for plain text
+    page: Optional[int]         # 1-based page number, when the format has pages
+    heading: Optional[str]      # Enclosing headings, outermost first, joined by " > "
+
+
+Extractor = Callable[[Path], Iterator[Section]]
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register_extractor(*extensions: str):
+    """Decorator registering an extractor for file extensions (e.g. ".rst")"""
+    def register(extractor: Extractor) -> Extractor:
+        for extension in extensions:
+            EXTRACTORS[extension.lower()] = extractor
+        return extractor
+    return register
+
+
+def supported_extensions() -> List[str]:
+    return sorted(EXTRACTORS)
+
+
+def supports(path: Path) -> bool:
+    return path.suffix.lower() in EXTRACTORS
+
+
+def default_chunker(source: Source):
+    """Chunk a file or buffer according to CHUNK_UNIT, CHUNK_SIZE and CHUNK_OVERLAP"""
+    if settings.chunk_unit == "tokens":
+        return iter_token_chunks(source, settings.chunk_size, settings.chunk_overlap)
+    return iter_word_chunks(source, settings.chunk_size, settings.chunk_overlap)
+
+
+def iter_document_chunks(source: Source, chunker: Callable = default_chunker) -> Iterator[Dict]:
+    """
+    Stream the chunks of a document, section by section
+    
+    Args:
+        source: File path (extracted according to its extension), or a
+            bytes-like buffer of UTF-8 text
+        chunker: Splits one section (a path or bytes) into chunks
+    
+    Yields:
+        Chunks numbered across the whole document, with 'page' and
+        'heading' when the section has them. Byte ranges are kept only
+        when they are offsets into the source file itself.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        sections = iter([Section(source, None, None)])
+    else:
+        path = Path(source)
+        extractor = EXTRACTORS.get(path.suffix.lower())
+        if extractor is None:
+            raise ValueError(f"No extractor for {path.suffix!r} files ({path.name})")
+        sections = extractor(path)
+    
+    chunk_index = 0
+    for section in sections:
+        raw_offsets = section.source is source or isinstance(section.source, Path)
+        for chunk in chunker(section.source):
+            chunk['chunk_index'] = chunk_index
+            chunk_index += 1
+            if not raw_offsets:
+                chunk.pop('byte_start', None)
+                chunk.pop('byte_end', None)
+            if section.page is not None:
+                chunk['page'] = section.page
+            if section.heading:
+                chunk['heading'] = section.heading
+            yield chunk
+
+
+def chunk_document(source: Source, chunker: Callable = default_chunker) -> List[Dict]:
+    """
+    Extract, chunk and token-count one document
+    
+    Runs in an ingestion worker thread or process, so it only touches
+    modules that are cheap to import.
+    """
+    chunks = list(iter_document_chunks(source, chunker))
+    
+    # Word chunks get exact token counts too, in one batched call
+    uncounted = [chunk for chunk in chunks if 'token_count' not in chunk]
+    if uncounted:
+        counts = tokenizer.count_batch([chunk['content'] for chunk in uncounted], cache=False)
+        for chunk, count in zip(uncounted, counts):
+            chunk['token_count'] = count
+    return chunks
+
+
+class _Headings:
+    """Trail of enclosing headings, by level"""
+    
+    def __init__(self):
+        self._stack: List[tuple] = []
+    
+    def enter(self, level: int, text: str):
+        while self._stack and self._stack[-1][0] >= level:
+            self._stack.pop()
+        self._stack.append((level, text))
+    
+    @property
+    def trail(self) -> Optional[str]:
+        return " > ".join(text for _, text in self._stack) or None
+    
+    def section(self, text: str, page: Optional[int] = None) -> Optional[Section]:
+        """Section of text under the current headings (None if there is only the heading)"""
+        text = text.strip()
+        if not text or (self._stack and text == self._stack[-1][1]):
+            return None
+        return Section(text.encode("utf-8"), page, self.trail)
+
+
+@register_extractor(".txt")
+def extract_text(path: Path) -> Iterator[Section]:
+    """Plain text: the whole file, chunked straight from disk"""
+    yield Section(path, None, None)
+
+
+_ATX_HEADING = re.compile(r' {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+_SETEXT_UNDERLINE = re.compile(r' {0,3}(=+|-+)[ \t]*$')
+_FENCE = re.compile(r' {0,3}(`{3,}|~{3,})')
+
+
+@register_extractor(".md", ".markdown")
+def extract_markdown(path: Path) -> Iterator[Section]:
+    """Markdown: one section per heading (ATX and setext; not inside code fences)"""
+    headings = _Headings()
+    lines: List[str] = []
+    fence = None
+    
+    def section() -> Optional[Section]:
+        text = "\n".join(lines)
+        lines.clear()
+        return headings.section(text)
+    
+    with open(path, encoding="utf-8", errors="replace") as f:
+        first = True
+        in_front_matter = False
+        for line in f:
+            line = line.rstrip("\n")
+            if first:
+                first = False
+                if line.strip() == "---":
+                    in_front_matter = True
+                    continue
+            if in_front_matter:
+                in_front_matter = line.strip() not in ("---", "...")
+                continue
+            
+            opening = _FENCE.match(line)
+            if fence is not None:
+                closing = opening and opening.group(1)
+                if closing and closing[0] == fence[0] and len(closing) >= len(fence):
+                    fence = None
+                lines.append(line)
+                continue
+            if opening:
+                fence = opening.group(1)
+                lines.append(line)
+                continue
+            
+            atx = _ATX_HEADING.match(line)
+            underline = _SETEXT_UNDERLINE.match(line)
+            if atx:
+                level, title = len(atx.group(1)), (atx.group(2) or "").strip()
+            elif underline and lines and lines[-1].strip():
+                level, title = (1 if underline.group(1)[0] == "=" else 2), lines.pop().strip()
+            else:
+                lines.append(line)
+                continue
+            
+            previous = section()
+            if previous:
+                yield previous
+            headings.enter(level, title)
+            lines.append(title)
+        
+        last = section()
+        if last:
+            yield last
+
+
+class _HTMLSections(HTMLParser):
+    """Collects the visible text of an HTML document, split at h1-h6"""
+    
+    SKIPPED = {"script", "style", "noscript", "template", "head", "svg", "nav"}
+    BLOCKS = {
+        "p", "div", "section", "article", "aside", "header", "footer", "main",
+        "li", "ul", "ol", "dl", "dt", "dd", "tr", "table", "blockquote", "pre",
+        "figure", "figcaption", "form", "br", "hr"
+    }
+    HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.headings = _Headings()
+        self.sections: List[Section] = []
+        self._parts: List[str] = []
+        self._skipping = 0
+        self._heading_level = None
+        self._heading_parts: List[str] = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skipping += 1
+        elif tag in self.HEADINGS:
+            self.flush()
+            self._heading_level = self.HEADINGS[tag]
+            self._heading_parts = []
+        elif tag in self.BLOCKS:
+            self._parts.append("\n")
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.HEADINGS and self._heading_level is not None:
+            title = " ".join("".join(self._heading_parts).split())
+            self.headings.enter(self._heading_level, title)
+            self._parts.append(title + "\n")
+            self._heading_level = None
+        elif tag in self.BLOCKS:
+            self._parts.append("\n")
+    
+    def handle_data(self, data):
+        if self._skipping:
+            return
+        if self._heading_level is not None:
+            self._heading_parts.append(data)
+        else:
+            self._parts.append(data)
+    
+    def flush(self):
+        """End the current section"""
+        lines = (" ".join(line.split()) for line in "".join(self._parts).split("\n"))
+        text = "\n".join(line for line in lines if line)
+        self._parts = []
+        section = self.headings.section(text)
+        if section:
+            self.sections.append(section)
+
+
+@register_extractor(".html", ".htm")
+def extract_html(path: Path) -> Iterator[Section]:
+    """HTML: visible text, one section per h1-h6 heading, read incrementally"""
+    parser = _HTMLSections()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            data = f.read(1 << 16)
+            if not data:
+                break
+            parser.feed(data)
+            yield from parser.sections
+            parser.sections.clear()
+    parser.close()
+    parser.flush()
+    yield from parser.sections
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_HEADING_STYLE = re.compile(r'heading\s*(\d)', re.IGNORECASE)
+
+
+def _docx_heading_levels(archive: zipfile.ZipFile) -> Dict[str, int]:
+    """Paragraph style id -> heading level, from styles.xml"""
+    levels = {}
+    try:
+        root = ET.fromstring(archive.read("word/styles.xml"))
+    except KeyError:
+        return levels
+    for style in root.iter(f"{_W}style"):
+        style_id = style.get(f"{_W}styleId")
+        name = style.find(f"{_W}name")
+        name = name.get(f"{_W}val", "") if name is not None else ""
+        outline = style.find(f"{_W}pPr/{_W}outlineLvl")
+        if outline is not None:
+            levels[style_id] = int(outline.get(f"{_W}val", "0")) + 1
+        elif name.lower() == "title":
+            levels[style_id] = 1
+        elif _HEADING_STYLE.fullmatch(name):
+            levels[style_id] = int(_HEADING_STYLE.fullmatch(name).group(1))
+    return levels
+
+
+@register_extractor(".docx")
+def extract_docx(path: Path) -> Iterator[Section]:
+    """
+    Word documents: paragraphs in order, one section per heading and page
+    
+    Page numbers follow the page breaks stored in the file: explicit ones
+    and the ones Word recorded when it last laid the document out, so they
+    match what the author saw.
+    """
+    with zipfile.ZipFile(path) as archive:
+        levels = _docx_heading_levels(archive)
+        headings = _Headings()
+        page = 1
+        lines: List[str] = []
+        
+        def section() -> Optional[Section]:
+            text = "\n".join(lines)
+            lines.clear()
+            return headings.section(text, page)
+        
+        with archive.open("word/document.xml") as document:
+            for _, element in ET.iterparse(document):
+                if element.tag != f"{_W}p":
+                    continue
+                style = element.find(f"{_W}pPr/{_W}pStyle")
+                level = levels.get(style.get(f"{_W}val")) if style is not None else None
+                if element.find(f"{_W}pPr/{_W}pageBreakBefore") is not None:
+                    done = section()
+                    if done:
+                        yield done
+                    page += 1
+                
+                parts = []
+                for node in element.iter():
+                    if node.tag == f"{_W}t":
+                        parts.append(node.text or "")
+                    elif node.tag == f"{_W}tab":
+                        parts.append("\t")
+                    elif node.tag == f"{_W}br" and node.get(f"{_W}type") != "page":
+                        parts.append("\n")
+                    elif node.tag == f"{_W}lastRenderedPageBreak" or (
+                        node.tag == f"{_W}br" and node.get(f"{_W}type") == "page"
+                    ):
+                        lines.append("".join(parts))
+                        parts = []
+                        done = section()
+                        if done:
+                            yield done
+                        page += 1
+                text = "".join(parts)
+                element.clear()
+                
+                if level is not None and text.strip():
+                    done = section()
+                    if done:
+                        yield done
+                    headings.enter(level, text.strip())
+                lines.append(text)
+        
+        last = section()
+        if last:
+            yield last
+
+
+@register_extractor(".pdf")
+def extract_pdf(path: Path) -> Iterator[Section]:
+    """PDF: one section per page (needs `pip install pypdf`), headed by its bookmark"""
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError(f"Extracting {path.name} needs pypdf (pip install pypdf)") from e
+    
+    reader = PdfReader(path)
+    bookmarks = _pdf_bookmarks(reader)
+    heading = None
+    for number, page in enumerate(reader.pages, start=1):
+        heading = bookmarks.get(number, heading)
+        yield Section((page.extract_text() or "").encode("utf-8"), number, heading)
+
+
+def _pdf_bookmarks(reader) -> Dict[int, str]:
+    """1-based page -> trail of the last outline entry starting on it"""
+    found = {}
+    
+    def walk(entries, trail):
+        previous = trail
+        for entry in entries:
+            if isinstance(entry, list):
+                walk(entry, previous)
+                continue
+            previous = trail + [str(entry.title).strip()]
+            try:
+                found[reader.get_destination_page_number(entry) + 1] = " > ".join(previous)
+            except Exception:
+                continue
+    
+    try:
+        walk(reader.outline, [])
+    except Exception:
+        pass  # A damaged outline only costs the headings
+    return found
@@ -0,0 +1,1022 @@
+"""
+Incremental, concurrent document ingestion
+Walks a directory tree, re-embeds only chunks whose content changed, and
+overlaps extraction, embedding and upserting through bounded queues
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+
+from bm25_index import BM25Index, lexical_index
+from chunking import Source
+from config import settings
+from extractors import chunk_document, default_chunker, supports
+from openai_client import generate_batch_embeddings_async
+from vector_base import BaseVectorStore, chunk_vector_id
+
+
+# Bound parameters per IN (...) query; SQLite's default limit is 999 on older builds
+_MAX_VARIABLES = 900
+
+# A writer renews its document's lease every third of this; a process that
+# dies holding one blocks the document for at most this long
+LEASE_SECONDS = 30.0
+LEASE_POLL_SECONDS = 0.1
+
+
+def content_hash(text: str) -> str:
+    """Stable fingerprint of a chunk's text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """
+    SQLite record of what has been ingested into each vector store
+    
+    Rows are scoped by the store's namespace so switching backends or
+    indexes never skips chunks that the new store has not seen. The file
+    is shared by every serve.py worker, so it also holds the document API's
+    jobs and the per-document leases that serialize them across workers.
+    """
+    
+    def __init__(self, path: str, namespace: str):
+        self.namespace = namespace
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    namespace TEXT NOT NULL,
+                    document_name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    PRIMARY KEY (namespace, document_name)
+                );
+                CREATE TABLE IF NOT EXISTS chunks (
+                    namespace TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    document_name TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    PRIMARY KEY (namespace, vector_id)
+                );
+                CREATE INDEX IF NOT EXISTS chunks_document
+                    ON chunks (namespace, document_name);
+                CREATE TABLE IF NOT EXISTS staged (
+                    namespace TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    document_name TEXT NOT NULL,
+                    PRIMARY KEY (namespace, vector_id)
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL UNIQUE,
+                    namespace TEXT NOT NULL,
+                    document_name TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created TEXT NOT NULL,
+                    finished TEXT,
+                    error TEXT,
+                    stats TEXT,
+                    owner INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_document
+                    ON jobs (namespace, document_name, seq);
+                CREATE TABLE IF NOT EXISTS leases (
+                    namespace TEXT NOT NULL,
+                    document_name TEXT NOT NULL,
+                    holder TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    PRIMARY KEY (namespace, document_name)
+                );
+                CREATE TABLE IF NOT EXISTS index_holders (
+                    namespace TEXT NOT NULL,
+                    pid INTEGER NOT NULL,
+                    expires REAL NOT NULL,
+                    PRIMARY KEY (namespace, pid)
+                );
+            """)
+    
+    def file_signatures(self) -> Dict[str, Tuple[int, int]]:
+        """(size, mtime_ns) of every fully ingested file"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT document_name, size, mtime_ns FROM files WHERE namespace = ?",
+                (self.namespace,)
+            ).fetchall()
+        return {name: (size, mtime) for name, size, mtime in rows}
+    
+    def chunk_hashes(self, document_name: str) -> Dict[str, str]:
+        """vector id -> content hash for a document's stored chunks"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT vector_id, content_hash FROM chunks "
+                "WHERE namespace = ? AND document_name = ?",
+                (self.namespace, document_name)
+            ).fetchall()
+        return dict(rows)
+    
+    def documents(self) -> List[str]:
+        """Every document with a file or chunk record"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT document_name FROM files WHERE namespace = ? "
+                "UNION SELECT document_name FROM chunks WHERE namespace = ?",
+                (self.namespace, self.namespace)
+            ).fetchall()
+        return [row[0] for row in rows]
+    
+    def chunk_counts(self) -> Dict[str, int]:
+        """Stored chunks per document"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT document_name, COUNT(*) FROM chunks WHERE namespace = ? "
+                "GROUP BY document_name",
+                (self.namespace,)
+            ).fetchall()
+        return dict(rows)
+    
+    def stage(self, document_name: str, vector_ids: List[str]):
+        """Mark vectors as written but not published (hidden from queries)"""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO staged VALUES (?, ?, ?)",
+                [(self.namespace, vector_id, document_name) for vector_id in vector_ids]
+            )
+            self._db.commit()
+    
+    def staged(self, document_name: str) -> List[str]:
+        """Staged vector ids of a document (left behind if a job was interrupted)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT vector_id FROM staged WHERE namespace = ? AND document_name = ?",
+                (self.namespace, document_name)
+            ).fetchall()
+        return [row[0] for row in rows]
+    
+    def unstage(self, vector_ids: List[str]):
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM staged WHERE namespace = ? AND vector_id = ?",
+                [(self.namespace, vector_id) for vector_id in vector_ids]
+            )
+            self._db.commit()
+    
+    def staged_count(self) -> int:
+        """Staged vectors across every document"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM staged WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+    
+    def hidden(self, vector_ids: List[str]) -> Set[str]:
+        """The staged ones among vector_ids"""
+        hidden = set()
+        with self._lock:
+            for start in range(0, len(vector_ids), _MAX_VARIABLES):
+                batch = vector_ids[start:start + _MAX_VARIABLES]
+                hidden.update(row[0] for row in self._db.execute(
+                    "SELECT vector_id FROM staged WHERE namespace = ? AND vector_id IN "
+                    f"({', '.join('?' * len(batch))})",
+                    (self.namespace, *batch)
+                ))
+        return hidden
+    
+    def publish(
+        self,
+        document_name: str,
+        added: List[Tuple[str, str]],
+        retired: List[str],
+        signature: Optional[Tuple[int, int]] = None
+    ):
+        """
+        Swap a document's version in one transaction
+        
+        The added (vector id, content hash) pairs become part of the
+        document and visible; the retired ids leave it and are staged
+        (hidden) until they are deleted from the store and unstaged. With no
+        signature the document's file record is dropped.
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)",
+                [(self.namespace, vector_id, document_name, h) for vector_id, h in added]
+            )
+            self._db.executemany(
+                "DELETE FROM staged WHERE namespace = ? AND vector_id = ?",
+                [(self.namespace, vector_id) for vector_id, _ in added]
+            )
+            self._db.executemany(
+                "DELETE FROM chunks WHERE namespace = ? AND vector_id = ?",
+                [(self.namespace, vector_id) for vector_id in retired]
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO staged VALUES (?, ?, ?)",
+                [(self.namespace, vector_id, document_name) for vector_id in retired]
+            )
+            if signature is None:
+                self._db.execute(
+                    "DELETE FROM files WHERE namespace = ? AND document_name = ?",
+                    (self.namespace, document_name)
+                )
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                    (self.namespace, document_name, *signature)
+                )
+    
+    def add_job(self, job: Dict, owner: int, keep: int):
+        """
+        Record a new job, forgetting finished ones beyond the newest `keep`
+        
+        Args:
+            job: job_id, document_name, action, status and created
+            owner: Process id of the worker that will run it
+            keep: Jobs to remember
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, namespace, document_name, action, status, created, "
+                "owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job['job_id'], self.namespace, job['document_name'], job['action'],
+                 job['status'], job['created'], owner)
+            )
+            self._db.execute(
+                "DELETE FROM jobs WHERE namespace = ? AND status NOT IN ('queued', 'running') "
+                "AND seq <= (SELECT MAX(seq) FROM jobs WHERE namespace = ?) - ?",
+                (self.namespace, self.namespace, keep)
+            )
+    
+    def update_job(self, job: Dict):
+        """Store a job's status, finish time, error and stats"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ?, stats = ? WHERE job_id = ?",
+                (job['status'], job['finished'], job['error'],
+                 json.dumps(job['stats']) if job['stats'] is not None else None, job['job_id'])
+            )
+    
+    def job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id, document_name, action, status, created, finished, error, stats "
+                "FROM jobs WHERE namespace = ? AND job_id = ?",
+                (self.namespace, job_id)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(
+            ('job_id', 'document_name', 'action', 'status', 'created', 'finished', 'error'), row
+        ))
+        job['stats'] = json.loads(row[7]) if row[7] else None
+        return job
+    
+    def latest_job(self, document_name: str) -> Optional[str]:
+        """Id of the newest job submitted for a document, on any worker"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id FROM jobs WHERE namespace = ? AND document_name = ? "
+                "ORDER BY seq DESC LIMIT 1",
+                (self.namespace, document_name)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def pending_jobs(self) -> Dict[str, str]:
+        """document name -> action, for documents whose newest job has not finished"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT document_name, action FROM jobs WHERE seq IN ("
+                "SELECT MAX(seq) FROM jobs WHERE namespace = ? GROUP BY document_name"
+                ") AND status IN ('queued', 'running')",
+                (self.namespace,)
+            ).fetchall()
+        return dict(rows)
+    
+    def job_owners(self) -> Set[int]:
+        """Processes with queued or running jobs"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT owner FROM jobs "
+                "WHERE namespace = ? AND status IN ('queued', 'running')",
+                (self.namespace,)
+            ).fetchall()
+        return {row[0] for row in rows}
+    
+    def fail_jobs(self, owner: int, error: str, finished: str):
+        """Mark a process's unfinished jobs as failed (it stopped before running them)"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished = ? "
+                "WHERE namespace = ? AND owner = ? AND status IN ('queued', 'running')",
+                (error, finished, self.namespace, owner)
+            )
+    
+    def acquire_lease(self, document_name: str, holder: str, seconds: float) -> bool:
+        """
+        Take or renew the lease on a document for `seconds`
+        
+        Returns:
+            Whether `holder` now holds it (False while another unexpired holder does)
+        """
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO leases VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, document_name) DO UPDATE "
+                "SET holder = excluded.holder, expires = excluded.expires "
+                "WHERE leases.holder = excluded.holder OR leases.expires < ?",
+                (self.namespace, document_name, holder, now + seconds, now)
+            )
+            row = self._db.execute(
+                "SELECT holder FROM leases WHERE namespace = ? AND document_name = ?",
+                (self.namespace, document_name)
+            ).fetchone()
+        return row is not None and row[0] == holder
+    
+    def release_lease(self, document_name: str, holder: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM leases WHERE namespace = ? AND document_name = ? AND holder = ?",
+                (self.namespace, document_name, holder)
+            )
+    
+    def hold_indexes(self, pid: int, seconds: float):
+        """Record for `seconds` that a process serves the indexes from its memory"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO index_holders VALUES (?, ?, ?)",
+                (self.namespace, pid, time.time() + seconds)
+            )
+    
+    def release_indexes(self, pid: int):
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM index_holders WHERE namespace = ? AND pid = ?",
+                (self.namespace, pid)
+            )
+    
+    def index_holders(self) -> Set[int]:
+        """Processes serving the indexes from memory (unexpired holds only)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT pid FROM index_holders WHERE namespace = ? AND expires >= ?",
+                (self.namespace, time.time())
+            ).fetchall()
+        return {row[0] for row in rows}
+    
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM files WHERE namespace = ?", (self.namespace,))
+            self._db.execute("DELETE FROM chunks WHERE namespace = ?", (self.namespace,))
+            self._db.commit()
+
+
+class _Leases:
+    """Document leases held by one run(), renewed together until released"""
+    
+    def __init__(self, manifest: IngestManifest, holder: str):
+        self.manifest = manifest
+        self.holder = holder
+        self.held: Set[str] = set()
+    
+    async def acquire(self, document_name: str):
+        """Wait for the document's lease (an API job may hold it), then hold it"""
+        while not await asyncio.to_thread(
+            self.manifest.acquire_lease, document_name, self.holder, LEASE_SECONDS
+        ):
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+        self.held.add(document_name)
+    
+    async def release(self, document_name: str):
+        self.held.discard(document_name)
+        await asyncio.to_thread(self.manifest.release_lease, document_name, self.holder)
+    
+    async def renew(self):
+        """Keep every held lease alive (runs as a task for the whole run)"""
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            for document_name in list(self.held):
+                await asyncio.to_thread(
+                    self.manifest.acquire_lease, document_name, self.holder, LEASE_SECONDS
+                )
+    
+    async def release_all(self):
+        for document_name in list(self.held):
+            await self.release(document_name)
+
+
+def in_memory_indexes(store: BaseVectorStore, lexical: Optional[BM25Index]) -> List[str]:
+    """The indexes a process loads into its own memory and saves whole"""
+    indexes = []
+    if store.backend_name == "local":
+        indexes.append("the local vector index")
+    if lexical is not None:
+        indexes.append("the BM25 index")
+    return indexes
+
+
+async def hold_indexes(manifest: IngestManifest):
+    """
+    Record in the manifest that this process serves its in-memory indexes
+    
+    Runs as a task until cancelled, renewing the hold like a lease so a
+    process that dies stops counting after LEASE_SECONDS. run() refuses to
+    start while another process holds the indexes: that process would keep
+    serving its old copy and could save it over the run's files.
+    """
+    pid = os.getpid()
+    try:
+        while True:
+            await asyncio.to_thread(manifest.hold_indexes, pid, LEASE_SECONDS)
+            await asyncio.sleep(LEASE_SECONDS / 3)
+    finally:
+        await asyncio.shield(asyncio.to_thread(manifest.release_indexes, pid))
+
+
+class IngestionPipeline:
+    """
+    Chunk -> embed -> upsert, with the stages running concurrently
+    
+    Unchanged files are skipped by (size, mtime); changed files are
+    extracted and chunked on a pool of `processes` worker processes, a few
+    files ahead of the embedding stage, and only chunks whose content hash
+    differs from the manifest are sent to the embeddings API, in batches
+    capped by item count and tokens. As with ingest_document, a file's new
+    chunks stay staged (hidden) until all of them are stored, then its
+    version is published in one step and the chunks that disappeared from
+    it, or files that disappeared from the tree, are deleted from the store.
+    Each file is written under its document's lease in the manifest, so a
+    run and the document API's jobs never interleave on one document.
+    The BM25 lexical index is kept in step with the same chunks. The
+    chunker runs in the worker processes, so it must be picklable (a
+    module-level function); close() stops them.
+    """
+    
+    def __init__(
+        self,
+        store: BaseVectorStore,
+        manifest: Optional[IngestManifest] = None,
+        embed: Callable = generate_batch_embeddings_async,
+        chunker: Callable = None,
+        lexical: Optional[BM25Index] = lexical_index,
+        batch_size: int = None,
+        batch_tokens: int = None,
+        concurrency: int = None,
+        queue_size: int = None,
+        processes: int = None
+    ):
+        self.store = store
+        self.manifest = manifest or IngestManifest(settings.ingest_manifest_path, store.namespace)
+        self.embed = embed
+        self.chunker = chunker or default_chunker
+        self.lexical = lexical
+        self.batch_size = batch_size or settings.ingest_batch_size
+        self.batch_tokens = batch_tokens or settings.ingest_batch_tokens
+        self.concurrency = concurrency or settings.ingest_concurrency
+        self.queue_size = queue_size or settings.ingest_queue_size
+        self.processes = processes or settings.ingest_processes or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    async def run(self, root: Path, force: bool = False, prune: bool = True) -> Dict:
+        """
+        Ingest every supported file under root
+        
+        Args:
+            root: Directory to walk; document names are paths relative to it
+            force: Re-embed everything, ignoring the manifest
+            prune: Delete documents that are in the manifest but not on disk
+        
+        Returns:
+            Counters describing what was done
+        
+        Raises:
+            RuntimeError: if another process serves the local vector or BM25
+                index from memory (see hold_indexes); stop it first
+        """
+        indexes = in_memory_indexes(self.store, self.lexical)
+        holders = self.manifest.index_holders() - {os.getpid()} if indexes else set()
+        if holders:
+            raise RuntimeError(
+                f"serve.py (pid {', '.join(map(str, sorted(holders)))}) holds "
+                f"{' and '.join(indexes)} in memory, so it would not see this run and "
+                f"could overwrite its files; stop the server, run load_documents.py, "
+                f"then start it again"
+            )
+        
+        started = time.perf_counter()
+        stats = {
+            "files_seen": 0,
+            "files_unchanged": 0,
+            "files_changed": 0,
+            "files_removed": 0,
+            "files_failed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "chunks_skipped": 0,
+            "chunks_deleted": 0,
+            "embedding_requests": 0,
+        }
+        if force:
+            self.manifest.clear()
+            if self.lexical is not None:
+                self.lexical.clear()
+        
+        # A missing BM25 index or content store is rebuilt from every file
+        # (cheap, no embedding) while only changed chunks are re-embedded
+        rebuild_lexical = (
+            self.lexical is not None and not len(self.lexical) and bool(self.manifest.documents())
+        )
+        rebuild_content = self.store.needs_content() and bool(self.manifest.documents())
+        if rebuild_lexical:
+            print("🔤 BM25 index is empty: indexing every file lexically")
+        if rebuild_content:
+            print("📝 Content store is empty: storing the text of every file")
+        
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        versions: Dict[str, Dict] = {}
+        leases = _Leases(self.manifest, f"load_documents:{os.getpid()}")
+        renewer = asyncio.create_task(leases.renew())
+        
+        tasks = [asyncio.create_task(
+            self._produce(
+                root, prune, rebuild_lexical, rebuild_content, embed_queue, versions, leases,
+                stats
+            )
+        )]
+        tasks += [
+            asyncio.create_task(self._embed_worker(embed_queue, upsert_queue, stats))
+            for _ in range(self.concurrency)
+        ]
+        tasks += [
+            asyncio.create_task(self._upsert_worker(upsert_queue, versions, leases))
+            for _ in range(self.concurrency)
+        ]
+        
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+            await asyncio.shield(leases.release_all())
+            if self.lexical is not None:
+                await asyncio.to_thread(self.lexical.save)
+        
+        stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return stats
+    
+    async def _produce(
+        self,
+        root: Path,
+        prune: bool,
+        rebuild_lexical: bool,
+        rebuild_content: bool,
+        embed_queue: asyncio.Queue,
+        versions: Dict[str, Dict],
+        leases: _Leases,
+        stats: Dict
+    ):
+        """
+        Walk the tree and queue every chunk that needs embedding
+        
+        A changed file's new chunks are staged before they are queued;
+        versions[document_name] holds what the upsert workers need to
+        publish the file once the last of them is stored. The document's
+        lease is held from before the manifest is read until it is published.
+        """
+        try:
+            known_files = self.manifest.file_signatures()
+            seen = set()
+            work = []
+            
+            for path in sorted(root.rglob("*")):
+                if not path.is_file() or not supports(path):
+                    continue
+                
+                document_name = path.relative_to(root).as_posix()
+                stat = path.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+                seen.add(document_name)
+                stats["files_seen"] += 1
+                
+                unchanged = known_files.get(document_name) == signature
+                if unchanged and not (rebuild_lexical or rebuild_content):
+                    stats["files_unchanged"] += 1
+                    continue
+                work.append((path, document_name, signature, unchanged))
+            
+            async for (path, document_name, signature, unchanged), chunks in self._extract(work):
+                if isinstance(chunks, Exception):
+                    # Left out of the manifest, so the next run tries it again
+                    print(f"⚠️  {document_name}: could not extract text ({chunks})")
+                    stats["files_failed"] += 1
+                    continue
+                
+                await leases.acquire(document_name)
+                stat = await asyncio.to_thread(path.stat)
+                if (stat.st_size, stat.st_mtime_ns) != signature:
+                    # Rewritten since it was read (by an API job, say): the
+                    # writer publishes it, or the next run picks it up
+                    print(f"⚠️  {document_name}: changed while loading; skipped")
+                    await leases.release(document_name)
+                    continue
+                
+                current, changed, retired = self._version(document_name, chunks)
+                # Stored under other ids (older versions used plain positions)
+                unchanged = unchanged and not changed and not retired
+                
+                if rebuild_lexical:
+                    # Chunks already published; changed ones are added when they are
+                    await asyncio.to_thread(self.lexical.add, [
+                        (chunk['vector_id'], chunk['content'])
+                        for chunk in chunks if chunk['vector_id'] not in changed
+                    ])
+                
+                if rebuild_content:
+                    await asyncio.to_thread(self.store.store_content, chunks, document_name)
+                
+                if unchanged:
+                    stats["files_unchanged"] += 1
+                    await leases.release(document_name)
+                    continue
+                
+                stats["files_changed"] += 1
+                stats["chunks_total"] += len(chunks)
+                stats["chunks_skipped"] += len(chunks) - len(changed)
+                stats["chunks_deleted"] += len(retired)
+                print(f"📄 {document_name}: {len(chunks)} chunks, {len(changed)} to embed")
+                
+                # Vectors left staged by an interrupted run or job
+                await self._discard_staged(document_name)
+                if not retired and len(changed) == len(current):
+                    await self._clear_unversioned(document_name)
+                if not changed:
+                    await self._publish(document_name, current, [], retired, signature, False)
+                    await leases.release(document_name)
+                    continue
+                
+                self.manifest.stage(document_name, list(changed))
+                versions[document_name] = {
+                    "current": current,
+                    "changed": list(changed.values()),
+                    "retired": retired,
+                    "signature": signature,
+                    "remaining": len(changed),
+                }
+                for chunk in changed.values():
+                    await embed_queue.put((document_name, chunk))
+            
+            if prune:
+                for document_name in self.manifest.documents():
+                    if document_name in seen:
+                        continue
+                    await leases.acquire(document_name)
+                    # Not if an API job added it after the walk
+                    if not await asyncio.to_thread((root / document_name).exists):
+                        print(f"🗑️  {document_name}: removed from disk")
+                        known = list(self.manifest.chunk_hashes(document_name))
+                        await self._publish(document_name, {}, [], known, None, False)
+                        stats["files_removed"] += 1
+                        stats["chunks_deleted"] += len(known)
+                    await leases.release(document_name)
+        finally:
+            # One stop marker per embedding worker
+            for _ in range(self.concurrency):
+                await embed_queue.put(None)
+    
+    async def _extract(self, work: List[tuple]) -> AsyncIterator[tuple]:
+        """
+        Chunk files in order, keeping the worker pool busy ahead of the caller
+        
+        Args:
+            work: Tuples whose first item is the file path
+        
+        Yields:
+            (item, chunks) in the order of work; chunks is the exception
+            instead when the file could not be extracted
+        """
+        items = iter(work)
+        ahead = deque()
+        
+        def schedule():
+            item = next(items, None)
+            if item is not None:
+                ahead.append((item, asyncio.ensure_future(self._chunk(item[0]))))
+        
+        try:
+            # Two files per process: one being extracted, one waiting
+            for _ in range(self.processes * 2):
+                schedule()
+            while ahead:
+                item, future = ahead.popleft()
+                schedule()
+                try:
+                    chunks = await future
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    chunks = e
+                yield item, chunks
+        finally:
+            for _, future in ahead:
+                future.cancel()
+    
+    async def _embed_worker(
+        self,
+        embed_queue: asyncio.Queue,
+        upsert_queue: asyncio.Queue,
+        stats: Dict
+    ):
+        """Drain the queue into batches bounded by item count and tokens"""
+        carry = None
+        done = False
+        
+        while not done:
+            batch = []
+            tokens = 0
+            if carry is not None:
+                batch.append(carry)
+                tokens = carry[1]['token_count']
+                carry = None
+            
+            while len(batch) < self.batch_size:
+                if batch:
+                    # Don't wait for a full batch once there is work to send
+                    try:
+                        item = embed_queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                else:
+                    item = await embed_queue.get()
+                
+                if item is None:
+                    done = True
+                    break
+                
+                item_tokens = item[1]['token_count']
+                if batch and tokens + item_tokens > self.batch_tokens:
+                    carry = item
+                    break
+                batch.append(item)
+                tokens += item_tokens
+            
+            if batch:
+                embeddings = await self.embed([chunk['content'] for _, chunk in batch])
+                stats["embedding_requests"] += 1
+                stats["chunks_embedded"] += len(batch)
+                await upsert_queue.put((batch, embeddings))
+        
+        await upsert_queue.put(None)
+    
+    async def _upsert_worker(
+        self,
+        upsert_queue: asyncio.Queue,
+        versions: Dict[str, Dict],
+        leases: _Leases
+    ):
+        """Store embedded chunks, publishing each file once all of its chunks are stored"""
+        while True:
+            entry = await upsert_queue.get()
+            if entry is None:
+                return
+            
+            batch, embeddings = entry
+            by_document: Dict[str, List] = {}
+            for (document_name, chunk), embedding in zip(batch, embeddings):
+                by_document.setdefault(document_name, []).append((chunk, embedding))
+            
+            for document_name, items in by_document.items():
+                await asyncio.to_thread(
+                    self.store.upsert_chunks,
+                    [chunk for chunk, _ in items],
+                    [embedding for _, embedding in items],
+                    document_name
+                )
+                
+                # An interrupted run leaves the file unpublished (and its new
+                # chunks staged), so the next run picks it up again
+                version = versions[document_name]
+                version["remaining"] -= len(items)
+                if version["remaining"] == 0:
+                    del versions[document_name]
+                    await self._publish(
+                        document_name, version["current"], version["changed"],
+                        version["retired"], version["signature"], False
+                    )
+                    await leases.release(document_name)
+    
+    async def ingest_document(
+        self,
+        document_name: str,
+        source: Source,
+        signature: Optional[Tuple[int, int]] = None
+    ) -> Dict:
+        """
+        Replace one document with new content, publishing it all at once
+        
+        Chunks get ids derived from their position and content hash, so an
+        unchanged chunk keeps its id and is neither re-embedded nor
+        upserted, while a changed one is written next to the version being
+        served instead of over it. New vectors stay staged (hidden from
+        retrieval) until every one of them is stored; the manifest then
+        swaps versions in one transaction and the retired vectors are
+        deleted. Cost is proportional to the chunks that changed.
+        
+        Args:
+            document_name: Document to create or replace
+            source: The new content: a file in any supported format, or UTF-8 text
+            signature: (size, mtime_ns) of the file holding the content, if any
+        
+        Returns:
+            Counters describing what was done
+        """
+        started = time.perf_counter()
+        await self._discard_staged(document_name)
+        
+        chunks = await self._chunk(source)
+        # Manifest calls run on threads: this is the API server's event loop
+        current, changed, retired = await asyncio.to_thread(self._version, document_name, chunks)
+        changed = list(changed.values())
+        if not retired and len(changed) == len(current):
+            await self._clear_unversioned(document_name)
+        
+        stats = {
+            "chunks_total": len(chunks),
+            "chunks_embedded": len(changed),
+            "chunks_skipped": len(chunks) - len(changed),
+            "chunks_deleted": len(retired),
+            "embedding_requests": 0,
+        }
+        
+        await asyncio.to_thread(
+            self.manifest.stage, document_name, [chunk['vector_id'] for chunk in changed]
+        )
+        limit = asyncio.Semaphore(self.concurrency)
+        
+        async def embed_and_store(batch: List[Dict]):
+            async with limit:
+                embeddings = await self.embed([chunk['content'] for chunk in batch])
+                stats["embedding_requests"] += 1
+                await asyncio.to_thread(self.store.upsert_chunks, batch, embeddings, document_name)
+        
+        try:
+            await asyncio.gather(*(embed_and_store(batch) for batch in self._batches(changed)))
+        except BaseException:
+            await self._discard_staged(document_name)
+            raise
+        
+        await self._publish(document_name, current, changed, retired, signature)
+        
+        stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return stats
+    
+    async def remove_document(self, document_name: str) -> Dict:
+        """
+        Delete a document: hidden from retrieval at once, then from the store
+        
+        Returns:
+            Counters describing what was done
+        """
+        started = time.perf_counter()
+        known = list(await asyncio.to_thread(self.manifest.chunk_hashes, document_name))
+        await asyncio.to_thread(self.manifest.publish, document_name, [], known)
+        if self.lexical is not None:
+            await asyncio.to_thread(self._update_lexical, known, [])
+        
+        staged = await asyncio.to_thread(self.manifest.staged, document_name)
+        # One call also removes strays of interrupted jobs; fall back to ids
+        # where the backend cannot delete by metadata filter
+        if not await asyncio.to_thread(self.store.delete_document, document_name):
+            await asyncio.to_thread(self.store.delete_chunks, staged)
+        await asyncio.to_thread(self.manifest.unstage, staged)
+        return {
+            "chunks_deleted": len(known),
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+    
+    def _version(
+        self,
+        document_name: str,
+        chunks: List[Dict]
+    ) -> Tuple[Dict[str, str], Dict[str, Dict], List[str]]:
+        """
+        Give chunks versioned ids and compare them with the stored version
+        
+        A chunk's id is its position plus a hash of its content, so an
+        unchanged chunk keeps its id and a changed one never overwrites the
+        vector being served.
+        
+        Returns:
+            (vector id -> content hash of every chunk, the chunks not stored
+            yet by id, stored ids that are no longer part of the document)
+        """
+        known = self.manifest.chunk_hashes(document_name)
+        current = {}
+        changed = {}
+        for chunk in chunks:
+            digest = content_hash(chunk['content'])
+            chunk['vector_id'] = f"{chunk_vector_id(chunk, document_name)}@{digest[:12]}"
+            current[chunk['vector_id']] = digest
+            if chunk['vector_id'] not in known:
+                changed[chunk['vector_id']] = chunk
+        retired = [vector_id for vector_id in known if vector_id not in current]
+        return current, changed, retired
+    
+    async def _publish(
+        self,
+        document_name: str,
+        current: Dict[str, str],
+        changed: List[Dict],
+        retired: List[str],
+        signature: Optional[Tuple[int, int]],
+        save_lexical: bool = True
+    ):
+        """Swap in a document's new version, then delete the retired vectors"""
+        await asyncio.to_thread(
+            self.manifest.publish,
+            document_name,
+            [(chunk['vector_id'], current[chunk['vector_id']]) for chunk in changed],
+            retired,
+            signature
+        )
+        if self.lexical is not None:
+            await asyncio.to_thread(self._update_lexical, retired, changed, save_lexical)
+        await self._discard_staged(document_name)
+    
+    async def _clear_unversioned(self, document_name: str):
+        """
+        Delete whatever the store holds for a document with no version on record
+        
+        Called before the first versioned write (nothing stored was kept and
+        nothing retired). Indexes built before versioned ids used plain
+        position ids, and force=True forgets the manifest; either way the
+        old vectors are not listed anywhere and would be served next to the
+        new version.
+        """
+        if not await asyncio.to_thread(self.store.delete_document, document_name):
+            print(f"⚠️  {document_name}: could not delete the vectors stored before this version")
+    
+    async def _discard_staged(self, document_name: str):
+        """Delete a document's unpublished or retired vectors from the store"""
+        staged = await asyncio.to_thread(self.manifest.staged, document_name)
+        if staged:
+            await asyncio.to_thread(self.store.delete_chunks, staged)
+            await asyncio.to_thread(self.manifest.unstage, staged)
+    
+    def _update_lexical(self, removed: List[str], added: List[Dict], save: bool = True):
+        """Apply a document swap to the BM25 index (run() saves it once at the end)"""
+        self.lexical.remove(removed)
+        self.lexical.add([(chunk['vector_id'], chunk['content']) for chunk in added])
+        if save:
+            self.lexical.save()
+    
+    def _batches(self, chunks: List[Dict]) -> Iterator[List[Dict]]:
+        """Consecutive batches bounded by item count and tokens"""
+        batch = []
+        tokens = 0
+        for chunk in chunks:
+            if batch and (
+                len(batch) == self.batch_size or tokens + chunk['token_count'] > self.batch_tokens
+            ):
+                yield batch
+                batch = []
+                tokens = 0
+            batch.append(chunk)
+            tokens += chunk['token_count']
+        if batch:
+            yield batch
+    
+    async def _chunk(self, source: Source) -> List[Dict]:
+        """Extract and chunk one document on the process pool (a thread with one process)"""
+        if self.processes <= 1:
+            return await asyncio.to_thread(chunk_document, source, self.chunker)
+        if self._executor is None:
+            # Spawned, not forked: the event loop and client threads stay here
+            self._executor = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, chunk_document, source, self.chunker)
+    
+    def close(self):
+        """Stop the extraction worker processes (started again on demand)"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -1,103 +1,97 @@
 """
-Load Acme Tech Solutions documents into Pinecone
-Run this script to initialize the knowledge base
+Load Acme Tech Solutions documents into the vector store
+Run this script to initialize (or incrementally refresh) the knowledge base
 """
 
-import os
+import argparse
+import asyncio
 import sys
 from pathlib import Path
 
-from chunking import chunk_text_by_words
-from openai_client import generate_batch_embeddings
-from vector_store import vector_store
 from config import settings
 
 
-# Documents directory (relative to backend directory)
-DOCUMENTS_DIR = Path(__file__).parent.parent / "documents"
+# Documents directory (DOCUMENTS_DIR, or relative to backend directory)
+DOCUMENTS_DIR = Path(settings.documents_dir or Path(__file__).parent / "documents")
 
-ACME_DOCUMENTS = [
-    "company_history.txt",
-    "core_products.txt",
-    "hr_policy.txt"
-]
 
+def load_documents(documents_dir: Path = DOCUMENTS_DIR, force: bool = False):
+    """
+    Load every document under documents_dir into the vector store
+
+    Only files and chunks that changed since the last run are re-embedded.
+
+    Args:
+        documents_dir: Directory tree to ingest
+        force: Re-embed everything, ignoring what was loaded before
+
+    Returns:
+        The ingestion pipeline's counters (files, chunks, requests, elapsed_s)
+    """
+    # Imported here: extraction worker processes re-import this script, and
+    # must not each build a vector store
+    from ingestion import IngestionPipeline
+    from vector_store import vector_store
 
-def load_documents():
-    """Load all Acme Tech Solutions documents into Pinecone"""
-    
     print("=" * 60)
-    print("Loading Acme Tech Solutions Documents into Pinecone")
+    print(f"Loading Acme Tech Solutions Documents ({vector_store.backend_name})")
     print("=" * 60)
     print()
-    
-    total_chunks = 0
-    
-    for filename in ACME_DOCUMENTS:
-        filepath = DOCUMENTS_DIR / filename
-        
-        print(f"📄 Processing: {filename}")
-        
-        if not filepath.exists():
-            print(f"   ⚠️  File not found: {filepath}")
-            print(f"   Skipping...")
-            print()
-            continue
-        
-        # Read file content
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        if not content.strip():
-            print(f"   ⚠️  File is empty")
-            print(f"   Skipping...")
-            print()
-            continue
-        
-        print(f"   📖 Read {len(content)} characters")
-        
-        # Chunk the text using 512-word chunks
-        chunks = chunk_text_by_words(content, words_per_chunk=settings.chunk_size)
-        print(f"   ✂️  Created {len(chunks)} chunks")
-        
-        # Generate embeddings for all chunks
-        chunk_texts = [chunk['content'] for chunk in chunks]
-        print(f"   🔢 Generating embeddings...")
-        embeddings = generate_batch_embeddings(chunk_texts)
-        print(f"   ✅ Generated {len(embeddings)} embeddings")
-        
-        # Store in Pinecone
-        print(f"   💾 Storing in Pinecone...")
-        num_stored = vector_store.upsert_chunks(
-            chunks=chunks,
-            embeddings=embeddings,
-            document_name=filename
-        )
-        print(f"   ✅ Stored {num_stored} chunks")
-        print()
-        
-        total_chunks += num_stored
-    
+
+    if not documents_dir.is_dir():
+        raise FileNotFoundError(f"Documents directory not found: {documents_dir}")
+
+    pipeline = IngestionPipeline(vector_store)
+    try:
+        stats = asyncio.run(pipeline.run(documents_dir, force=force))
+    finally:
+        pipeline.close()
+
+    print()
     print("=" * 60)
-    print(f"✨ Loading complete! Total chunks stored: {total_chunks}")
+    print(f"✨ Loading complete in {stats['elapsed_s']}s")
+    print(f"  - Files: {stats['files_seen']} seen, {stats['files_changed']} changed, "
+          f"{stats['files_unchanged']} unchanged, {stats['files_removed']} removed, "
+          f"{stats['files_failed']} failed")
+    print(f"  - Chunks: {stats['chunks_embedded']} embedded, {stats['chunks_skipped']} unchanged, "
+          f"{stats['chunks_deleted']} deleted")
+    print(f"  - Embedding requests: {stats['embedding_requests']}")
     print("=" * 60)
-    
+
     # Show index stats
     try:
-        stats = vector_store.get_stats()
+        index_stats = vector_store.get_stats()
         print()
-        print("Pinecone Index Stats:")
+        print("Vector Store Stats:")
+        print(f"  - Backend: {vector_store.backend_name}")
         print(f"  - Index: {settings.pinecone_index_name}")
-        print(f"  - Total vectors: {stats.get('total_vector_count', 0)}")
+        print(f"  - Total vectors: {index_stats.get('total_vector_count', 0)}")
         print(f"  - Dimension: {settings.embedding_dimension}")
         print()
     except Exception as e:
         print(f"Could not fetch stats: {e}")
 
+    return stats
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load documents into the vector store")
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        type=Path,
+        default=DOCUMENTS_DIR,
+        help="Directory tree to ingest (default: backend/documents)"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-embed every chunk instead of only changed ones"
+    )
+    args = parser.parse_args()
+
     try:
-        load_documents()
+        load_documents(args.directory, force=args.full)
         print("✅ Success! Documents are ready for querying.")
         sys.exit(0)
     except Exception as e:
@@ -0,0 +1,220 @@
+"""
+Local CPU embedding models
+Selected with EMBEDDING_MODEL=local:<model>, they replace the embeddings
+API round trip before every retrieval; inference runs on a thread pool
+and concurrent queries are micro-batched into one forward pass
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from batching import MicroBatcher
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# EMBEDDING_MODEL values starting with this select a local model
+LOCAL_PREFIX = "local:"
+
+_WORDS = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1 << 18)
+def _bucket(feature: str, dimension: int) -> tuple:
+    """Signed bucket of a feature; CRC32 is stable across processes, unlike hash()"""
+    digest = zlib.crc32(feature.encode("utf-8"))
+    return digest % dimension, 1.0 if digest & 0x80000000 else -1.0
+
+
+class HashingEmbedder:
+    """
+    Feature-hashed word and character-trigram vectors (no model download)
+    
+    Each word, and each trigram of the word padded with "#", is hashed into
+    one of `dimension` signed buckets, weighted by 1 + log(count), and the
+    vector is L2-normalized. Texts sharing words or word fragments score
+    higher; synonyms do not. Good for tests, offline benchmarks and
+    keyword-heavy corpora; takes microseconds per query.
+    """
+    
+    name = "hashing"
+    
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Unit vectors, one row per text"""
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = Counter()
+            for word in _WORDS.findall(text.lower()):
+                features[word] += 1
+                padded = f"#{word}#"
+                for i in range(len(padded) - 2):
+                    features[padded[i:i + 3]] += 1
+            for feature, count in features.items():
+                bucket, sign = _bucket(feature, self.dimension)
+                matrix[row, bucket] += sign * (1.0 + math.log(count))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class SentenceTransformerEmbedder:
+    """
+    A sentence-transformers model on CPU (needs `pip install sentence-transformers`)
+    
+    With LOCAL_EMBEDDING_BACKEND=onnx the model runs on ONNX Runtime
+    (sentence-transformers >= 3.2 with its onnx extra), usually faster
+    than PyTorch on CPU.
+    """
+    
+    def __init__(self, model_name: str, backend: str = "torch", batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                f"EMBEDDING_MODEL={LOCAL_PREFIX}{model_name} needs sentence-transformers "
+                "(pip install sentence-transformers)"
+            ) from e
+        options = {"backend": backend} if backend != "torch" else {}
+        self.model = SentenceTransformer(model_name, device="cpu", **options)
+        self.name = model_name
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Unit vectors, one row per text"""
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        ).astype(np.float32)
+
+
+class LocalEmbeddings:
+    """
+    Embeds texts on this machine instead of calling the embeddings API
+    
+    `model` is what follows "local:" in EMBEDDING_MODEL: "hashing" for the
+    HashingEmbedder, anything else is a sentence-transformers model name
+    or path. It is loaded on first use and must produce
+    EMBEDDING_DIMENSION-sized vectors, since the index was built with
+    them. embed_async runs inference on a thread pool (NumPy and PyTorch
+    release the GIL) so it never blocks the event loop, and coalesces
+    concurrent calls into batches of up to `max_batch` texts.
+    """
+    
+    def __init__(
+        self,
+        model: str,
+        dimension: int,
+        threads: int = 2,
+        max_batch: int = 64,
+        max_wait: float = 0.002,
+        backend: str = "torch"
+    ):
+        self.model_name = model
+        self.dimension = dimension
+        self.backend = backend
+        self.max_batch = max_batch
+        self._model = None
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._threads = threads
+        self._batcher = MicroBatcher(
+            self._encode_async, max_batch=max_batch, max_wait=max_wait, name="local_embeddings"
+        )
+        self.texts = 0
+        self.seconds = 0.0
+    
+    @property
+    def model(self):
+        """The embedding model (loaded on first use)"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+    
+    def _load_model(self):
+        start = time.perf_counter()
+        if self.model_name == "hashing":
+            model = HashingEmbedder(self.dimension)
+        else:
+            model = SentenceTransformerEmbedder(self.model_name, self.backend, self.max_batch)
+            if model.dimension != self.dimension:
+                raise ValueError(
+                    f"{self.model_name} produces {model.dimension}-dim vectors; "
+                    f"set EMBEDDING_DIMENSION={model.dimension} and re-ingest"
+                )
+        logger.info(
+            "Loaded local embedding model %s (%d dims) in %.0f ms",
+            self.model_name, self.dimension, (time.perf_counter() - start) * 1000
+        )
+        return model
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts in the calling thread (scripts, ingestion workers)
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            Unit embedding vectors, in the same order as texts
+        """
+        start = time.perf_counter()
+        vectors = self.model.encode(list(texts))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.texts += len(texts)
+            self.seconds += elapsed
+        return vectors.tolist()
+    
+    async def embed_async(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts on the thread pool, batched with other concurrent callers"""
+        return await self._batcher.submit(list(texts))
+    
+    async def _encode_async(self, texts: List[str]) -> List[List[float]]:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self._threads, thread_name_prefix="local-embeddings"
+                    )
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.embed, texts)
+    
+    def stats(self) -> Dict:
+        """Model, counters and batching for monitoring"""
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "texts": self.texts,
+            "ms_per_text": round(self.seconds / self.texts * 1000, 3) if self.texts else 0.0,
+            **self._batcher.stats()
+        }
+
+
+# Global local embedder (None when EMBEDDING_MODEL names an OpenAI model)
+local_embeddings = LocalEmbeddings(
+    model=settings.embedding_model[len(LOCAL_PREFIX):],
+    dimension=settings.embedding_dimension,
+    threads=settings.local_embedding_threads,
+    max_batch=settings.local_embedding_batch_size,
+    max_wait=settings.local_embedding_batch_wait_ms / 1000,
+    backend=settings.local_embedding_backend
+) if settings.embedding_model.startswith(LOCAL_PREFIX) else None
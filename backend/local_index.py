@@ -0,0 +1,634 @@
+"""
+Local in-process vector index backed by NumPy
+Exact cosine search over a contiguous matrix (float32, float16 or int8),
+persisted to disk, with an optional IVF-PQ approximate index for large
+corpora
+"""
+
+from typing import List, Dict, Optional, NamedTuple, Tuple
+from pathlib import Path
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from ann_index import IVFPQIndex
+from config import settings
+from quantization import VectorCodec
+from vector_base import BaseVectorStore, chunk_vector_id, chunk_metadata
+
+logger = logging.getLogger(__name__)
+
+# The journal is folded into a full snapshot once it holds as many rows as
+# the last snapshot (and at least this many), or this many segment files
+_COMPACT_MIN_ROWS = 4096
+_MAX_SEGMENTS = 1000
+
+
+def matches_filter(metadata: Dict, filter_dict: Optional[Dict]) -> bool:
+    """
+    Evaluate a Pinecone-style metadata filter against one record
+    
+    Supports plain equality plus $eq, $ne, $in, $nin, $gt, $gte, $lt,
+    $lte, $and and $or, matching Pinecone's filter language.
+    """
+    if not filter_dict:
+        return True
+    
+    for field, condition in filter_dict.items():
+        if field == '$and':
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if field == '$or':
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        
+        for op, operand in condition.items():
+            if op == '$eq' and value != operand:
+                return False
+            if op == '$ne' and value == operand:
+                return False
+            if op == '$in' and value not in operand:
+                return False
+            if op == '$nin' and value in operand:
+                return False
+            if op in ('$gt', '$gte', '$lt', '$lte'):
+                if value is None:
+                    return False
+                if op == '$gt' and not value > operand:
+                    return False
+                if op == '$gte' and not value >= operand:
+                    return False
+                if op == '$lt' and not value < operand:
+                    return False
+                if op == '$lte' and not value <= operand:
+                    return False
+    
+    return True
+
+
+class _Snapshot(NamedTuple):
+    """Immutable view of the index that searches read without locking"""
+    vectors: np.ndarray             # Encoded rows (see VectorCodec)
+    scales: Optional[np.ndarray]    # Per-row scales for int8 rows
+    ids: Tuple[str, ...]
+    metadata: Tuple[Dict, ...]
+
+
+class LocalVectorStore(BaseVectorStore):
+    """
+    Cosine-similarity index held in memory
+    
+    In "exact" mode every query scores the whole matrix. In "ivfpq" mode an
+    IVFPQIndex is trained once the store reaches settings.ann_min_vectors;
+    queries then over-fetch approximate candidates and re-score them exactly.
+    Rows are stored in the codec's format (LOCAL_VECTOR_DTYPE, optionally
+    truncated to LOCAL_VECTOR_DIMENSIONS) and scored without decoding.
+    
+    On disk, a full snapshot (vectors.npy, metadata.json) is followed by a
+    journal of segments/*.npz, one per upsert or delete, so a write costs
+    the size of the change. The journal is replayed on load and folded
+    into a new snapshot once it is as large as the last one, which keeps
+    total write I/O linear in the rows written.
+    """
+    
+    backend_name = "local"
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dimension: int = None,
+        mode: Optional[str] = None,
+        codec: Optional[VectorCodec] = None
+    ):
+        super().__init__(executor_threads=4)
+        self.path = Path(path) if path else None
+        self.codec = codec or VectorCodec(
+            settings.local_vector_dtype, settings.local_vector_dimensions
+        )
+        if self.codec.dimensions and not settings.embedding_model.startswith("text-embedding-3"):
+            logger.warning(
+                "Truncating %s embeddings to %d dims; only text-embedding-3-* models "
+                "are trained for this", settings.embedding_model, self.codec.dimensions
+            )
+        # Stored width; embeddings are truncated to it when the codec says so
+        self.dimension = self.codec.dimensions or dimension or settings.embedding_dimension
+        self.mode = (mode or settings.local_index_mode).lower()
+        if self.mode not in ("exact", "ivfpq"):
+            raise ValueError(f"Unknown local index mode: {self.mode}")
+        self.ann: Optional[IVFPQIndex] = None
+        self._lock = threading.Lock()
+        self._buffer = np.zeros((0, self.dimension), dtype=self.codec.storage_dtype)
+        self._scales = np.zeros(0, dtype=np.float32) if self.codec.scaled else None
+        self._ids: List[str] = []
+        self._metadata: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._segments: List[str] = []  # Journal segments since the last snapshot
+        self._journal_rows = 0
+        self._snapshot_rows = 0
+        self._segments_through = ""
+        self._publish()
+    
+    def _connect(self):
+        if self.path and (
+            (self.path / "vectors.npy").exists() or any(self.path.glob("segments/*.npz"))
+        ):
+            self._load()
+        
+        if self.mode == "ivfpq" and self.ann is None:
+            self.ann = IVFPQIndex(
+                self.dimension,
+                nlist=settings.ann_nlist,
+                nprobe=settings.ann_nprobe,
+                pq_m=settings.ann_pq_m
+            )
+    
+    @property
+    def count(self) -> int:
+        return len(self._ids)
+    
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held by the stored vectors (excluding spare capacity)"""
+        return self.count * self.codec.bytes_per_vector(self.dimension)
+    
+    def upsert_chunks(
+        self,
+        chunks: List[Dict],
+        embeddings: List[List[float]],
+        document_name: str
+    ) -> int:
+        """
+        Store document chunks with embeddings in the local index
+        
+        Args:
+            chunks: List of chunk dictionaries
+            embeddings: List of embedding vectors
+            document_name: Name of the source document
+        
+        Returns:
+            Number of chunks stored
+        """
+        if not chunks:
+            return 0
+        self.connect()
+        
+        vectors = self.codec.prepare(np.asarray(embeddings, dtype=np.float32))
+        codes, scales = self.codec.encode(vectors)
+        ids = [chunk_vector_id(chunk, document_name) for chunk in chunks]
+        metadata = [chunk_metadata(chunk, document_name) for chunk in chunks]
+        
+        with self._lock:
+            self._upsert_rows(ids, codes, scales, metadata)
+            self._update_ann(ids, vectors)
+            self._publish()
+            self._append_segment(ids, codes, scales, metadata)
+        
+        return len(ids)
+    
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Search for similar chunks
+        
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return
+            filter_dict: Optional metadata filters
+        
+        Returns:
+            List of matching chunks with scores, best first
+        """
+        self.connect()
+        snapshot = self._snapshot
+        if not snapshot.ids or top_k <= 0:
+            return []
+        
+        query = self.codec.prepare(query_embedding)
+        
+        if self.ann is not None and self.ann.is_trained:
+            candidates = self._ann_candidates(snapshot, query, top_k, filter_dict)
+        elif filter_dict:
+            mask = np.fromiter(
+                (matches_filter(m, filter_dict) for m in snapshot.metadata),
+                dtype=bool,
+                count=len(snapshot.metadata)
+            )
+            candidates = np.flatnonzero(mask)
+        else:
+            candidates = None
+        
+        if candidates is None:
+            scores = self.codec.scores(snapshot.vectors, snapshot.scales, query)
+        else:
+            scores = self.codec.scores(
+                snapshot.vectors[candidates],
+                snapshot.scales[candidates] if snapshot.scales is not None else None,
+                query
+            )
+        
+        return self._top_results(snapshot, scores, candidates, top_k)
+    
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """
+        Search for several queries with one matrix product
+        
+        Unfiltered exact searches score every query against the index in a
+        single (queries x vectors) multiplication; ANN and filtered searches
+        fall back to one search per query.
+        """
+        self.connect()
+        snapshot = self._snapshot
+        if not query_embeddings:
+            return []
+        if filter_dict or (self.ann is not None and self.ann.is_trained):
+            return super().search_batch(query_embeddings, top_k, filter_dict)
+        if not snapshot.ids or top_k <= 0:
+            return [[] for _ in query_embeddings]
+        
+        queries = self.codec.prepare(query_embeddings)
+        scores = self.codec.scores_batch(snapshot.vectors, snapshot.scales, queries)
+        return [self._top_results(snapshot, row, None, top_k) for row in scores]
+    
+    async def search_batch_async(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """Run search_batch on the store's thread pool"""
+        return await self._run_in_executor(
+            self.search_batch, query_embeddings, top_k, filter_dict
+        )
+    
+    @staticmethod
+    def _top_results(
+        snapshot: _Snapshot,
+        scores: np.ndarray,
+        candidates: Optional[np.ndarray],
+        top_k: int
+    ) -> List[Dict]:
+        """Best top_k rows by score, with ids and metadata"""
+        if not len(scores):
+            return []
+        
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        results = []
+        for position in top:
+            row = candidates[position] if candidates is not None else position
+            results.append({
+                'id': snapshot.ids[row],
+                'score': float(scores[position]),
+                **snapshot.metadata[row]
+            })
+        
+        return results
+    
+    def fetch(self, vector_ids: List[str]) -> List[Dict]:
+        """Stored chunks with their (normalized, decoded) vectors, for the ids that exist"""
+        self.connect()
+        snapshot = self._snapshot
+        rows = self._rows
+        chunks = []
+        for vector_id in vector_ids:
+            row = rows.get(vector_id)
+            if row is None or row >= len(snapshot.ids) or snapshot.ids[row] != vector_id:
+                continue
+            scale = snapshot.scales[row:row + 1] if snapshot.scales is not None else None
+            chunks.append({
+                'id': vector_id,
+                'values': self.codec.decode(snapshot.vectors[row:row + 1], scale)[0].tolist(),
+                **snapshot.metadata[row]
+            })
+        return chunks
+    
+    def delete_document(self, document_name: str) -> bool:
+        """Delete all chunks for a document"""
+        self.connect()
+        try:
+            with self._lock:
+                self._delete_rows([
+                    row for row, meta in enumerate(self._metadata)
+                    if meta.get('document_name') == document_name
+                ])
+            return True
+        except Exception as e:
+            logger.warning("Error deleting document %s: %s", document_name, e)
+            return False
+    
+    def delete_chunks(self, vector_ids: List[str]) -> int:
+        """Delete chunks by vector id"""
+        self.connect()
+        with self._lock:
+            self._delete_rows([
+                self._rows[vector_id] for vector_id in vector_ids
+                if vector_id in self._rows
+            ])
+        return len(vector_ids)
+    
+    def get_stats(self) -> Dict:
+        """Get index statistics"""
+        self.connect()
+        return {
+            'total_vector_count': self.count,
+            'dimension': self.dimension,
+            'dtype': self.codec.dtype,
+            'memory_bytes': self.memory_bytes,
+            'backend': self.backend_name
+        }
+    
+    @property
+    def namespace(self) -> str:
+        return f"local:{self.path.resolve() if self.path else 'memory'}"
+    
+    def _delete_rows(self, rows: List[int]):
+        """Delete rows, publish and journal the change (lock held)"""
+        if not rows:
+            return
+        ids = [self._ids[row] for row in rows]
+        self._remove_rows(rows)
+        self._publish()
+        self._append_segment(ids)
+    
+    def _remove_rows(self, rows: List[int]):
+        """Compact the matrix without the given rows (lock held)"""
+        dropped = set(rows)
+        keep = [row for row in range(len(self._ids)) if row not in dropped]
+        if self.ann is not None:
+            self.ann.remove([self._ids[row] for row in dropped])
+        self._buffer = np.ascontiguousarray(self._buffer[keep])
+        if self._scales is not None:
+            self._scales = self._scales[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._metadata = [self._metadata[row] for row in keep]
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+    
+    def _upsert_rows(
+        self,
+        ids: List[str],
+        codes: np.ndarray,
+        scales: Optional[np.ndarray],
+        metadata: List[Dict]
+    ):
+        """Overwrite existing ids and append new ones (lock held)"""
+        new_rows = []
+        for i, (vector_id, meta) in enumerate(zip(ids, metadata)):
+            row = self._rows.get(vector_id)
+            if row is None:
+                new_rows.append((vector_id, i, meta))
+            else:
+                if np.may_share_memory(self._buffer, self._snapshot.vectors):
+                    # Copy on write: searches may still be reading the published rows
+                    self._buffer = self._buffer.copy()
+                    if self._scales is not None:
+                        self._scales = self._scales.copy()
+                self._buffer[row] = codes[i]
+                if scales is not None:
+                    self._scales[row] = scales[i]
+                self._metadata[row] = meta
+        
+        if not new_rows:
+            return
+        
+        start = len(self._ids)
+        needed = start + len(new_rows)
+        if needed > len(self._buffer):
+            # Grow geometrically so repeated small upserts stay amortized O(1)
+            capacity = max(needed, 2 * len(self._buffer), 64)
+            grown = np.zeros((capacity, self.dimension), dtype=self._buffer.dtype)
+            grown[:start] = self._buffer[:start]
+            self._buffer = grown
+            if self._scales is not None:
+                grown_scales = np.ones(capacity, dtype=np.float32)
+                grown_scales[:start] = self._scales[:start]
+                self._scales = grown_scales
+        
+        for offset, (vector_id, i, meta) in enumerate(new_rows):
+            self._buffer[start + offset] = codes[i]
+            if scales is not None:
+                self._scales[start + offset] = scales[i]
+            self._ids.append(vector_id)
+            self._metadata.append(meta)
+            self._rows[vector_id] = start + offset
+    
+    def _ann_candidates(
+        self,
+        snapshot: _Snapshot,
+        query: np.ndarray,
+        top_k: int,
+        filter_dict: Optional[Dict]
+    ) -> np.ndarray:
+        """Rows of approximate neighbours that pass the filter"""
+        fetch = top_k * max(1, settings.ann_rerank_factor)
+        if filter_dict:
+            fetch *= 4
+        
+        rows = []
+        for vector_id, _ in self.ann.search(query, fetch):
+            row = self._rows.get(vector_id)
+            # Skip ids added or moved after this snapshot was taken
+            if row is None or row >= len(snapshot.ids) or snapshot.ids[row] != vector_id:
+                continue
+            if filter_dict and not matches_filter(snapshot.metadata[row], filter_dict):
+                continue
+            rows.append(row)
+        
+        return np.array(rows, dtype=np.intp)
+    
+    def _update_ann(self, ids: List[str], vectors: np.ndarray):
+        """Keep the approximate index in sync with an upsert (lock held)"""
+        if self.ann is None:
+            return
+        
+        if self.ann.is_trained:
+            self.ann.add(ids, vectors)
+        elif self.count >= settings.ann_min_vectors:
+            logger.info("Training IVF-PQ index on %d vectors", self.count)
+            vectors = self._decoded()
+            self.ann.train(vectors)
+            self.ann.add(list(self._ids), vectors)
+    
+    def _decoded(self) -> np.ndarray:
+        """All stored rows as float32 (lock held; for training, not queries)"""
+        scales = self._scales[:self.count] if self._scales is not None else None
+        return self.codec.decode(self._buffer[:self.count], scales)
+    
+    def _publish(self):
+        """Swap in a new snapshot for readers (lock held)"""
+        self._snapshot = _Snapshot(
+            self._buffer[:len(self._ids)],
+            self._scales[:len(self._ids)] if self._scales is not None else None,
+            tuple(self._ids),
+            tuple(self._metadata)
+        )
+    
+    def _append_segment(
+        self,
+        ids: List[str],
+        codes: Optional[np.ndarray] = None,
+        scales: Optional[np.ndarray] = None,
+        metadata: Optional[List[Dict]] = None
+    ):
+        """Journal one upsert (with codes) or delete to disk, compacting when due (lock held)"""
+        if not self.path:
+            return
+        
+        segments = self.path / "segments"
+        segments.mkdir(parents=True, exist_ok=True)
+        # Ordered by time, unique across processes sharing the directory
+        name = f"{time.time_ns():020d}-{os.getpid()}.npz"
+        arrays = {'record': np.array(json.dumps({'ids': ids, 'metadata': metadata}))}
+        if codes is not None:
+            arrays['codes'] = codes
+            if scales is not None:
+                arrays['scales'] = scales
+        temporary = segments / f".{name}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, segments / name)
+        
+        self._segments.append(name)
+        self._journal_rows += len(ids)
+        if (
+            self._journal_rows >= max(self._snapshot_rows, _COMPACT_MIN_ROWS)
+            or len(self._segments) >= _MAX_SEGMENTS
+        ):
+            self._save()
+    
+    def _save(self):
+        """Write a full snapshot atomically and drop the journal it covers (lock held)"""
+        if not self.path:
+            return
+        
+        self.path.mkdir(parents=True, exist_ok=True)
+        vectors_tmp = self.path / "vectors.tmp.npy"
+        meta_tmp = self.path / "metadata.tmp.json"
+        through = self._segments[-1] if self._segments else self._segments_through
+        
+        np.save(vectors_tmp, self._buffer[:len(self._ids)])
+        if self._scales is not None:
+            np.save(self.path / "scales.tmp.npy", self._scales[:len(self._ids)])
+        with open(meta_tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'ids': self._ids,
+                'metadata': self._metadata,
+                'segments_through': through
+            }, f)
+        
+        if self._scales is not None:
+            os.replace(self.path / "scales.tmp.npy", self.path / "scales.npy")
+        os.replace(vectors_tmp, self.path / "vectors.npy")
+        os.replace(meta_tmp, self.path / "metadata.json")
+        
+        if self.ann is not None:
+            self.ann.save(self.path)
+        
+        for name in self._segments:
+            (self.path / "segments" / name).unlink(missing_ok=True)
+        self._segments = []
+        self._segments_through = through
+        self._journal_rows = 0
+        self._snapshot_rows = self.count
+    
+    def _convert(
+        self,
+        vectors: np.ndarray,
+        scales: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Re-encode rows stored in another format (dtype or width) with the codec"""
+        if vectors.shape[1] < self.dimension:
+            raise ValueError(
+                f"Local index at {self.path} has dimension {vectors.shape[1]}, "
+                f"expected {self.dimension}"
+            )
+        if vectors.dtype == self.codec.storage_dtype and vectors.shape[1] == self.dimension:
+            return vectors, scales
+        stored = VectorCodec(vectors.dtype.name)
+        return self.codec.encode(self.codec.prepare(stored.decode(vectors, scales)))
+    
+    def _load(self):
+        """Restore a previously saved index: the last snapshot, then the journal"""
+        data = {'ids': [], 'metadata': [], 'segments_through': ""}
+        if (self.path / "vectors.npy").exists():
+            vectors = np.load(self.path / "vectors.npy")
+            with open(self.path / "metadata.json", 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            scales_path = self.path / "scales.npy"
+            scales = (
+                np.load(scales_path) if vectors.dtype == np.int8 and scales_path.exists() else None
+            )
+            if vectors.dtype != self.codec.storage_dtype or vectors.shape[1] != self.dimension:
+                # Stored in another format: convert once (re-saved at the next snapshot)
+                logger.info(
+                    "Converting local index from %s x %d to %s x %d",
+                    vectors.dtype, vectors.shape[1], self.codec.dtype, self.dimension
+                )
+            vectors, scales = self._convert(vectors, scales)
+            self._buffer = np.ascontiguousarray(vectors)
+            self._scales = scales
+        
+        self._ids = data['ids']
+        self._metadata = data['metadata']
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._segments_through = data.get('segments_through', "")
+        self._snapshot_rows = self.count
+        if self.mode == "ivfpq":
+            self.ann = IVFPQIndex.load(self.path, nprobe=settings.ann_nprobe)
+            if self.ann is not None and self.ann.dimension != self.dimension:
+                self.ann = None  # Built for untruncated vectors; retrained on the next upsert
+            if self.ann is None:
+                self.ann = IVFPQIndex(
+                    self.dimension,
+                    nlist=settings.ann_nlist,
+                    nprobe=settings.ann_nprobe,
+                    pq_m=settings.ann_pq_m
+                )
+        
+        with self._lock:
+            for segment in sorted(self.path.glob("segments/*.npz")):
+                if segment.name <= self._segments_through:
+                    segment.unlink(missing_ok=True)  # Left by an interrupted snapshot
+                    continue
+                self._replay(segment)
+            self._publish()
+        logger.info("Loaded local index: %d vectors from %s", self.count, self.path)
+    
+    def _replay(self, segment: Path):
+        """Apply one journal segment (lock held)"""
+        with np.load(segment) as arrays:
+            record = json.loads(str(arrays['record']))
+            if 'codes' in arrays.files:
+                codes, scales = self._convert(
+                    arrays['codes'], arrays['scales'] if 'scales' in arrays.files else None
+                )
+                self._upsert_rows(record['ids'], codes, scales, record['metadata'])
+                if self.ann is not None:
+                    self._update_ann(record['ids'], self.codec.decode(codes, scales))
+            else:
+                self._remove_rows([
+                    self._rows[vector_id] for vector_id in record['ids']
+                    if vector_id in self._rows
+                ])
+        self._segments.append(segment.name)
+        self._journal_rows += len(record['ids'])
@@ -0,0 +1,77 @@
+"""
+Logging setup for the API
+Level-gated logging in plain text or one JSON object per line, with the
+request id of the request being handled attached to every record
+"""
+
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import json
+import logging
+
+from config import settings
+
+
+# Set per request by the API; "-" outside of requests
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+# Third-party loggers kept at WARNING even when LOG_LEVEL=DEBUG
+_NOISY_LOGGERS = ("asyncio", "httpcore", "httpx", "openai", "urllib3")
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed via `extra=`"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = None, fmt: str = None):
+    """
+    Install the root handler (once) and set the level
+    
+    Args:
+        level: LOG_LEVEL name, e.g. "INFO" or "DEBUG"
+        fmt: "text" or "json" (LOG_FORMAT)
+    """
+    root = logging.getLogger()
+    root.setLevel((level or settings.log_level).upper())
+    # HTTP client internals would log every OpenAI/Pinecone request
+    for name in _NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(max(root.level, logging.WARNING))
+    if any(getattr(handler, "_rag_handler", False) for handler in root.handlers):
+        return
+    
+    handler = logging.StreamHandler()
+    handler._rag_handler = True
+    handler.addFilter(RequestIdFilter())
+    if (fmt or settings.log_format) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+    root.addHandler(handler)
@@ -3,22 +3,147 @@ FastAPI application for RAG chatbot
 Implements /api/chat endpoint as per requirements
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hmac
+import json
+import logging
+import math
+import time
+import uuid
 
 from config import settings
-from models import ChatRequest, ChatResponse, SourceChunk
+from log_config import configure_logging, request_id
+import metrics
+from metrics import span, track_request
+from models import (
+    BatchChatRequest,
+    BatchChatResponse,
+    ChatRequest,
+    ChatResponse,
+    DocumentJob,
+    DocumentList,
+    SourceChunk,
+)
 from vector_store import vector_store
-from openai_client import generate_embedding, generate_answer
+from answer_cache import answer_cache, context_key
+from conversations import Turn, conversations
+from documents import document_manager
+from ingestion import IngestManifest, hold_indexes, in_memory_indexes
+from query_rewriter import query_rewriter
+from context_builder import PackedContext, pack_context
+from retrieval import search_chunks, search_chunks_batch
+from bm25_index import lexical_index
+from reranker import reranker
+from resilience import UPSTREAMS, UpstreamUnavailable
+from tokenizer import tokenizer
+from local_embeddings import local_embeddings
+from openai_client import (
+    close_async_client,
+    get_async_client,
+    generate_embedding_async,
+    generate_query_embeddings_async,
+    query_batcher,
+    generate_answer_async,
+    stream_answer_async,
+    embedding_cache
+)
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+metrics.register_cache("embedding", embedding_cache)
+metrics.register_cache("answer", answer_cache)
+metrics.register_cache("tokenizer", tokenizer)
+
+
+# Filter by similarity threshold (cosine similarity > 0.25)
+# Lowered threshold because we have full documents as single chunks
+SIMILARITY_THRESHOLD = 0.25
+
+# First retry delay when a backend is unreachable at startup (doubles up to the max)
+STARTUP_RETRY_SECONDS = 1.0
+STARTUP_RETRY_MAX_SECONDS = 30.0
+
+
+class RetrievalError(Exception):
+    """No usable context was found for a question"""
+
+
+async def connect_backends(app: FastAPI):
+    """
+    Connect the vector store and warm the clients, retrying until it works
+    
+    Runs in the background from startup, so the worker accepts connections
+    immediately; GET /ready reports when this has finished. Requests that
+    arrive earlier connect on demand instead.
+    """
+    delay = STARTUP_RETRY_SECONDS
+    start = time.perf_counter()
+    while True:
+        try:
+            # Concurrently and off the event loop: importing the OpenAI SDK alone
+            # takes ~0.5s, and the tokenizer's BPE ranks may be downloaded
+            await asyncio.gather(
+                vector_store.connect_async(),
+                asyncio.to_thread(get_async_client),
+                asyncio.to_thread(lambda: tokenizer.encoding),
+                asyncio.to_thread(lambda: local_embeddings and local_embeddings.model)
+            )
+            break
+        except Exception as e:
+            app.state.startup_error = f"{type(e).__name__}: {e}"
+            logger.warning("Backend connection failed (%s); retrying in %.0fs", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STARTUP_RETRY_MAX_SECONDS)
+    
+    app.state.ready = True
+    app.state.startup_error = None
+    logger.info("Backends ready in %.0f ms", (time.perf_counter() - start) * 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start connecting backends without blocking startup; close clients on shutdown"""
+    app.state.ready = False
+    app.state.startup_error = None
+    connecting = asyncio.create_task(connect_backends(app))
+    holding = None
+    if in_memory_indexes(vector_store, lexical_index):
+        # So load_documents.py refuses to run under us (we would not reload)
+        manifest = (
+            document_manager.manifest if document_manager is not None
+            else IngestManifest(settings.ingest_manifest_path, vector_store.namespace)
+        )
+        holding = asyncio.create_task(hold_indexes(manifest))
+    if document_manager is not None:
+        document_manager.start()
+    try:
+        yield
+    finally:
+        connecting.cancel()
+        if holding is not None:
+            holding.cancel()
+            await asyncio.gather(holding, return_exceptions=True)
+        if document_manager is not None:
+            await document_manager.stop()
+        await close_async_client()
+        metrics.worker_exit()
 
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Acme Tech Solutions RAG Chatbot",
     description="Python backend with Pinecone vector store and OpenAI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -31,6 +156,18 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def assign_request_id(request, call_next):
+    """Tag log records with a request id (the client's X-Request-ID if sent)"""
+    token = request_id.set(request.headers.get("x-request-id") or uuid.uuid4().hex[:12])
+    try:
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id.get()
+        return response
+    finally:
+        request_id.reset(token)
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -39,20 +176,43 @@ async def root():
         "service": "Acme Tech Solutions RAG Chatbot",
         "version": "1.0.0",
         "backend": "Python FastAPI",
-        "vector_store": "Pinecone",
-        "llm": settings.openai_model
+        "vector_store": vector_store.backend_name,
+        "llm": settings.openai_model,
+        "embeddings": settings.embedding_model
     }
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once backends are connected, 503 until then"""
+    if getattr(app.state, "ready", False):
+        return {"status": "ready"}
+    return JSONResponse(
+        status_code=503,
+        content={"status": "starting", "error": getattr(app.state, "startup_error", None)}
+    )
+
+
 @app.get("/health")
 async def health():
     """Detailed health check"""
     try:
-        stats = vector_store.get_stats()
+        stats = await vector_store.get_stats_async()
         return {
             "status": "healthy",
+            "ready": getattr(app.state, "ready", False),
             "pinecone_index": settings.pinecone_index_name,
             "vector_count": stats.get('total_vector_count', 0),
+            "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+            "local_embeddings": local_embeddings.stats() if local_embeddings else None,
+            "embedding_batching": query_batcher.stats() if query_batcher else None,
+            "answer_cache": answer_cache.stats() if answer_cache else None,
+            "bm25_chunks": len(lexical_index) if lexical_index is not None else None,
+            "reranker": reranker.stats() if reranker else None,
+            "conversations": conversations.stats() if conversations else None,
+            "documents": document_manager.stats() if document_manager else None,
+            "query_rewrite": query_rewriter.stats(),
+            "upstreams": {upstream.name: upstream.stats() for upstream in UPSTREAMS},
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
@@ -63,22 +223,288 @@ async def health():
         }
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
+def unavailable(e: UpstreamUnavailable) -> HTTPException:
+    """503 telling the client when to retry"""
+    logger.warning("Failing fast: %s", e)
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+
+def stale_answer(
+    turn: Turn,
+    query_embedding: List[float],
+    chunks: List[Dict]
+) -> Optional[ChatResponse]:
+    """A cached answer, expired or not, for when the LLM cannot be reached"""
+    if answer_cache is None or turn.history or not settings.serve_stale_answers:
+        return None
+    cached = answer_cache.lookup(query_embedding, context_key(chunks), stale=True)
+    if cached is not None:
+        logger.warning("LLM unavailable; serving a cached answer")
+    return cached
+
+
+def json_response(model: BaseModel) -> Response:
+    """
+    Serialize a response model once, timed as the `serialize` stage
+    
+    Returning a Response skips FastAPI's second validation pass through
+    response_model, which is still used for the OpenAPI schema.
+    """
+    with span("serialize"):
+        return Response(model.model_dump_json(), media_type="application/json")
+
+
+async def retrieve_chunks(question: str) -> Tuple[List[float], List[Dict]]:
+    """
+    Embed a question and return the chunks above SIMILARITY_THRESHOLD
+    
+    Args:
+        question: Stripped, non-empty user question
+    
+    Returns:
+        (query embedding, relevant chunks best first)
+    
+    Raises:
+        RetrievalError: if nothing relevant was found
+    """
+    # Step 1: Generate embedding for the question
+    with span("embed"):
+        query_embedding = await generate_embedding_async(question)
+    logger.debug("Generated query embedding (dim: %d)", len(query_embedding))
+    
+    # Step 2: Search for similar chunks (vector + lexical when hybrid)
+    similar_chunks = await search_chunks(question, query_embedding)
+    
+    with span("filter"):
+        return query_embedding, select_relevant(similar_chunks)
+
+
+def select_relevant(similar_chunks: List[Dict]) -> List[Dict]:
+    """
+    Keep the search results above SIMILARITY_THRESHOLD, in retrieval order
+    
+    Exact-term (BM25) matches are kept regardless of their cosine score:
+    that is what hybrid retrieval is for.
+    
+    Raises:
+        RetrievalError: if nothing relevant was found
+    """
+    if not similar_chunks:
+        raise RetrievalError("No relevant content found in documents")
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, chunk in enumerate(similar_chunks):
+            rerank = f", rerank={chunk['rerank_score']:.4f}" if 'rerank_score' in chunk else ""
+            logger.debug(
+                "Chunk %d: score=%.4f%s, doc=%s",
+                i + 1, chunk['score'], rerank, chunk['document_name']
+            )
+    
+    relevant_chunks = [
+        chunk for chunk in similar_chunks 
+        if chunk['score'] >= SIMILARITY_THRESHOLD or chunk.get('lexical_score')
+    ]
+    
+    if not relevant_chunks:
+        raise RetrievalError(
+            "No sufficiently relevant content found. Try rephrasing your question."
+        )
+    
+    logger.debug("%d of %d chunks above threshold", len(relevant_chunks), len(similar_chunks))
+    return relevant_chunks
+
+
+def to_sources(chunks: List[Dict]) -> List[SourceChunk]:
+    """Source attribution returned to the client"""
+    return [
+        SourceChunk(
+            document_name=chunk['document_name'],
+            chunk_text=chunk['content'],
+            similarity=round(chunk['score'], 2),
+            page=chunk.get('page'),
+            heading=chunk.get('heading')
+        )
+        for chunk in chunks
+    ]
+
+
+def history_dicts(request: ChatRequest) -> List[dict]:
+    """Conversation history in the shape generate_answer expects"""
+    return [
+        {"question": msg.question, "answer": msg.answer}
+        for msg in (request.conversation_history or [])
+    ]
+
+
+async def start_turn(request: ChatRequest, question: str) -> Turn:
+    """
+    Find the conversation a question belongs to and the query to retrieve with
+    
+    History sent by the client wins; otherwise a known conversation id
+    brings in the server-side history, and new_conversation starts a
+    conversation (when conversations are enabled). A request with neither
+    stays stateless and is not stored. Follow-ups are rewritten into
+    standalone queries, memoized per conversation and turn when the history
+    came from the server.
+    
+    Args:
+        request: The originating request
+        question: Stripped, non-empty user question
+    
+    Returns:
+        Turn with the conversation id, history and retrieval query
+    """
+    history = history_dicts(request)
+    conversation_id = request.conversation_id
+    # Only server-side history pins what a conversation and turn position mean;
+    # client-sent history can differ between requests with the same id
+    memoize = False
+    if conversations is not None and not history:
+        if conversation_id is not None:
+            history = await asyncio.to_thread(conversations.history, conversation_id)
+            memoize = True
+        elif request.new_conversation:
+            conversation_id = conversations.new_id()
+    
+    if not history:
+        return Turn(conversation_id, question, question, history)
+    
+    with span("rewrite"):
+        query = None
+        if memoize:
+            query = await asyncio.to_thread(
+                conversations.cached_rewrite, conversation_id, len(history), question
+            )
+        if query is None:
+            query = await query_rewriter.rewrite(question, history)
+            if memoize:
+                await asyncio.to_thread(
+                    conversations.store_rewrite, conversation_id, len(history), question, query
+                )
+    
+    if query != question:
+        logger.info("Standalone query: %s", query)
+    return Turn(conversation_id, question, query, history)
+
+
+async def finish_turn(turn: Turn, answer: str):
+    """Add an answered turn to its server-side conversation (SQLite runs off the loop)"""
+    if conversations is not None and turn.conversation_id is not None:
+        await asyncio.to_thread(conversations.append, turn, answer)
+
+
+def build_prompt(turn: Turn, chunks: List[Dict]) -> PackedContext:
+    """Pack chunks and history into the prompt token budget and log the spend"""
+    with span("context"):
+        packed = pack_context(turn.question, chunks, turn.history)
+    report = packed.report
+    logger.info(
+        "Prompt tokens: %d/%d (fixed=%d, history=%d, context=%d; %d chunks, %d turns)",
+        report['total'], report['budget'], report['fixed'], report['history'],
+        report['context'], report['chunks_used'], report['history_turns'],
+        extra={"prompt_tokens": report}
+    )
+    return packed
+
+
+def used_sources(chunks: List[Dict], packed: PackedContext) -> List[SourceChunk]:
+    """Sources for the chunks that made it into the prompt, with their full text"""
+    used_ids = {chunk['id'] for chunk in packed.chunks}
+    return to_sources([chunk for chunk in chunks if chunk['id'] in used_ids])
+
+
+async def answer_question(
+    turn: Turn,
+    query_embedding: List[float],
+    relevant_chunks: List[Dict]
+) -> ChatResponse:
+    """
+    Answer a question from its retrieved chunks, via the answer cache
+    
+    Args:
+        turn: The question with its conversation (from start_turn)
+        query_embedding: Embedding of the retrieval query
+        relevant_chunks: Chunks returned by select_relevant
+    
+    Returns:
+        Successful ChatResponse with answer and sources
+    """
+    # Near-duplicate question over the same chunks: skip the LLM.
+    # Follow-ups depend on history, so only standalone questions are cached.
+    use_answer_cache = answer_cache is not None and not turn.history
+    if use_answer_cache:
+        cache_key = context_key(relevant_chunks)
+        cached = answer_cache.lookup(query_embedding, cache_key)
+        if cached is not None:
+            logger.info("Answer cache hit")
+            await finish_turn(turn, cached.answer)
+            return cached.model_copy(update={"conversation_id": turn.conversation_id})
+    
+    # Step 3: Pack the best chunks and recent history into the token budget
+    packed = build_prompt(turn, relevant_chunks)
+    
+    # Step 4: Generate answer using GPT-3.5-turbo
+    try:
+        with span("generate"):
+            answer = await generate_answer_async(
+                question=turn.question,
+                context=packed.context,
+                conversation_history=packed.history
+            )
+    except UpstreamUnavailable:
+        cached = stale_answer(turn, query_embedding, relevant_chunks)
+        if cached is None:
+            raise
+        return cached.model_copy(update={"conversation_id": turn.conversation_id})
+    
+    logger.debug("Generated answer (length: %d)", len(answer))
+    
+    # Step 5: Prepare sources for response
+    response = ChatResponse(
+        success=True,
+        answer=answer,
+        sources=used_sources(relevant_chunks, packed),
+        timestamp=datetime.utcnow().isoformat()
+    )
+    
+    if use_answer_cache:
+        answer_cache.store(query_embedding, cache_key, response)
+    await finish_turn(turn, answer)
+    
+    return response.model_copy(update={"conversation_id": turn.conversation_id})
+
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
     Main chat endpoint for RAG queries
     
     Implements Retrieval-Augmented Generation:
+    0. Rewrite a follow-up into a standalone query
     1. Generate embedding for question
     2. Search Pinecone for similar chunks
-    3. Build context from retrieved chunks
+    3. Pack the best chunks and history into the prompt token budget
     4. Generate answer using GPT-3.5-turbo
     
     Args:
-        request: ChatRequest with question and optional conversation history
+        request: ChatRequest with question and either conversation history
+            or the conversation_id returned by an earlier response
+            (new_conversation asks for one)
     
     Returns:
-        ChatResponse with answer and source attribution
+        ChatResponse with answer, source attribution and conversation_id
     """
     try:
         # Validate input
@@ -89,96 +515,369 @@ async def chat(request: ChatRequest):
             )
         
         question = request.question.strip()
-        print(f"[Chat] Question: {question}")
-        
-        # Step 1: Generate embedding for the question
-        query_embedding = generate_embedding(question)
-        print(f"[Chat] Generated query embedding (dim: {len(query_embedding)})")
+        logger.info("Question: %s", question)
         
-        # Step 2: Search Pinecone for similar chunks
-        similar_chunks = vector_store.search(
-            query_embedding=query_embedding,
-            top_k=5
+        with track_request("chat"):
+            # Step 0: Resolve the conversation and the standalone query
+            turn = await start_turn(request, question)
+            
+            # Steps 1-2: Embed the query and retrieve relevant chunks
+            try:
+                query_embedding, relevant_chunks = await retrieve_chunks(turn.query)
+            except RetrievalError as e:
+                return json_response(ChatResponse(
+                    success=False,
+                    error=str(e),
+                    timestamp=datetime.utcnow().isoformat(),
+                    conversation_id=turn.conversation_id
+                ))
+            
+            # Steps 3-5: Pack the prompt, generate and attribute the answer
+            response = await answer_question(turn, query_embedding, relevant_chunks)
+            return json_response(response)
+    
+    except HTTPException:
+        raise
+    except UpstreamUnavailable as e:
+        raise unavailable(e)
+    except Exception as e:
+        logger.exception("Chat error: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
         )
-        
-        if not similar_chunks:
-            return ChatResponse(
-                success=False,
-                error="No relevant content found in documents",
-                timestamp=datetime.utcnow().isoformat()
-            )
-        
-        print(f"[Chat] Found {len(similar_chunks)} similar chunks")
-        
-        # Debug: Print all scores
-        for i, chunk in enumerate(similar_chunks):
-            print(f"  Chunk {i+1}: score={chunk['score']:.4f}, doc={chunk['document_name']}")
-        
-        # Filter by similarity threshold (cosine similarity > 0.25)
-        # Lowered threshold because we have full documents as single chunks
-        SIMILARITY_THRESHOLD = 0.25
-        relevant_chunks = [
-            chunk for chunk in similar_chunks 
-            if chunk['score'] >= SIMILARITY_THRESHOLD
-        ]
-        
-        if not relevant_chunks:
-            return ChatResponse(
-                success=False,
-                error="No sufficiently relevant content found. Try rephrasing your question.",
-                timestamp=datetime.utcnow().isoformat()
-            )
-        
-        print(f"[Chat] {len(relevant_chunks)} chunks above threshold")
-        
-        # Step 3: Build context from retrieved chunks
-        context_parts = []
-        for i, chunk in enumerate(relevant_chunks):
-            context_parts.append(
-                f"[Source {i + 1}: {chunk['document_name']}]\n{chunk['content']}"
-            )
-        
-        context = "\n\n---\n\n".join(context_parts)
-        
-        # Step 4: Generate answer using GPT-3.5-turbo
-        conversation_history = [
-            {"question": msg.question, "answer": msg.answer}
-            for msg in (request.conversation_history or [])
-        ]
-        
-        answer = generate_answer(
-            question=question,
-            context=context,
-            conversation_history=conversation_history
+
+
+@app.post("/api/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest):
+    """
+    Answer many questions in one call
+    
+    All questions are embedded with a single embeddings request and
+    searched together; answers are then generated concurrently, at most
+    CHAT_BATCH_CONCURRENCY at a time. A failure for one item (empty
+    question, nothing relevant, LLM error) is reported in that item's
+    ChatResponse and does not affect the others.
+    
+    Args:
+        request: BatchChatRequest with up to CHAT_BATCH_MAX_ITEMS ChatRequests
+    
+    Returns:
+        BatchChatResponse with one ChatResponse per item, in request order
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch cannot be empty")
+    if len(request.items) > settings.chat_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch cannot exceed {settings.chat_batch_max_items} items"
         )
-        
-        print(f"[Chat] Generated answer (length: {len(answer)})")
-        
-        # Step 5: Prepare sources for response
-        sources = [
-            SourceChunk(
-                document_name=chunk['document_name'],
-                chunk_text=chunk['content'],
-                similarity=round(chunk['score'], 2)
-            )
-            for chunk in relevant_chunks
-        ]
-        
+    
+    with track_request("chat_batch"):
+        return json_response(await answer_batch(request))
+
+
+async def answer_batch(request: BatchChatRequest) -> BatchChatResponse:
+    """Body of /api/chat/batch, once the batch size is validated"""
+    questions = [(item.question or "").strip() for item in request.items]
+    valid = [i for i, question in enumerate(questions) if question]
+    logger.info("Batch of %d questions (%d non-empty)", len(request.items), len(valid))
+    
+    def failure(error: str) -> ChatResponse:
         return ChatResponse(
-            success=True,
-            answer=answer,
-            sources=sources,
+            success=False,
+            error=error,
             timestamp=datetime.utcnow().isoformat()
         )
     
-    except HTTPException:
-        raise
+    results: List[ChatResponse] = [failure("Question cannot be empty")] * len(questions)
+    if not valid:
+        return BatchChatResponse(results=results)
+    
+    try:
+        turns = dict(zip(valid, await asyncio.gather(*(
+            start_turn(request.items[i], questions[i]) for i in valid
+        ))))
+        queries = [turns[i].query for i in valid]
+        
+        # Steps 1-2 for every question at once
+        with span("embed"):
+            embeddings = await generate_query_embeddings_async(queries)
+        searches = await search_chunks_batch(queries, embeddings)
+    except UpstreamUnavailable as e:
+        raise unavailable(e)
     except Exception as e:
-        print(f"[Chat] Error: {e}")
+        logger.exception("Batch error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
+    
+    limit = asyncio.Semaphore(settings.chat_batch_concurrency)
+    
+    async def answer_item(index: int, query_embedding: List[float], similar: List[Dict]):
+        try:
+            with span("filter"):
+                relevant_chunks = select_relevant(similar)
+        except RetrievalError as e:
+            results[index] = failure(str(e))
+            return
+        try:
+            async with limit:
+                results[index] = await answer_question(
+                    turns[index], query_embedding, relevant_chunks
+                )
+        except UpstreamUnavailable as e:
+            results[index] = failure(str(e))
+        except Exception as e:
+            logger.exception("Batch item %d error: %s", index, e)
+            results[index] = failure(f"Internal server error: {str(e)}")
+    
+    await asyncio.gather(*(
+        answer_item(index, embedding, similar)
+        for index, embedding, similar in zip(valid, embeddings, searches)
+    ))
+    return BatchChatResponse(results=results)
+
+
+def document_api(x_api_key: Optional[str] = Header(None)):
+    """Dependency of the document endpoints: enabled, and the X-API-Key matches"""
+    if document_manager is None:
+        raise HTTPException(status_code=404, detail="Document management is disabled")
+    if not hmac.compare_digest(
+        x_api_key or "", settings.document_api_key
+    ):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-API-Key")
+
+
+def valid_document_name(name: str) -> str:
+    """Normalized document name, or a 400"""
+    try:
+        return document_manager.document_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def submit_upload(document_name: str, file: UploadFile) -> JSONResponse:
+    """Read an uploaded file within DOCUMENT_MAX_BYTES and queue its ingestion"""
+    content = await file.read(settings.document_max_bytes + 1)
+    if len(content) > settings.document_max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Document exceeds {settings.document_max_bytes} bytes"
+        )
+    job = document_manager.submit(document_name, content)
+    return JSONResponse(status_code=202, content=job.model_dump())
+
+
+@app.get("/api/documents", response_model=DocumentList, dependencies=[Depends(document_api)])
+async def list_documents():
+    """Documents in the knowledge base, with their chunk counts"""
+    return DocumentList(documents=document_manager.documents())
+
+
+@app.post(
+    "/api/documents",
+    response_model=DocumentJob,
+    status_code=202,
+    dependencies=[Depends(document_api)]
+)
+async def upload_document(
+    file: UploadFile = File(...),
+    document_name: Optional[str] = Form(None)
+):
+    """
+    Add a document to the knowledge base
+    
+    The file is chunked, embedded and indexed by a background worker; the
+    returned job reports progress at GET /api/documents/jobs/{job_id}.
+    The document becomes searchable, all at once, when the job is done.
+    
+    Args:
+        file: Document in a supported format (.txt, .md, .html, .docx, .pdf; multipart upload)
+        document_name: Name to store it under, e.g. "policies/leave.txt"
+            (defaults to the file name)
+    
+    Returns:
+        202 with the queued DocumentJob; 409 if the document exists (use PUT)
+    """
+    name = valid_document_name(document_name or file.filename or "")
+    if document_manager.exists(name):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Document {name} already exists; PUT /api/documents/{name} replaces it"
+        )
+    return await submit_upload(name, file)
+
+
+@app.put(
+    "/api/documents/{document_name:path}",
+    response_model=DocumentJob,
+    status_code=202,
+    dependencies=[Depends(document_api)]
+)
+async def replace_document(document_name: str, file: UploadFile = File(...)):
+    """
+    Create or replace a document
+    
+    Only chunks whose content changed are re-embedded and upserted. Queries
+    keep seeing the previous version until the new one is fully stored,
+    then switch to it in one step.
+    
+    Returns:
+        202 with the queued DocumentJob
+    """
+    return await submit_upload(valid_document_name(document_name), file)
+
+
+@app.delete(
+    "/api/documents/{document_name:path}",
+    response_model=DocumentJob,
+    status_code=202,
+    dependencies=[Depends(document_api)]
+)
+async def delete_document(document_name: str):
+    """
+    Remove a document from the knowledge base and the documents directory
+    
+    Its chunks stop being retrieved as soon as the job runs, before they
+    are deleted from the vector store.
+    
+    Returns:
+        202 with the queued DocumentJob; 404 if the document is unknown
+    """
+    name = valid_document_name(document_name)
+    if not document_manager.exists(name):
+        raise HTTPException(status_code=404, detail=f"Document {name} not found")
+    job = document_manager.submit(name, None)
+    return JSONResponse(status_code=202, content=job.model_dump())
+
+
+@app.get(
+    "/api/documents/jobs/{job_id}",
+    response_model=DocumentJob,
+    dependencies=[Depends(document_api)]
+)
+async def document_job(job_id: str):
+    """Status of a document job (the last DOCUMENT_JOBS_KEPT are remembered)"""
+    job = document_manager.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming variant of /api/chat using Server-Sent Events
+    
+    Emits, in order:
+    - `sources`: the retrieved chunks, as soon as retrieval finishes
+    - `token`: one event per answer fragment from the chat completions API
+    - `done`: final event with the response timestamp and conversation_id
+    An `error` event replaces the rest of the stream if anything fails
+    (with `retry_after` seconds when an upstream is unavailable).
+    
+    Args:
+        request: ChatRequest with question and optional conversation history
+    
+    Returns:
+        text/event-stream response
+    """
+    if not request.question or not request.question.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Question cannot be empty"
+        )
+    
+    question = request.question.strip()
+    logger.info("Streaming question: %s", question)
+    
+    async def events() -> AsyncIterator[str]:
+        with track_request("chat_stream"):
+            async for event in stream_events():
+                yield event
+    
+    async def stream_events() -> AsyncIterator[str]:
+        try:
+            turn = await start_turn(request, question)
+            try:
+                query_embedding, relevant_chunks = await retrieve_chunks(turn.query)
+            except RetrievalError as e:
+                yield sse_event("error", {"error": str(e), "conversation_id": turn.conversation_id})
+                return
+            
+            packed = build_prompt(turn, relevant_chunks)
+            sources = used_sources(relevant_chunks, packed)
+            yield sse_event("sources", [source.model_dump() for source in sources])
+            
+            use_answer_cache = answer_cache is not None and not turn.history
+            if use_answer_cache:
+                cache_key = context_key(relevant_chunks)
+                cached = answer_cache.lookup(query_embedding, cache_key)
+                if cached is not None:
+                    await finish_turn(turn, cached.answer)
+                    yield sse_event("token", {"content": cached.answer})
+                    yield sse_event("done", {
+                        "timestamp": cached.timestamp,
+                        "conversation_id": turn.conversation_id
+                    })
+                    return
+            
+            parts = []
+            try:
+                with span("generate"):
+                    async for token in stream_answer_async(
+                        question=turn.question,
+                        context=packed.context,
+                        conversation_history=packed.history
+                    ):
+                        parts.append(token)
+                        yield sse_event("token", {"content": token})
+            except UpstreamUnavailable:
+                cached = None if parts else stale_answer(turn, query_embedding, relevant_chunks)
+                if cached is None:
+                    raise
+                yield sse_event("token", {"content": cached.answer})
+                yield sse_event("done", {
+                    "timestamp": cached.timestamp,
+                    "conversation_id": turn.conversation_id
+                })
+                return
+            
+            timestamp = datetime.utcnow().isoformat()
+            answer = "".join(parts)
+            if use_answer_cache:
+                answer_cache.store(query_embedding, cache_key, ChatResponse(
+                    success=True,
+                    answer=answer,
+                    sources=sources,
+                    timestamp=timestamp
+                ))
+            await finish_turn(turn, answer)
+            
+            yield sse_event("done", {
+                "timestamp": timestamp,
+                "conversation_id": turn.conversation_id
+            })
+        
+        except UpstreamUnavailable as e:
+            logger.warning("Failing fast: %s", e)
+            yield sse_event("error", {"error": str(e), "retry_after": math.ceil(e.retry_after)})
+        except Exception as e:
+            logger.exception("Stream error: %s", e)
+            yield sse_event("error", {"error": f"Internal server error: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+"""
+Prometheus metrics for the chat pipeline
+Per-stage latency histograms, OpenAI token usage, in-flight gauges and
+cache counters, served by GET /metrics
+"""
+
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+from config import settings
+
+
+# Pipeline stages timed per question
+STAGES = ("rewrite", "embed", "search", "rerank", "filter", "context", "generate", "serialize")
+
+ENDPOINTS = ("chat", "chat_batch", "chat_stream")
+
+# Set by serve.py when several worker processes serve the API: each one writes
+# its samples to files there and /metrics adds them up across workers
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# 0.5ms (cache hits, local search) to 30s (slow completions)
+_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+stage_seconds = Histogram(
+    "rag_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=_BUCKETS
+)
+request_seconds = Histogram(
+    "rag_request_seconds", "End-to-end request time per endpoint", ["endpoint"], buckets=_BUCKETS
+)
+requests_in_flight = Gauge(
+    "rag_requests_in_flight", "Requests being handled per endpoint", ["endpoint"],
+    multiprocess_mode="livesum"
+)
+openai_in_flight = Gauge(
+    "openai_requests_in_flight", "OpenAI API calls awaiting a response", ["operation"],
+    multiprocess_mode="livesum"
+)
+openai_tokens = Counter(
+    "openai_tokens_total", "Tokens reported by OpenAI responses", ["model", "kind"]
+)
+upstream_retries = Counter(
+    "rag_upstream_retries_total", "Upstream calls retried after a transient failure", ["upstream"]
+)
+upstream_rejected = Counter(
+    "rag_upstream_rejected_total",
+    "Upstream calls given up on (circuit open, deadline, retries exhausted)",
+    ["upstream"]
+)
+upstream_circuit_open = Gauge(
+    "rag_upstream_circuit_open", "1 while an upstream's circuit breaker is open", ["upstream"],
+    multiprocess_mode="livemax"
+)
+document_jobs = Counter(
+    "rag_document_jobs_total", "Document API jobs finished", ["action", "status"]
+)
+document_chunks = Counter(
+    "rag_document_chunks_total", "Chunks of uploaded documents by outcome", ["outcome"]
+)
+
+# Label lookups are resolved once so the hot path is a dict lookup plus observe()
+_stage_timers = {stage: stage_seconds.labels(stage) for stage in STAGES}
+_request_timers = {endpoint: request_seconds.labels(endpoint) for endpoint in ENDPOINTS}
+_in_flight = {endpoint: requests_in_flight.labels(endpoint) for endpoint in ENDPOINTS}
+_disabled = nullcontext()
+
+
+@contextmanager
+def _timed(histogram) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+
+def span(stage: str):
+    """Time a pipeline stage: `with span("search"): ...`"""
+    if not settings.metrics_enabled:
+        return _disabled
+    return _timed(_stage_timers[stage])
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[None]:
+    """Count a request as in flight and time it end to end"""
+    if not settings.metrics_enabled:
+        yield
+        return
+    gauge = _in_flight[endpoint]
+    gauge.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _request_timers[endpoint].observe(time.perf_counter() - start)
+        gauge.dec()
+
+
+def track_openai(operation: str):
+    """Count an OpenAI call as in flight: `with track_openai("chat"): ...`"""
+    if not settings.metrics_enabled:
+        return _disabled
+    return openai_in_flight.labels(operation).track_inprogress()
+
+
+def record_usage(model: str, usage):
+    """Add the token counts from an OpenAI response's `usage` (may be None)"""
+    if usage is None or not settings.metrics_enabled:
+        return
+    openai_tokens.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if completion_tokens:
+        openai_tokens.labels(model, "completion").inc(completion_tokens)
+
+
+def record_retry(upstream: str):
+    if settings.metrics_enabled:
+        upstream_retries.labels(upstream).inc()
+
+
+def record_rejection(upstream: str):
+    if settings.metrics_enabled:
+        upstream_rejected.labels(upstream).inc()
+
+
+def set_circuit_open(upstream: str, is_open: bool):
+    if settings.metrics_enabled:
+        upstream_circuit_open.labels(upstream).set(1 if is_open else 0)
+
+
+def record_document_job(action: str, status: str, stats: Dict = None):
+    if settings.metrics_enabled:
+        document_jobs.labels(action, status).inc()
+        for outcome in ("embedded", "skipped", "deleted"):
+            if stats and stats.get(f"chunks_{outcome}"):
+                document_chunks.labels(outcome).inc(stats[f"chunks_{outcome}"])
+
+
+class CacheCollector:
+    """
+    Reads cache hit/miss counters at scrape time
+    
+    The caches already count hits and misses; exporting them on scrape
+    keeps cache lookups free of metric updates.
+    """
+    
+    def __init__(self):
+        self.caches: Dict[str, object] = {}
+    
+    def collect(self):
+        hits = CounterMetricFamily("rag_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("rag_cache_misses", "Cache misses", labels=["cache"])
+        entries = GaugeMetricFamily("rag_cache_entries", "Entries held per cache", labels=["cache"])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            entries.add_metric([name], stats["entries"])
+        yield hits
+        yield misses
+        yield entries
+
+
+_cache_collector = CacheCollector()
+REGISTRY.register(_cache_collector)
+
+
+def register_cache(name: str, cache):
+    """Export a cache's stats() hits/misses/entries (ignores disabled caches)"""
+    if cache is not None:
+        _cache_collector.caches[name] = cache
+
+
+def render() -> bytes:
+    """
+    Current metrics in the Prometheus text format
+    
+    With several workers, histograms, counters and gauges are summed over
+    all of them; cache counters are those of the worker serving the scrape.
+    """
+    if not MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=MULTIPROC_DIR)
+    registry.register(_cache_collector)
+    return generate_latest(registry)
+
+
+def worker_exit():
+    """Drop this worker's live gauges from the shared totals (API shutdown)"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid(), MULTIPROC_DIR)
+
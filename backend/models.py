@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class ChatMessage(BaseModel):
@@ -12,6 +12,8 @@ class ChatRequest(BaseModel):
     """Request body for /api/chat endpoint"""
     question: str
     conversation_history: Optional[List[ChatMessage]] = []
+    conversation_id: Optional[str] = None  # Use the server-side history instead of sending it
+    new_conversation: bool = False  # Start a server-side conversation and return its id
 
 
 class SourceChunk(BaseModel):
@@ -19,6 +21,8 @@ class SourceChunk(BaseModel):
     document_name: str
     chunk_text: str
     similarity: float
+    page: Optional[int] = None  # Page the chunk came from (PDF, DOCX)
+    heading: Optional[str] = None  # Enclosing headings, e.g. "Benefits > Leave"
 
 
 class ChatResponse(BaseModel):
@@ -28,3 +32,38 @@ class ChatResponse(BaseModel):
     sources: Optional[List[SourceChunk]] = []
     error: Optional[str] = None
     timestamp: str
+    conversation_id: Optional[str] = None
+
+
+class BatchChatRequest(BaseModel):
+    """Request body for /api/chat/batch endpoint"""
+    items: List[ChatRequest]
+
+
+class BatchChatResponse(BaseModel):
+    """Response from /api/chat/batch endpoint, one result per item in order"""
+    results: List[ChatResponse]
+
+
+class DocumentJob(BaseModel):
+    """Background ingestion job created by the /api/documents endpoints"""
+    job_id: str
+    document_name: str
+    action: str  # "upsert" or "delete"
+    status: str = "queued"  # queued, running, done, failed or superseded
+    created: str
+    finished: Optional[str] = None
+    error: Optional[str] = None
+    stats: Optional[Dict] = None  # Chunks embedded, skipped and deleted
+
+
+class DocumentInfo(BaseModel):
+    """A document in the knowledge base"""
+    document_name: str
+    chunks: int
+    pending: bool = False  # A job for it is queued or running
+
+
+class DocumentList(BaseModel):
+    """Response from GET /api/documents"""
+    documents: List[DocumentInfo]
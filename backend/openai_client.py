@@ -1,14 +1,135 @@
 """
 OpenAI integration for embeddings and LLM
+Embeddings come from a local model instead when EMBEDDING_MODEL=local:...
 """
 
-from typing import List
-from openai import OpenAI
+from typing import AsyncIterator, List
+import threading
 from config import settings
+from batching import MicroBatcher
+from embedding_cache import EmbeddingCache
+from local_embeddings import local_embeddings
+from metrics import record_usage, track_openai
+from resilience import chat_upstream, embeddings_upstream, is_input_error
 
 
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.openai_api_key)
+SYSTEM_PROMPT = """You are a helpful assistant that answers questions based ONLY on the provided context from documents.
+
+IMPORTANT RULES:
+1. Answer ONLY using information from the provided context
+2. If the answer is not found in the context, respond with "Not found in documents."
+3. Cite which document(s) you used to answer the question
+4. Be concise and accurate
+5. Do not make up information or use external knowledge
+6. Use conversation history to understand follow-up questions and references"""
+
+CONDENSE_PROMPT = """Rewrite the user's latest question as a standalone search query that can be understood without the earlier questions. Replace pronouns and vague references with what they refer to, keep names and terms exactly as written, and do not answer it. If it is already standalone, return it unchanged. Reply with the query only."""
+
+# Most recent conversation turns included in the prompt
+MAX_HISTORY_TURNS = 3
+
+
+# OpenAI clients (sync for scripts, async for the API), created on first use:
+# the SDK takes most of a second to import and the API should boot without it
+_client = None
+_async_client = None
+_clients_lock = threading.Lock()
+
+
+def _http_limits():
+    """Shared connection pool limits for both clients"""
+    import httpx
+    return httpx.Limits(
+        max_connections=settings.openai_max_connections,
+        max_keepalive_connections=settings.openai_max_connections
+    )
+
+
+def get_client():
+    """The synchronous OpenAI client"""
+    global _client
+    if _client is None:
+        with _clients_lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+                _client = OpenAI(
+                    api_key=settings.openai_api_key,
+                    base_url=settings.openai_base_url,
+                    timeout=settings.openai_timeout,
+                    max_retries=0,  # Retried by the resilience layer
+                    http_client=httpx.Client(limits=_http_limits(), timeout=settings.openai_timeout)
+                )
+    return _client
+
+
+def get_async_client():
+    """The asynchronous OpenAI client used by the API"""
+    global _async_client
+    if _async_client is None:
+        with _clients_lock:
+            if _async_client is None:
+                import httpx
+                from openai import AsyncOpenAI
+                _async_client = AsyncOpenAI(
+                    api_key=settings.openai_api_key,
+                    base_url=settings.openai_base_url,
+                    timeout=settings.openai_timeout,
+                    max_retries=0,  # Retried by the resilience layer
+                    http_client=httpx.AsyncClient(limits=_http_limits(), timeout=settings.openai_timeout)
+                )
+    return _async_client
+
+
+async def close_async_client():
+    """Close the async client's connections (API shutdown); the next call reopens it"""
+    global _async_client
+    with _clients_lock:
+        async_client, _async_client = _async_client, None
+    if async_client is not None:
+        await async_client.close()
+
+
+def _attempt_timeout(remaining: float) -> float:
+    """SDK timeout for one attempt: OPENAI_TIMEOUT, or less if the call's deadline is nearer"""
+    return min(remaining, settings.openai_timeout)
+
+
+# Cache for query embeddings (disabled when EMBEDDING_CACHE_SIZE=0)
+embedding_cache = EmbeddingCache(
+    model=settings.embedding_model,
+    max_entries=settings.embedding_cache_size,
+    ttl_seconds=settings.embedding_cache_ttl,
+    path=settings.embedding_cache_path
+) if settings.embedding_cache_size > 0 else None
+
+
+async def _embed_queries_async(texts: List[str]) -> List[List[float]]:
+    """One embeddings request for a micro-batch of questions (duplicates are sent once)"""
+    unique = list(dict.fromkeys(texts))
+    with track_openai("embeddings"):
+        response = await embeddings_upstream.call(
+            lambda timeout: get_async_client().embeddings.create(
+                model=settings.embedding_model,
+                input=unique,
+                timeout=_attempt_timeout(timeout)
+            )
+        )
+    record_usage(settings.embedding_model, response.usage)
+    vectors = dict(zip(unique, (item.embedding for item in response.data)))
+    return [vectors[text] for text in texts]
+
+
+# Coalesces concurrent question embeddings into one API request
+# (disabled when EMBEDDING_BATCH_SIZE=1 or with a local model). A batch
+# rejected for its input is resent per request, so only the bad one fails.
+query_batcher = MicroBatcher(
+    _embed_queries_async,
+    max_batch=settings.embedding_batch_size,
+    max_wait=settings.embedding_batch_wait_ms / 1000,
+    name="openai_embeddings",
+    isolate=is_input_error
+) if settings.embedding_batch_size > 1 and local_embeddings is None else None
 
 
 def generate_embedding(text: str) -> List[float]:
@@ -21,11 +142,61 @@ def generate_embedding(text: str) -> List[float]:
     Returns:
         Embedding vector
     """
-    response = client.embeddings.create(
-        model=settings.embedding_model,
-        input=text
-    )
-    return response.data[0].embedding
+    if embedding_cache is not None:
+        cached = embedding_cache.get(text)
+        if cached is not None:
+            return cached
+    
+    if local_embeddings is not None:
+        embedding = local_embeddings.embed([text])[0]
+    else:
+        with track_openai("embeddings"):
+            response = embeddings_upstream.call_sync(
+                lambda timeout: get_client().embeddings.create(
+                    model=settings.embedding_model,
+                    input=text,
+                    timeout=_attempt_timeout(timeout)
+                )
+            )
+        record_usage(settings.embedding_model, response.usage)
+        embedding = response.data[0].embedding
+    
+    if embedding_cache is not None:
+        embedding_cache.set(text, embedding)
+    return embedding
+
+
+async def generate_embedding_async(text: str) -> List[float]:
+    """
+    Async variant of generate_embedding for use inside the API
+    
+    Questions embedded concurrently by different requests share one
+    embeddings request (see query_batcher).
+    """
+    if embedding_cache is not None:
+        cached = embedding_cache.get(text)
+        if cached is not None:
+            return cached
+    
+    if local_embeddings is not None:
+        embedding = (await local_embeddings.embed_async([text]))[0]
+    elif query_batcher is not None:
+        embedding = (await query_batcher.submit([text]))[0]
+    else:
+        with track_openai("embeddings"):
+            response = await embeddings_upstream.call(
+                lambda timeout: get_async_client().embeddings.create(
+                    model=settings.embedding_model,
+                    input=text,
+                    timeout=_attempt_timeout(timeout)
+                )
+            )
+        record_usage(settings.embedding_model, response.usage)
+        embedding = response.data[0].embedding
+    
+    if embedding_cache is not None:
+        embedding_cache.set(text, embedding)
+    return embedding
 
 
 def generate_batch_embeddings(texts: List[str]) -> List[List[float]]:
@@ -38,20 +209,75 @@ def generate_batch_embeddings(texts: List[str]) -> List[List[float]]:
     Returns:
         List of embedding vectors
     """
-    response = client.embeddings.create(
-        model=settings.embedding_model,
-        input=texts
-    )
+    if local_embeddings is not None:
+        return local_embeddings.embed(texts)
+    
+    with track_openai("embeddings"):
+        response = embeddings_upstream.call_sync(
+            lambda timeout: get_client().embeddings.create(
+                model=settings.embedding_model,
+                input=texts,
+                timeout=_attempt_timeout(timeout)
+            ),
+            deadline=settings.embedding_batch_deadline
+        )
+    record_usage(settings.embedding_model, response.usage)
     return [item.embedding for item in response.data]
 
 
-def generate_answer(
+async def generate_batch_embeddings_async(texts: List[str]) -> List[List[float]]:
+    """Async variant of generate_batch_embeddings"""
+    if local_embeddings is not None:
+        return await local_embeddings.embed_async(texts)
+    
+    with track_openai("embeddings"):
+        response = await embeddings_upstream.call(
+            lambda timeout: get_async_client().embeddings.create(
+                model=settings.embedding_model,
+                input=texts,
+                timeout=_attempt_timeout(timeout)
+            ),
+            deadline=settings.embedding_batch_deadline
+        )
+    record_usage(settings.embedding_model, response.usage)
+    return [item.embedding for item in response.data]
+
+
+async def generate_query_embeddings_async(texts: List[str]) -> List[List[float]]:
+    """
+    Embed many queries with a single API call, serving repeats from the cache
+    
+    Args:
+        texts: Query texts (duplicates are embedded once)
+    
+    Returns:
+        Embedding vectors in the same order as texts
+    """
+    embeddings = {}
+    if embedding_cache is not None:
+        for text in texts:
+            if text not in embeddings:
+                cached = embedding_cache.get(text)
+                if cached is not None:
+                    embeddings[text] = cached
+    
+    missing = list(dict.fromkeys(text for text in texts if text not in embeddings))
+    if missing:
+        for text, embedding in zip(missing, await generate_batch_embeddings_async(missing)):
+            embeddings[text] = embedding
+            if embedding_cache is not None:
+                embedding_cache.set(text, embedding)
+    
+    return [embeddings[text] for text in texts]
+
+
+def build_messages(
     question: str,
     context: str,
     conversation_history: List[dict] = None
-) -> str:
+) -> List[dict]:
     """
-    Generate answer using GPT-3.5-turbo
+    Build the chat completion messages for a RAG question
     
     Args:
         question: User's question
@@ -59,23 +285,13 @@ def generate_answer(
         conversation_history: Previous messages for context
     
     Returns:
-        Generated answer
+        List of chat messages
     """
-    system_prompt = """You are a helpful assistant that answers questions based ONLY on the provided context from documents.
-
-IMPORTANT RULES:
-1. Answer ONLY using information from the provided context
-2. If the answer is not found in the context, respond with "Not found in documents."
-3. Cite which document(s) you used to answer the question
-4. Be concise and accurate
-5. Do not make up information or use external knowledge
-6. Use conversation history to understand follow-up questions and references"""
-
     # Build conversation context
-    messages = [{"role": "system", "content": system_prompt}]
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
     
     if conversation_history:
-        for msg in conversation_history[-3:]:  # Last 3 messages
+        for msg in conversation_history[-MAX_HISTORY_TURNS:]:
             messages.append({"role": "user", "content": msg.get("question", "")})
             messages.append({"role": "assistant", "content": msg.get("answer", "")})
     
@@ -89,15 +305,142 @@ IMPORTANT RULES:
 Current Question: {question}
 
 Please answer the current question based on the context above."""
-    
+
     messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+
+def generate_answer(
+    question: str,
+    context: str,
+    conversation_history: List[dict] = None
+) -> str:
+    """
+    Generate answer using GPT-3.5-turbo
+    
+    Args:
+        question: User's question
+        context: Retrieved context from documents
+        conversation_history: Previous messages for context
+    
+    Returns:
+        Generated answer
+    """
+    messages = build_messages(question, context, conversation_history)
     
     # Call OpenAI
-    response = client.chat.completions.create(
-        model=settings.openai_model,
-        messages=messages,
-        temperature=0.3,
-        max_tokens=1000
-    )
+    with track_openai("chat"):
+        response = chat_upstream.call_sync(
+            lambda timeout: get_client().chat.completions.create(
+                model=settings.openai_model,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=1000,
+                timeout=_attempt_timeout(timeout)
+            )
+        )
+    record_usage(settings.openai_model, response.usage)
+    
+    return response.choices[0].message.content
+
+
+async def generate_answer_async(
+    question: str,
+    context: str,
+    conversation_history: List[dict] = None
+) -> str:
+    """Async variant of generate_answer; does not block the event loop"""
+    messages = build_messages(question, context, conversation_history)
+    
+    with track_openai("chat"):
+        response = await chat_upstream.call(
+            lambda timeout: get_async_client().chat.completions.create(
+                model=settings.openai_model,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=1000,
+                timeout=_attempt_timeout(timeout)
+            )
+        )
+    record_usage(settings.openai_model, response.usage)
     
     return response.choices[0].message.content
+
+
+async def stream_answer_async(
+    question: str,
+    context: str,
+    conversation_history: List[dict] = None
+) -> AsyncIterator[str]:
+    """
+    Stream answer fragments as the chat completions API produces them
+    
+    Args:
+        question: User's question
+        context: Retrieved context from documents
+        conversation_history: Previous messages for context
+    
+    Yields:
+        Non-empty content deltas, in order
+    """
+    messages = build_messages(question, context, conversation_history)
+    
+    with track_openai("chat_stream"):
+        # Only opening the stream is retried: tokens already sent cannot be taken back
+        stream = await chat_upstream.call(
+            lambda timeout: get_async_client().chat.completions.create(
+                model=settings.openai_model,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=1000,
+                stream=True,
+                stream_options={"include_usage": True},  # Final chunk carries token usage
+                timeout=_attempt_timeout(timeout)
+            )
+        )
+        
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage is not None:
+                record_usage(settings.openai_model, chunk.usage)
+
+
+async def condense_question_async(question: str, conversation_history: List[dict]) -> str:
+    """
+    Rewrite a follow-up into a standalone query with one short completion
+    
+    Only the earlier questions (in their standalone form when known) are
+    sent, not the answers, which keeps the call to a few dozen tokens.
+    
+    Args:
+        question: Follow-up question
+        conversation_history: Earlier turns, oldest first
+    
+    Returns:
+        Standalone query (the question itself if the model returns nothing)
+    """
+    earlier = "\n".join(
+        f"- {turn.get('query') or turn.get('question', '')}"
+        for turn in conversation_history[-MAX_HISTORY_TURNS:]
+    )
+    messages = [
+        {"role": "system", "content": CONDENSE_PROMPT},
+        {"role": "user", "content": f"Earlier questions:\n{earlier}\n\nLatest question: {question}"}
+    ]
+    model = settings.query_rewrite_model or settings.openai_model
+    
+    with track_openai("condense"):
+        response = await chat_upstream.call(
+            lambda timeout: get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0,
+                max_tokens=100,
+                timeout=_attempt_timeout(timeout)
+            ),
+            deadline=settings.embedding_deadline  # A rewrite is not worth a long wait
+        )
+    record_usage(model, response.usage)
+    
+    return (response.choices[0].message.content or "").strip() or question
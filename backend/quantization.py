@@ -0,0 +1,107 @@
+"""
+Compact storage formats for embedding vectors
+float16 and int8 (per-vector scale) encodings, plus dimension truncation
+for Matryoshka-trained models such as text-embedding-3-*; queries are
+scored against the encoded rows block by block
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+DTYPES = ("float32", "float16", "int8")
+
+# Rows upcast per block while scoring, sized to keep temporaries ~8 MB
+_BLOCK_BYTES = 8 * 1024 * 1024
+
+
+class VectorCodec:
+    """
+    Encodes unit vectors for storage and scores queries against them
+    
+    float16 halves memory with no measurable ranking change. int8 stores
+    round(x / scale) with scale = max|x| / 127 per vector, a quarter of
+    float32; the cosine is scale * (codes . query). Truncation keeps the
+    first `dimensions` components and re-normalizes, which models trained
+    with Matryoshka loss (text-embedding-3-*) are designed for.
+    """
+    
+    def __init__(self, dtype: str = "float32", dimensions: Optional[int] = None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown vector dtype: {dtype} (expected one of {', '.join(DTYPES)})")
+        self.dtype = dtype
+        self.dimensions = dimensions
+    
+    @property
+    def storage_dtype(self) -> np.dtype:
+        return np.dtype(self.dtype)
+    
+    @property
+    def scaled(self) -> bool:
+        """Whether encoded rows carry a per-vector scale"""
+        return self.dtype == "int8"
+    
+    def bytes_per_vector(self, dimension: int) -> int:
+        """Storage for one vector of the given (stored) dimension"""
+        return dimension * self.storage_dtype.itemsize + (4 if self.scaled else 0)
+    
+    def prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """Truncate (if configured) and L2-normalize rows, as float32"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dimensions is not None:
+            if vectors.shape[-1] < self.dimensions:
+                raise ValueError(
+                    f"Cannot truncate {vectors.shape[-1]}-dim vectors to {self.dimensions}"
+                )
+            vectors = vectors[..., :self.dimensions]
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def encode(self, unit: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Encode prepared rows into (codes, scales); scales is None unless int8"""
+        if self.dtype == "float32":
+            return np.ascontiguousarray(unit, dtype=np.float32), None
+        if self.dtype == "float16":
+            return unit.astype(np.float16), None
+        
+        scales = np.abs(unit).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(unit / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    
+    def decode(self, codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate float32 rows back from their codes"""
+        vectors = codes.astype(np.float32)
+        if scales is not None:
+            vectors *= scales.reshape(-1, *([1] * (vectors.ndim - 1)))
+        return vectors
+    
+    def scores(self, codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of one prepared query against every row"""
+        return self.scores_batch(codes, scales, query[None, :])[0]
+    
+    def scores_batch(
+        self,
+        codes: np.ndarray,
+        scales: Optional[np.ndarray],
+        queries: np.ndarray
+    ) -> np.ndarray:
+        """
+        Cosine similarities, (queries x rows), of prepared queries
+        
+        float32 rows go straight to BLAS. Compressed rows are upcast one
+        block at a time, so the index itself is never decompressed.
+        """
+        queries_t = np.ascontiguousarray(queries.T, dtype=np.float32)
+        if codes.dtype == np.float32:
+            result = codes @ queries_t
+        else:
+            result = np.empty((len(codes), len(queries)), dtype=np.float32)
+            block = max(1, _BLOCK_BYTES // (4 * max(1, codes.shape[1])))
+            for start in range(0, len(codes), block):
+                result[start:start + block] = codes[start:start + block].astype(np.float32) @ queries_t
+        if scales is not None:
+            result *= scales[:, None]
+        return result.T
@@ -0,0 +1,172 @@
+"""
+Follow-up question rewriting
+Turns a follow-up such as "what about its pricing?" into a standalone
+query ("what about AcmeFlow's pricing?") before it is embedded and
+searched, either with a local heuristic or with one short LLM call
+"""
+
+from typing import List
+import logging
+import re
+
+from config import settings
+from openai_client import condense_question_async
+
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "heuristic", "llm")
+
+_WORDS = re.compile(r"[A-Za-z0-9][A-Za-z0-9'-]*")
+
+# Capitalized runs ("Acme Tech Solutions", "AcmeFlow") in an earlier question
+_NAMES = re.compile(r"\b[A-Z][A-Za-z0-9-]*(?:\s+[A-Z][A-Za-z0-9-]*)*")
+
+# Pronouns replaced by the subject; possessives become "<subject>'s"
+_PRONOUN = re.compile(r"\b(it|its|they|them|their)\b", re.IGNORECASE)
+_POSSESSIVES = {"its", "their"}
+
+# References that mark a follow-up but are not replaced ("tell me more about this")
+_REFERENCES = {"it", "its", "they", "them", "their", "this", "these", "those", "there"}
+
+_FOLLOW_UP_OPENERS = (
+    "what about", "how about", "and ", "also", "what else", "tell me more", "more on", "more about"
+)
+
+_STOPWORDS = {
+    "a", "about", "also", "an", "and", "any", "are", "at", "be", "by", "can", "compare",
+    "could", "define", "describe", "did", "do", "does", "else", "explain", "for", "from", "get",
+    "give", "has", "have", "how", "i", "in", "is", "it", "its", "list", "many", "me", "more",
+    "much", "my", "name", "of", "offer", "offers", "on", "or", "our", "please", "provide",
+    "provides", "should", "show", "summarize", "tell", "that", "the", "their", "them", "there",
+    "these", "they", "this", "those", "to", "us", "was", "we", "were", "what", "when", "where",
+    "which", "who", "why", "will", "with", "would", "you", "your",
+}
+
+# Content words kept as the subject when an earlier question names nothing
+MAX_SUBJECT_WORDS = 4
+
+
+def looks_like_follow_up(question: str) -> bool:
+    """
+    Whether a question probably depends on earlier turns
+    
+    True for questions with a pronoun or vague reference, questions opening
+    with "what about" / "and ..." and the like, and questions with at most
+    one content word ("pricing?", "why?").
+    """
+    words = [word.lower() for word in _WORDS.findall(question)]
+    if not words:
+        return False
+    if any(word in _REFERENCES for word in words):
+        return True
+    if " ".join(words).startswith(_FOLLOW_UP_OPENERS):
+        return True
+    return sum(1 for word in words if word not in _STOPWORDS) <= 1
+
+
+def subject_of(history: List[dict]) -> str:
+    """
+    What the conversation is about, from the most recent earlier question
+    
+    Names (capitalized runs other than question words) win; otherwise the
+    first few content words. Each turn's standalone query is used when
+    known, so the subject carries through several follow-ups.
+    """
+    for turn in reversed(history):
+        text = turn.get("query") or turn.get("question", "")
+        names = []
+        for match in _NAMES.finditer(text):
+            words = match.group(0).split()
+            while words and words[0].lower() in _STOPWORDS:
+                words.pop(0)
+            name = " ".join(words)
+            if name and name not in names:
+                names.append(name)
+        if names:
+            return " and ".join(names)
+        
+        content = [word for word in _WORDS.findall(text) if word.lower() not in _STOPWORDS]
+        if content:
+            return " ".join(content[:MAX_SUBJECT_WORDS])
+    return ""
+
+
+def heuristic_rewrite(question: str, history: List[dict]) -> str:
+    """
+    Standalone form of a follow-up, without any API call
+    
+    Pronouns are replaced with the conversation's subject; when there is
+    none to replace, the subject is appended in parentheses. Questions that
+    do not look like follow-ups, or already name the subject, are returned
+    unchanged.
+    """
+    if not history or not looks_like_follow_up(question):
+        return question
+    subject = subject_of(history)
+    if not subject or subject.lower() in question.lower():
+        return question
+    
+    def replace(match: re.Match) -> str:
+        return f"{subject}'s" if match.group(0).lower() in _POSSESSIVES else subject
+    
+    rewritten, count = _PRONOUN.subn(replace, question)
+    if count:
+        return rewritten
+    return f"{question.rstrip()} ({subject})"
+
+
+class QueryRewriter:
+    """
+    Rewrites follow-ups into standalone queries for retrieval
+    
+    The answer is still generated from the question as asked, with the
+    history in the prompt; only embedding and search use the rewrite.
+    In "llm" mode, questions that do not look like follow-ups skip the
+    call, and a failed call falls back to the heuristic.
+    """
+    
+    def __init__(self, mode: str = "heuristic"):
+        if mode not in MODES:
+            raise ValueError(f"QUERY_REWRITE must be one of {MODES}, got {mode!r}")
+        self.mode = mode
+        self.rewritten = 0
+        self.unchanged = 0
+    
+    async def rewrite(self, question: str, history: List[dict]) -> str:
+        """
+        Standalone query for a question asked after `history`
+        
+        Args:
+            question: Stripped, non-empty user question
+            history: Earlier turns, oldest first
+        
+        Returns:
+            The query to embed and search with
+        """
+        if self.mode == "off" or not history:
+            return question
+        
+        if self.mode == "llm" and looks_like_follow_up(question):
+            try:
+                query = await condense_question_async(question, history)
+            except Exception as e:
+                logger.warning("Query condensing failed (%s); using the heuristic", e)
+                query = heuristic_rewrite(question, history)
+        else:
+            query = heuristic_rewrite(question, history)
+        
+        if query != question:
+            self.rewritten += 1
+            logger.debug("Rewrote follow-up %r as %r", question, query)
+        else:
+            self.unchanged += 1
+        return query
+    
+    def stats(self) -> dict:
+        """Counters for monitoring"""
+        return {"mode": self.mode, "rewritten": self.rewritten, "unchanged": self.unchanged}
+
+
+# Global query rewriter
+query_rewriter = QueryRewriter(settings.query_rewrite)
@@ -0,0 +1,242 @@
+"""
+CPU re-ranking between retrieval and generation
+Retrieval over-fetches candidates; they are re-scored against the
+question and only the best, least redundant few are sent to the LLM
+"""
+
+from typing import Dict, List, Optional
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+
+from bm25_index import tokenize
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """
+    Re-scores retrieved chunks and keeps the top few by MMR
+    
+    Relevance blends the retrieval similarity with a question/chunk signal:
+    IDF-weighted coverage of the question's terms by default, or a local
+    cross-encoder when RERANK_MODEL is set and sentence-transformers is
+    installed. Maximal marginal relevance then picks chunks one at a time,
+    penalizing overlap with chunks already picked, so near-duplicates don't
+    take up the prompt.
+    """
+    
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        weight: float = 0.5,
+        diversity: float = 0.3,
+        min_score: float = 0.0
+    ):
+        self.model_name = model_name
+        self.weight = weight
+        self.diversity = diversity
+        self.min_score = min_score
+        self._model = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.candidates = 0
+        self.kept = 0
+        self.seconds = 0.0
+    
+    @property
+    def model(self):
+        """The cross-encoder, or None to score lexically (loaded on first use)"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._model = self._load_model()
+                    self._loaded = True
+        return self._model
+    
+    def _load_model(self):
+        if not self.model_name:
+            return None
+        try:
+            from sentence_transformers import CrossEncoder
+            return CrossEncoder(self.model_name, device="cpu")
+        except Exception as e:
+            logger.warning("Re-ranking model unavailable (%s), using lexical scoring", type(e).__name__)
+            return None
+    
+    @property
+    def name(self) -> str:
+        return self.model_name if self.model is not None else "lexical"
+    
+    def rerank_batch(
+        self,
+        questions: List[str],
+        candidate_lists: List[List[Dict]],
+        top_k: int
+    ) -> List[List[Dict]]:
+        """
+        Re-rank the candidates of several questions
+        
+        Chunks shared between questions are tokenized once, and the
+        cross-encoder (if any) scores every pair in a single call.
+        
+        Args:
+            questions: Question texts
+            candidate_lists: Retrieved chunks per question, best first
+            top_k: Chunks to keep per question
+        
+        Returns:
+            Kept chunks per question, best first, each with `rerank_score`
+        """
+        start = time.perf_counter()
+        
+        terms: Dict[str, List[str]] = {}
+        for candidates in candidate_lists:
+            for chunk in candidates:
+                if chunk['id'] not in terms:
+                    terms[chunk['id']] = tokenize(chunk['content'])
+        
+        model_scores = self._model_scores(questions, candidate_lists)
+        results = []
+        for i, (question, candidates) in enumerate(zip(questions, candidate_lists)):
+            if not candidates:
+                results.append([])
+                continue
+            matrix, coverage = self._term_matrix(question, [terms[c['id']] for c in candidates])
+            signal = model_scores[i] if model_scores is not None else coverage
+            similarity = np.clip([chunk['score'] for chunk in candidates], 0.0, 1.0)
+            relevance = (1 - self.weight) * similarity + self.weight * signal
+            results.append(self._select(candidates, relevance, matrix, top_k))
+        
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.calls += len(questions)
+            self.candidates += sum(len(candidates) for candidates in candidate_lists)
+            self.kept += sum(len(kept) for kept in results)
+            self.seconds += elapsed
+        logger.debug(
+            "Re-ranked %d -> %d chunks for %d question(s) in %.1fms (%s)",
+            sum(len(c) for c in candidate_lists), sum(len(k) for k in results),
+            len(questions), elapsed * 1000, self.name
+        )
+        return results
+    
+    def rerank(self, question: str, candidates: List[Dict], top_k: int) -> List[Dict]:
+        """Re-rank one question's candidates (see rerank_batch)"""
+        return self.rerank_batch([question], [candidates], top_k)[0]
+    
+    def _model_scores(
+        self,
+        questions: List[str],
+        candidate_lists: List[List[Dict]]
+    ) -> Optional[List[np.ndarray]]:
+        """Cross-encoder relevance in [0, 1] per candidate, or None without a model"""
+        model = self.model
+        if model is None:
+            return None
+        
+        pairs = [
+            (question, chunk['content'])
+            for question, candidates in zip(questions, candidate_lists)
+            for chunk in candidates
+        ]
+        if not pairs:
+            return [np.zeros(0) for _ in questions]
+        logits = np.asarray(model.predict(pairs, batch_size=64), dtype=np.float64)
+        probabilities = 1.0 / (1.0 + np.exp(-logits))
+        
+        scores = []
+        offset = 0
+        for candidates in candidate_lists:
+            scores.append(probabilities[offset:offset + len(candidates)])
+            offset += len(candidates)
+        return scores
+    
+    @staticmethod
+    def _term_matrix(question: str, chunk_terms: List[List[str]]):
+        """
+        Binary chunk x term matrix over the candidates' vocabulary, and the
+        IDF-weighted share of the question's terms each chunk contains
+        
+        IDF is taken over the candidates themselves: a term every candidate
+        shares says nothing about which of them is best.
+        """
+        vocabulary: Dict[str, int] = {}
+        rows = []
+        for chunk in chunk_terms:
+            rows.append([vocabulary.setdefault(term, len(vocabulary)) for term in set(chunk)])
+        
+        matrix = np.zeros((len(chunk_terms), len(vocabulary)), dtype=np.float32)
+        for row, columns in enumerate(rows):
+            matrix[row, columns] = 1.0
+        
+        query_terms = set(tokenize(question))
+        if not query_terms:
+            return matrix, np.zeros(len(chunk_terms))
+        
+        document_frequency = matrix.sum(axis=0)
+        total = len(chunk_terms)
+        weights = np.zeros(len(vocabulary), dtype=np.float32)
+        missing_weight = 0.0
+        for term in query_terms:
+            column = vocabulary.get(term)
+            if column is None:
+                missing_weight += math.log(1 + total)
+            else:
+                weights[column] = math.log(1 + total / document_frequency[column])
+        
+        coverage = matrix @ weights / (weights.sum() + missing_weight)
+        return matrix, coverage
+    
+    def _select(
+        self,
+        candidates: List[Dict],
+        relevance: np.ndarray,
+        matrix: np.ndarray,
+        top_k: int
+    ) -> List[Dict]:
+        """Greedy MMR over the candidates above min_score"""
+        sizes = np.sqrt(np.maximum(matrix.sum(axis=1), 1.0))
+        overlap = (matrix @ matrix.T) / np.outer(sizes, sizes)  # Cosine of term sets
+        
+        remaining = [i for i in range(len(candidates)) if relevance[i] >= self.min_score]
+        redundancy = np.zeros(len(candidates))
+        picked = []
+        while remaining and len(picked) < top_k:
+            best = max(
+                remaining,
+                key=lambda i: (1 - self.diversity) * relevance[i] - self.diversity * redundancy[i]
+            )
+            remaining.remove(best)
+            picked.append(best)
+            redundancy = np.maximum(redundancy, overlap[best])
+        
+        return [
+            {**candidates[i], 'rerank_score': float(relevance[i])}
+            for i in picked
+        ]
+    
+    def stats(self) -> Dict:
+        """Counters for monitoring"""
+        return {
+            "scorer": self.name if self._loaded else (self.model_name or "lexical"),
+            "questions": self.calls,
+            "candidates": self.candidates,
+            "kept": self.kept,
+            "mean_ms": round(self.seconds / self.calls * 1000, 3) if self.calls else 0.0
+        }
+
+
+# Global re-ranker instance (None when re-ranking is disabled)
+reranker = Reranker(
+    model_name=settings.rerank_model,
+    weight=settings.rerank_weight,
+    diversity=settings.rerank_diversity,
+    min_score=settings.rerank_min_score
+) if settings.rerank_enabled else None
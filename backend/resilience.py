@@ -0,0 +1,410 @@
+"""
+Resilience layer for OpenAI and Pinecone calls
+Per-call deadlines, jittered exponential backoff that honors rate-limit
+headers, a concurrency limit per upstream, and a circuit breaker that
+fails fast while an upstream is degraded
+"""
+
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+import weakref
+
+from config import settings
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: timeouts, rate limits, server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# HTTP statuses that blame the request's content (a bad or oversized input)
+INPUT_ERROR_STATUS = {400, 413, 422}
+
+# Transport errors of the SDKs' HTTP stacks (matched by name so none of them
+# has to be imported here): openai's connection/timeout errors, httpx's and
+# urllib3's (used by the Pinecone client)
+RETRYABLE_ERRORS = {"openai.APIConnectionError", "httpx.TransportError", "urllib3.HTTPError"}
+
+# OpenAI's reset headers look like "1s", "6m0s" or "20ms"
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call failed fast or ran out of retries; try again after retry_after seconds"""
+    
+    def __init__(self, upstream: str, reason: str, retry_after: float = 1.0):
+        super().__init__(f"{upstream} is unavailable ({reason}); retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient: a timeout, a dropped connection, 429 or 5xx"""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(
+        f"{cls.__module__.split('.')[0]}.{cls.__name__}" in RETRYABLE_ERRORS
+        for cls in type(error).__mro__
+    )
+
+
+def is_input_error(error: BaseException) -> bool:
+    """Whether an error rejects the request's input, so other inputs may still succeed"""
+    return _status_code(error) in INPUT_ERROR_STATUS
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds the upstream asked us to wait, from the error's response headers
+    
+    Reads Retry-After (seconds or an HTTP date), OpenAI's retry-after-ms,
+    and its x-ratelimit-reset-requests/-tokens durations (the longest wins).
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    
+    waits = []
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            waits.append(float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            waits.append(float(value))
+        except ValueError:
+            try:
+                waits.append(parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = headers.get(name)
+        if value:
+            waits.append(sum(
+                float(amount) * _UNIT_SECONDS[unit] for amount, unit in _DURATION.findall(value)
+            ))
+    waits = [wait for wait in waits if wait > 0]
+    return max(waits) if waits else None
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    # openai: status_code; Pinecone (OpenAPI client): status
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return status if isinstance(status, int) else None
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+    
+    Closed: calls pass. After `failure_threshold` transient failures in a
+    row it opens, and calls fail immediately for `reset_seconds`. Then it
+    is half-open: one probe call is let through; success closes it,
+    failure opens it again. A probe that ends with neither (cancelled,
+    rejected before its first attempt, or refused with a non-retryable
+    error) must call release_probe().
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            elapsed = time.monotonic() - self._opened_at
+            if self._state == self.OPEN and elapsed >= self.reset_seconds:
+                return self.HALF_OPEN
+            return self._state
+    
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed"""
+        with self._lock:
+            return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+    
+    def allow(self) -> bool:
+        """Whether a call may go ahead now (claims the probe when half-open)"""
+        return self.admit() is not None
+    
+    def admit(self) -> Optional[str]:
+        """
+        Admit a call if the breaker lets it through
+        
+        Returns:
+            CLOSED for a normal call, HALF_OPEN if the call holds the probe,
+            or None if it must fail fast
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return self.CLOSED
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return None
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return None
+            self._probing = True
+            return self.HALF_OPEN
+    
+    def release_probe(self):
+        """Give up the probe without a result, so the next call can probe"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+    
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit for %s closed", self.name)
+                metrics.set_circuit_open(self.name, False)
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        "Circuit for %s opened after %d failures", self.name, self._failures
+                    )
+                    metrics.set_circuit_open(self.name, True)
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class Upstream:
+    """
+    Calls to one upstream API, with a deadline, retries, a limiter and a breaker
+    
+    Each call gets `deadline` seconds in total: waiting for a concurrency
+    slot, every attempt and the backoff sleeps in between. Transient errors
+    are retried up to `max_retries` times with full-jitter exponential
+    backoff, never sooner than the upstream's rate-limit headers ask.
+    Anything else (bad request, auth) is raised at once and does not count
+    against the breaker.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        deadline: float,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 8.0,
+        max_concurrency: int = 64,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker or CircuitBreaker(name)
+        # One limiter for threads, one per event loop for coroutines
+        self._threads = threading.BoundedSemaphore(max_concurrency)
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.calls = 0
+        self.retries = 0
+        self.rejected = 0
+    
+    async def call(
+        self,
+        operation: Callable[[float], Awaitable[T]],
+        deadline: Optional[float] = None
+    ) -> T:
+        """
+        Run an async upstream call under this upstream's policy
+        
+        Args:
+            operation: Makes one attempt; receives the seconds it may take
+            deadline: Overrides the upstream's deadline for this call
+        
+        Returns:
+            The operation's result
+        
+        Raises:
+            UpstreamUnavailable: circuit open, no slot or no time left, or
+                retries exhausted
+        """
+        end = time.monotonic() + (deadline or self.deadline)
+        probe = self._admit()
+        try:
+            slots = self._slots()
+            try:
+                await asyncio.wait_for(slots.acquire(), self._remaining(end))
+            except asyncio.TimeoutError:
+                self._reject("no free slot before the deadline")
+            try:
+                attempt = 0
+                while True:
+                    timeout = self._remaining(end)
+                    try:
+                        result = await asyncio.wait_for(operation(timeout), timeout)
+                    except Exception as e:
+                        delay = self._after_failure(e, attempt, end, probe)
+                        await asyncio.sleep(delay)
+                        attempt += 1
+                        continue
+                    self.breaker.record_success()
+                    return result
+            finally:
+                slots.release()
+        finally:
+            if probe:
+                # No-op once the probe recorded a success or failure
+                self.breaker.release_probe()
+    
+    def call_sync(self, operation: Callable[[float], T], deadline: Optional[float] = None) -> T:
+        """Blocking variant of call, for threads and scripts (same arguments)"""
+        end = time.monotonic() + (deadline or self.deadline)
+        probe = self._admit()
+        try:
+            if not self._threads.acquire(timeout=self._remaining(end)):
+                self._reject("no free slot before the deadline")
+            try:
+                attempt = 0
+                while True:
+                    timeout = self._remaining(end)
+                    try:
+                        result = operation(timeout)
+                    except Exception as e:
+                        time.sleep(self._after_failure(e, attempt, end, probe))
+                        attempt += 1
+                        continue
+                    self.breaker.record_success()
+                    return result
+            finally:
+                self._threads.release()
+        finally:
+            if probe:
+                self.breaker.release_probe()
+    
+    def stats(self) -> Dict:
+        """Counters and breaker state for monitoring"""
+        return {
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "circuit_opened": self.breaker.opened
+        }
+    
+    def _admit(self) -> bool:
+        """Count the call and fail fast if the breaker is open; True if it holds the probe"""
+        self.calls += 1
+        admitted = self.breaker.admit()
+        if admitted is None:
+            self._reject("circuit open", max(1.0, self.breaker.retry_after()))
+        return admitted == CircuitBreaker.HALF_OPEN
+    
+    def _after_failure(self, error: Exception, attempt: int, end: float, probe: bool) -> float:
+        """Backoff before the next attempt, or re-raise / give up"""
+        if not is_retryable(error):
+            # The upstream answered (bad request, auth...): it is healthy. Only
+            # a successful probe closes an open breaker, so a failed one is
+            # just released by the caller.
+            if not probe:
+                self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        
+        wait = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        requested = retry_after(error)
+        if requested is not None:
+            wait = max(wait, requested)
+        
+        last = type(error).__name__
+        if attempt >= self.max_retries:
+            self._reject(f"{attempt + 1} attempts failed, last: {last}", requested or 1.0, error)
+        if self.breaker.state == CircuitBreaker.OPEN:
+            self._reject("circuit open", max(1.0, self.breaker.retry_after()), error)
+        if time.monotonic() + wait >= end:
+            self._reject(f"deadline exceeded, last: {last}", max(1.0, wait), error)
+        
+        self.retries += 1
+        metrics.record_retry(self.name)
+        logger.info(
+            "%s call failed (%s); retry %d in %.2fs", self.name, error, attempt + 1, wait
+        )
+        return wait
+    
+    def _reject(self, reason: str, wait: float = 1.0, cause: Optional[Exception] = None):
+        self.rejected += 1
+        metrics.record_rejection(self.name)
+        raise UpstreamUnavailable(self.name, reason, wait) from cause
+    
+    def _remaining(self, end: float) -> float:
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            self._reject("deadline exceeded")
+        return remaining
+    
+    def _slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slots = self._loops.get(loop)
+        if slots is None:
+            slots = self._loops[loop] = asyncio.Semaphore(self.max_concurrency)
+        return slots
+
+
+def _upstream(name: str, deadline: float, max_concurrency: int) -> Upstream:
+    return Upstream(
+        name,
+        deadline=deadline,
+        max_retries=settings.upstream_max_retries,
+        backoff_base=settings.upstream_backoff_base,
+        backoff_max=settings.upstream_backoff_max,
+        max_concurrency=max_concurrency,
+        breaker=CircuitBreaker(
+            name,
+            failure_threshold=settings.upstream_breaker_failures,
+            reset_seconds=settings.upstream_breaker_reset
+        )
+    )
+
+
+# Global upstreams: embeddings and completions are rate-limited separately
+embeddings_upstream = _upstream(
+    "openai_embeddings", settings.embedding_deadline, settings.openai_max_concurrency
+)
+chat_upstream = _upstream("openai_chat", settings.chat_deadline, settings.openai_max_concurrency)
+pinecone_upstream = _upstream("pinecone", settings.pinecone_deadline, settings.pinecone_pool_threads)
+
+UPSTREAMS = (embeddings_upstream, chat_upstream, pinecone_upstream)
@@ -0,0 +1,229 @@
+"""
+Hybrid retrieval: vector search fused with BM25 lexical search
+Reciprocal rank fusion lets exact-term matches (product names, policy
+codes) reach the prompt even when their embeddings rank them low;
+the optional re-ranking stage then trims the candidates
+"""
+
+from typing import Dict, List, Optional, Tuple
+import asyncio
+
+import numpy as np
+
+from bm25_index import lexical_index
+from config import settings
+from documents import document_manager
+from metrics import span
+from reranker import reranker
+from vector_store import vector_store
+
+# Most extra vector results a search asks for to make up for hidden ones
+_MAX_OVERFETCH = 1000
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """
+    Combine ranked id lists: each list contributes 1 / (k + rank)
+    
+    Args:
+        rankings: Id lists, best first
+        k: Damping constant; larger values flatten the head of each list
+    
+    Returns:
+        Fused score per id
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, vector_id in enumerate(ranking, start=1):
+            fused[vector_id] = fused.get(vector_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def _cosine(query: np.ndarray, values: List[float]) -> float:
+    vector = np.asarray(values, dtype=np.float32)
+    if len(vector) < len(query):
+        # Stored truncated (LOCAL_VECTOR_DIMENSIONS): compare on the kept prefix
+        query = query[:len(vector)]
+        query = query / (np.linalg.norm(query) or 1.0)
+    norm = np.linalg.norm(vector)
+    return float(vector @ query / norm) if norm else 0.0
+
+
+def fuse_results(
+    query_embedding: List[float],
+    vector_hits: List[Dict],
+    lexical_hits: List[Tuple[str, float]],
+    fetched: Dict[str, Dict],
+    top_k: int
+) -> List[Dict]:
+    """
+    Merge one question's vector and lexical results into a single ranking
+    
+    Chunks found only lexically are taken from `fetched` and given their
+    cosine similarity to the question, so every result carries a
+    comparable `score`. Results also carry `fused_score` and, when matched
+    lexically, `lexical_score`.
+    
+    Args:
+        query_embedding: Embedding of the question
+        vector_hits: Vector store results, best first
+        lexical_hits: BM25 (vector id, score) pairs, best first
+        fetched: Stored chunks (with 'values') for lexical-only ids
+        top_k: Number of results to keep
+    
+    Returns:
+        Chunks ordered by fused score, best first
+    """
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    if query_norm:
+        query = query / query_norm
+    
+    chunks = {chunk['id']: dict(chunk) for chunk in vector_hits}
+    for vector_id, lexical_score in lexical_hits:
+        if vector_id not in chunks:
+            stored = fetched.get(vector_id)
+            if stored is None:
+                continue  # Indexed lexically but no longer in the vector store
+            chunk = {key: value for key, value in stored.items() if key != 'values'}
+            chunk['score'] = _cosine(query, stored['values'])
+            chunks[vector_id] = chunk
+        chunks[vector_id]['lexical_score'] = lexical_score
+    
+    fused = reciprocal_rank_fusion(
+        [
+            [chunk['id'] for chunk in vector_hits],
+            [vector_id for vector_id, _ in lexical_hits if vector_id in chunks]
+        ],
+        k=settings.rrf_k
+    )
+    ranked = sorted(chunks.values(), key=lambda chunk: fused[chunk['id']], reverse=True)[:top_k]
+    for chunk in ranked:
+        chunk['fused_score'] = fused[chunk['id']]
+    return ranked
+
+
+async def search_chunks_batch(
+    questions: List[str],
+    query_embeddings: List[List[float]],
+    top_k: Optional[int] = None
+) -> List[List[Dict]]:
+    """
+    Retrieve chunks for several questions, best first
+    
+    With re-ranking enabled, RERANK_CANDIDATES chunks are retrieved per
+    question and re-ranked down to `top_k` off the event loop.
+    
+    Args:
+        questions: Question texts (for the lexical search and re-ranking)
+        query_embeddings: Their embeddings, in the same order
+        top_k: Results per question (defaults to RERANK_TOP_K when
+            re-ranking, RETRIEVAL_TOP_K otherwise)
+    
+    Returns:
+        One result list per question
+    """
+    if reranker is None:
+        with span("search"):
+            return await _retrieve(questions, query_embeddings, top_k or settings.retrieval_top_k)
+    
+    top_k = top_k or settings.rerank_top_k
+    with span("search"):
+        candidates = await _retrieve(
+            questions, query_embeddings, max(top_k, settings.rerank_candidates)
+        )
+    with span("rerank"):
+        return await asyncio.to_thread(reranker.rerank_batch, questions, candidates, top_k)
+
+
+async def _visible(
+    vector_results: List[List[Dict]],
+    lexical_results: List[List[Tuple[str, float]]]
+) -> Tuple[List[List[Dict]], List[List[Tuple[str, float]]]]:
+    """
+    Drop chunks of document versions that are being written or retired
+    
+    A document uploaded through the API only becomes visible once all of
+    its new chunks are stored, and its old chunks disappear at that same
+    moment, even though the store holds both for a while. The staged ids
+    are looked up in the shared manifest on a thread, since another worker
+    may have staged a version since the last query.
+    """
+    if document_manager is None:
+        return vector_results, lexical_results
+    ids = {chunk['id'] for hits in vector_results for chunk in hits}
+    ids.update(vector_id for hits in lexical_results for vector_id, _ in hits)
+    hidden = await asyncio.to_thread(document_manager.hidden, list(ids))
+    if not hidden:
+        return vector_results, lexical_results
+    return (
+        [[chunk for chunk in hits if chunk['id'] not in hidden] for hits in vector_results],
+        [[hit for hit in hits if hit[0] not in hidden] for hits in lexical_results]
+    )
+
+
+async def _overfetch(top_k: int) -> int:
+    """
+    Results to ask the vector store for so that top_k survive _visible
+    
+    While a document version is being written or retired, its hidden
+    vectors can fill the store's top results; asking for that many more
+    keeps a query from coming back short.
+    """
+    if document_manager is None:
+        return top_k
+    hidden = await asyncio.to_thread(document_manager.hidden_count)
+    return top_k + min(hidden, _MAX_OVERFETCH)
+
+
+async def _retrieve(
+    questions: List[str],
+    query_embeddings: List[List[float]],
+    top_k: int
+) -> List[List[Dict]]:
+    """
+    Candidates per question before re-ranking, best first
+    
+    Without a (non-empty) lexical index this is plain vector search. With
+    one, both searches take HYBRID_CANDIDATES results, lexical-only chunks
+    are fetched from the vector store in a single call, and the rankings
+    are fused.
+    """
+    if lexical_index is None or not len(lexical_index):
+        vector_results = await vector_store.search_batch_async(
+            query_embeddings, top_k=await _overfetch(top_k)
+        )
+        return [hits[:top_k] for hits in (await _visible(vector_results, []))[0]]
+    
+    candidates = max(top_k, settings.hybrid_candidates)
+    vector_results, lexical_results = await _visible(
+        await vector_store.search_batch_async(
+            query_embeddings, top_k=await _overfetch(candidates)
+        ),
+        [lexical_index.search(question, candidates) for question in questions]
+    )
+    vector_results = [hits[:candidates] for hits in vector_results]
+    
+    missing = []
+    for vector_hits, lexical_hits in zip(vector_results, lexical_results):
+        found = {chunk['id'] for chunk in vector_hits}
+        missing.extend(vector_id for vector_id, _ in lexical_hits if vector_id not in found)
+    missing = list(dict.fromkeys(missing))
+    fetched = {
+        chunk['id']: chunk for chunk in await vector_store.fetch_async(missing)
+    } if missing else {}
+    
+    return [
+        fuse_results(embedding, vector_hits, lexical_hits, fetched, top_k)
+        for embedding, vector_hits, lexical_hits
+        in zip(query_embeddings, vector_results, lexical_results)
+    ]
+
+
+async def search_chunks(
+    question: str,
+    query_embedding: List[float],
+    top_k: Optional[int] = None
+) -> List[Dict]:
+    """Retrieve chunks for one question (see search_chunks_batch)"""
+    return (await search_chunks_batch([question], [query_embedding], top_k))[0]
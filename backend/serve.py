@@ -0,0 +1,82 @@
+"""
+Production server for the RAG API
+Runs several uvicorn worker processes (one per CPU core by default) that
+share their embedding and answer caches and conversations through SQLite files
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import uvicorn
+
+from config import settings
+
+
+# Cache files used when EMBEDDING_CACHE_PATH / ANSWER_CACHE_PATH are not set,
+# so a question answered by one worker is a cache hit on every other
+DEFAULT_EMBEDDING_CACHE_PATH = "data/cache/embeddings.sqlite"
+DEFAULT_ANSWER_CACHE_PATH = "data/cache/answers.sqlite"
+
+# Used when CONVERSATION_STORE_PATH is not set: a follow-up may reach any worker
+DEFAULT_CONVERSATION_STORE_PATH = "data/cache/conversations.sqlite"
+
+
+def worker_count(requested: int) -> int:
+    """Worker processes to run: `requested`, or one per CPU core when it is 0"""
+    return requested if requested > 0 else (os.cpu_count() or 1)
+
+
+def prepare_shared_state(workers: int):
+    """
+    Point every worker at the same caches, conversations and metrics directory
+
+    Workers are separate interpreters that read their settings from the
+    environment, so this has to run before they are started.
+    """
+    if settings.embedding_cache_size > 0 and not settings.embedding_cache_path:
+        os.environ["EMBEDDING_CACHE_PATH"] = DEFAULT_EMBEDDING_CACHE_PATH
+    if settings.answer_cache_size > 0 and not settings.answer_cache_path:
+        os.environ["ANSWER_CACHE_PATH"] = DEFAULT_ANSWER_CACHE_PATH
+    if settings.conversation_max > 0 and not settings.conversation_store_path:
+        os.environ["CONVERSATION_STORE_PATH"] = DEFAULT_CONVERSATION_STORE_PATH
+    # Lets each worker know it has siblings (the document API checks this)
+    os.environ["API_WORKERS"] = str(workers)
+
+    if settings.metrics_enabled and workers > 1:
+        directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="rag_metrics_")
+        # Files left by a previous run would be added to this run's totals
+        shutil.rmtree(directory, ignore_errors=True)
+        Path(directory).mkdir(parents=True)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+
+
+def serve(host: str, port: int, workers: int):
+    """Run the API with `workers` processes until interrupted"""
+    prepare_shared_state(workers)
+    print(f"🚀 Serving on {host}:{port} with {workers} worker(s)")
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        access_log=False,
+        log_level=settings.log_level.lower()
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.api_workers,
+        help="Worker processes (default: API_WORKERS; 0 = one per CPU core)"
+    )
+    parser.add_argument("--host", default=settings.api_host)
+    parser.add_argument("--port", type=int, default=settings.api_port)
+    args = parser.parse_args()
+
+    serve(args.host, args.port, worker_count(args.workers))
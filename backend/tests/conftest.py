@@ -0,0 +1,11 @@
+"""
+Shared test setup: run from backend/ (python -m pytest tests) without a .env
+"""
+
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("PINECONE_API_KEY", "test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
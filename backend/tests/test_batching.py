@@ -0,0 +1,63 @@
+"""
+Micro-batching of concurrent calls
+"""
+
+import asyncio
+
+from batching import MicroBatcher
+
+
+class Rejected(Exception):
+    pass
+
+
+def test_concurrent_submissions_share_a_batch():
+    calls = []
+    
+    async def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+    
+    async def scenario():
+        batcher = MicroBatcher(double, max_batch=8)
+        return await asyncio.gather(*(batcher.submit([i, i + 10]) for i in range(3)))
+    
+    assert asyncio.run(scenario()) == [[0, 20], [2, 22], [4, 24]]
+    assert calls == [[0, 10, 1, 11, 2, 12]]
+
+
+def test_rejected_input_fails_only_its_own_submission():
+    calls = []
+    
+    async def embed(items):
+        calls.append(list(items))
+        if "bad" in items:
+            raise Rejected("bad input")
+        return [len(item) for item in items]
+    
+    async def scenario():
+        batcher = MicroBatcher(embed, max_batch=8, isolate=lambda e: isinstance(e, Rejected))
+        results = await asyncio.gather(
+            batcher.submit(["a"]), batcher.submit(["bad"]), batcher.submit(["ccc", "dd"]),
+            return_exceptions=True
+        )
+        return batcher, results
+    
+    batcher, results = asyncio.run(scenario())
+    assert results[0] == [1] and results[2] == [3, 2]
+    assert isinstance(results[1], Rejected)
+    assert calls[0] == ["a", "bad", "ccc", "dd"] and len(calls) == 4
+    assert batcher.stats()["splits"] == 1
+
+
+def test_other_failures_fail_the_whole_batch():
+    async def down(items):
+        raise ConnectionError("down")
+    
+    async def scenario():
+        batcher = MicroBatcher(down, max_batch=8, isolate=lambda e: isinstance(e, Rejected))
+        return await asyncio.gather(
+            batcher.submit([1]), batcher.submit([2]), return_exceptions=True
+        )
+    
+    assert all(isinstance(result, ConnectionError) for result in asyncio.run(scenario()))
@@ -0,0 +1,87 @@
+"""
+BM25 inverted index
+"""
+
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from bm25_index import BM25Index, tokenize
+
+VOCABULARY = [f"term{i}" for i in range(40)] + ["the", "and", "of"]
+
+
+def brute_force(documents: dict, query: str, k1: float = 1.2, b: float = 0.75) -> dict:
+    """Okapi BM25 of every document, computed directly from the texts"""
+    counts = {vector_id: Counter(tokenize(text)) for vector_id, text in documents.items()}
+    average_length = sum(sum(c.values()) for c in counts.values()) / len(counts)
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(1 for c in counts.values() if term in c)
+        if not df:
+            continue
+        idf = math.log(1 + (len(counts) - df + 0.5) / (df + 0.5))
+        for vector_id, c in counts.items():
+            if term in c:
+                length = sum(c.values())
+                norm = k1 * (1 - b + b * length / average_length)
+                scores[vector_id] = (
+                    scores.get(vector_id, 0.0) + idf * c[term] * (k1 + 1) / (c[term] + norm)
+                )
+    return scores
+
+
+def random_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 30)))
+
+
+def assert_matches(index: BM25Index, documents: dict, rng: random.Random):
+    for _ in range(20):
+        query = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 4)))
+        expected = brute_force(documents, query)
+        results = index.search(query, top_k=len(documents))
+        assert {vector_id for vector_id, _ in results} == set(expected)
+        for vector_id, score in results:
+            assert score == pytest.approx(expected[vector_id], rel=1e-4)
+        assert [score for _, score in results] == sorted(
+            (score for _, score in results), reverse=True
+        )
+
+
+def test_repeated_id_in_one_call_keeps_last_text():
+    index = BM25Index()
+    index.add([("a", "alpha beta"), ("b", "alpha"), ("a", "gamma delta")])
+    assert len(index) == 2
+    assert index.search("beta") == []
+    assert [vector_id for vector_id, _ in index.search("gamma")] == ["a"]
+    
+    index.remove(["a", "a", "missing"])
+    assert len(index) == 1
+    assert [vector_id for vector_id, _ in index.search("alpha")] == ["b"]
+
+
+def test_scores_match_brute_force_through_updates_and_reload(tmp_path):
+    rng = random.Random(0)
+    index = BM25Index(str(tmp_path / "bm25"))
+    documents = {f"doc_{i}": random_text(rng) for i in range(200)}
+    index.add(documents.items())
+    assert_matches(index, documents, rng)
+    
+    # Replace some texts and tombstone half the documents
+    for i in range(0, 200, 3):
+        documents[f"doc_{i}"] = random_text(rng)
+    index.add((f"doc_{i}", documents[f"doc_{i}"]) for i in range(0, 200, 3))
+    removed = [f"doc_{i}" for i in range(1, 200, 2)]
+    index.remove(removed)
+    for vector_id in removed:
+        del documents[vector_id]
+    assert len(index) == len(documents)
+    assert_matches(index, documents, rng)
+    
+    # Saving compacts the tombstones away
+    index.save()
+    assert not index._deleted
+    assert_matches(index, documents, rng)
+    assert_matches(BM25Index(str(tmp_path / "bm25")), documents, rng)
@@ -0,0 +1,38 @@
+"""
+Streaming chunkers
+"""
+
+from chunking import chunk_text_by_paragraphs, iter_paragraph_chunks
+
+
+def paragraphs(*word_counts: int) -> bytes:
+    return "\n\n".join(
+        " ".join(f"p{i}w{j}" for j in range(count)) for i, count in enumerate(word_counts)
+    ).encode()
+
+
+def test_paragraph_chunks_match_in_memory_chunker_without_overlap():
+    data = paragraphs(5, 8, 3, 12, 1, 7)
+    streamed = list(iter_paragraph_chunks(data, max_words=15))
+    expected = chunk_text_by_paragraphs(data.decode(), max_words=15)
+    assert [(c['content'], c['word_count']) for c in streamed] == [
+        (c['content'], c['word_count']) for c in expected
+    ]
+
+
+def test_overlap_counts_against_max_words():
+    chunks = list(iter_paragraph_chunks(paragraphs(6, 6, 6, 6, 6, 6), 13, 2))
+    assert all(chunk['word_count'] <= 13 for chunk in chunks)
+    # The carried paragraph is repeated where it fits
+    assert chunks[1]['content'].startswith(chunks[0]['content'].split("\n\n")[-1])
+
+
+def test_overlap_is_dropped_when_the_next_paragraph_fills_the_chunk():
+    chunks = list(iter_paragraph_chunks(paragraphs(4, 4, 10), 10, 1))
+    assert [chunk['word_count'] for chunk in chunks] == [8, 10]
+
+
+def test_no_trailing_chunk_of_only_overlap():
+    chunks = list(iter_paragraph_chunks(paragraphs(5, 5, 5), 10, 1))
+    assert chunks[-1]['content'].endswith("p2w4")
+    assert len(chunks) == 2
@@ -0,0 +1,53 @@
+"""
+Prompt packing under the token budget
+"""
+
+from context_builder import MESSAGE_OVERHEAD_TOKENS, dedupe_chunks, pack_context
+from openai_client import build_messages
+from tokenizer import tokenizer
+
+
+def chunk(name: str, sentences: int, word: str) -> dict:
+    content = " ".join(f"The {word} fact number {i} is noted." for i in range(sentences))
+    return {'id': name, 'document_name': f"{name}.txt", 'content': content}
+
+
+def prompt_tokens(question: str, packed) -> int:
+    messages = build_messages(question, packed.context, packed.history)
+    return sum(tokenizer.count(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def test_packed_prompt_stays_within_budget():
+    question = "What facts are noted?"
+    chunks = [chunk(f"c{i}", 30, f"w{i}") for i in range(10)]
+    history = [{"question": f"Earlier question {i}?", "answer": "An answer. " * 40} for i in range(4)]
+    
+    for budget in (600, 900, 1500):
+        packed = pack_context(question, chunks, history, budget=budget, history_budget=200)
+        report = packed.report
+        assert report["total"] == report["fixed"] + report["history"] + report["context"]
+        assert report["total"] <= budget
+        assert report["history"] <= 200
+        assert report["chunks_used"] + report["chunks_dropped"] == len(chunks)
+        assert prompt_tokens(question, packed) <= budget
+        # Chunks are used best first
+        assert [c['id'] for c in packed.chunks] == [f"c{i}" for i in range(len(packed.chunks))]
+
+
+def test_history_keeps_newest_turns():
+    history = [{"question": f"Question {i}?", "answer": "Answer. " * 20} for i in range(4)]
+    packed = pack_context("Next?", [], history, budget=2000, history_budget=70)
+    assert packed.history and packed.history[-1]["question"] == "Question 3?"
+    assert packed.report["history"] <= 70
+
+
+def test_dedupe_drops_sentences_seen_in_better_chunks():
+    first = {'id': "a", 'content': "Alpha is first. Beta is second.", 'token_count': 8}
+    overlap = {'id': "b", 'content': "Beta is second.  Gamma is third.", 'token_count': 8}
+    repeat = {'id': "c", 'content': "alpha IS first.", 'token_count': 4}
+    
+    unique = dedupe_chunks([first, overlap, repeat])
+    assert [c['id'] for c in unique] == ["a", "b"]
+    assert unique[0] is first
+    assert unique[1]['content'] == "Gamma is third."
+    assert unique[1]['token_count'] is None
@@ -0,0 +1,42 @@
+"""
+Server-side conversations and the rewrite memo
+"""
+
+import pytest
+
+from conversations import ConversationStore, Turn
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    path = str(tmp_path / "conversations.sqlite") if request.param == "sqlite" else None
+    return ConversationStore(max_turns=3, path=path)
+
+
+def test_rewrite_is_memoized_until_the_conversation_moves_on(store):
+    store.append(Turn("c", "Who makes AcmeFlow?", "Who makes AcmeFlow?", []), "Acme")
+    history = store.history("c")
+    
+    assert store.cached_rewrite("c", len(history), "Its price?") is None
+    store.store_rewrite("c", len(history), "Its price?", "AcmeFlow price?")
+    assert store.cached_rewrite("c", len(history), "Its price?") == "AcmeFlow price?"
+    # Keyed on the question and the turn position, and per conversation
+    assert store.cached_rewrite("c", len(history), "Its size?") is None
+    assert store.cached_rewrite("other", len(history), "Its price?") is None
+    
+    store.append(Turn("c", "Its price?", "AcmeFlow price?", history), "$10")
+    assert store.cached_rewrite("c", len(history), "Its price?") is None
+    stats = store.stats()
+    assert (stats["rewrite_hits"], stats["rewrite_misses"]) == (1, 4)
+
+
+def test_history_keeps_the_last_turns(store):
+    for i in range(5):
+        store.append(Turn("c", f"q{i}", f"q{i}", store.history("c")), f"a{i}")
+    assert [turn["question"] for turn in store.history("c")] == ["q2", "q3", "q4"]
+    assert store.history("unknown") == []
+
+
+def test_stateless_turns_are_not_stored(store):
+    store.append(Turn(None, "q", "q", []), "a")
+    assert store.stats()["conversations"] == 0
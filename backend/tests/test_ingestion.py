@@ -0,0 +1,270 @@
+"""
+Ingestion manifest and versioned document updates
+"""
+
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from bm25_index import BM25Index
+from config import settings
+from ingestion import IngestionPipeline, IngestManifest
+from local_index import LocalVectorStore
+
+DIMENSION = 8
+
+
+def words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+class FakeEmbeddings:
+    """Deterministic embeddings that record what was sent"""
+    
+    def __init__(self):
+        self.texts = []
+        self.during = None  # Called before each batch is embedded
+    
+    async def __call__(self, texts):
+        if self.during is not None:
+            self.during()
+        self.texts.extend(texts)
+        return [
+            [b / 255 for b in hashlib.sha256(text.encode()).digest()[:DIMENSION]]
+            for text in texts
+        ]
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "chunk_unit", "words")
+    monkeypatch.setattr(settings, "chunk_size", 20)
+    monkeypatch.setattr(settings, "chunk_overlap", 0)
+    store = LocalVectorStore(dimension=DIMENSION, mode="exact")
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite"), store.namespace)
+    pipeline = IngestionPipeline(
+        store,
+        manifest=manifest,
+        embed=FakeEmbeddings(),
+        lexical=BM25Index(),
+        batch_size=4,
+        processes=1
+    )
+    yield pipeline
+    pipeline.close()
+
+
+def served(pipeline: IngestionPipeline, document_name: str) -> set:
+    """Ids retrieval may return for a document: stored and not hidden"""
+    ids = [
+        vector_id for vector_id, meta in zip(pipeline.store._ids, pipeline.store._metadata)
+        if meta['document_name'] == document_name
+    ]
+    return set(ids) - pipeline.manifest.hidden(ids)
+
+
+def test_publish_swaps_versions_and_stages_retired_ids(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite"), "test")
+    manifest.stage("doc", ["doc_0@a", "doc_1@b"])
+    assert manifest.hidden(["doc_0@a", "doc_1@b", "other"]) == {"doc_0@a", "doc_1@b"}
+    
+    manifest.publish("doc", [("doc_0@a", "ha"), ("doc_1@b", "hb")], [], (10, 1))
+    assert manifest.chunk_hashes("doc") == {"doc_0@a": "ha", "doc_1@b": "hb"}
+    assert manifest.hidden(["doc_0@a", "doc_1@b"]) == set()
+    assert manifest.file_signatures() == {"doc": (10, 1)}
+    
+    manifest.publish("doc", [("doc_1@c", "hc")], ["doc_1@b"], (12, 2))
+    assert manifest.chunk_hashes("doc") == {"doc_0@a": "ha", "doc_1@c": "hc"}
+    # Retired ids stay hidden until they are deleted from the store and unstaged
+    assert manifest.staged("doc") == ["doc_1@b"]
+    
+    manifest.publish("doc", [], ["doc_0@a", "doc_1@c"])
+    assert manifest.chunk_hashes("doc") == {}
+    assert manifest.file_signatures() == {}
+    assert sorted(manifest.staged("doc")) == ["doc_0@a", "doc_1@b", "doc_1@c"]
+
+
+def test_manifest_is_scoped_by_namespace(tmp_path):
+    path = str(tmp_path / "manifest.sqlite")
+    IngestManifest(path, "a").publish("doc", [("doc_0@a", "ha")], [], (1, 1))
+    assert IngestManifest(path, "b").documents() == []
+    assert IngestManifest(path, "a").documents() == ["doc"]
+
+
+def test_lease_is_exclusive_until_released_or_expired(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite"), "test")
+    assert manifest.acquire_lease("doc", "one", 30)
+    assert not manifest.acquire_lease("doc", "two", 30)
+    assert manifest.acquire_lease("doc", "one", 30)  # Renewal
+    manifest.release_lease("doc", "one")
+    assert manifest.acquire_lease("doc", "two", -1)
+    assert manifest.acquire_lease("doc", "one", 30)  # "two" expired
+
+
+def test_update_embeds_only_changed_chunks_and_retires_old_ones(pipeline):
+    first = " ".join(words(p, 20) for p in "abc").encode()
+    stats = asyncio.run(pipeline.ingest_document("doc.txt", first))
+    assert stats["chunks_embedded"] == 3
+    version_one = served(pipeline, "doc.txt")
+    assert len(version_one) == 3 and all("@" in vector_id for vector_id in version_one)
+    
+    second = " ".join(words(p, 20) for p in "axc").encode()
+    pipeline.embed.texts.clear()
+    stats = asyncio.run(pipeline.ingest_document("doc.txt", second))
+    assert (stats["chunks_embedded"], stats["chunks_skipped"], stats["chunks_deleted"]) == (1, 2, 1)
+    assert pipeline.embed.texts == [words("x", 20)]
+    
+    version_two = served(pipeline, "doc.txt")
+    assert len(version_two) == 3 and len(version_one & version_two) == 2
+    # The retired vector is gone from the store, the manifest and BM25
+    assert set(pipeline.store._ids) == version_two
+    assert set(pipeline.manifest.chunk_hashes("doc.txt")) == version_two
+    assert pipeline.lexical.search("b0") == []
+    assert pipeline.lexical.search("x0")[0][0] in version_two - version_one
+    assert pipeline.manifest.staged("doc.txt") == []
+
+
+def test_new_version_stays_hidden_until_published(pipeline):
+    asyncio.run(pipeline.ingest_document("doc.txt", words("a", 40).encode()))
+    version_one = served(pipeline, "doc.txt")
+    seen = []
+    pipeline.embed.during = lambda: seen.append(served(pipeline, "doc.txt"))
+    
+    asyncio.run(pipeline.ingest_document("doc.txt", words("b", 40).encode()))
+    # Mid-update, retrieval still sees exactly the old version
+    assert seen and all(ids == version_one for ids in seen)
+    assert served(pipeline, "doc.txt").isdisjoint(version_one)
+
+
+def test_failed_update_keeps_serving_previous_version(pipeline):
+    asyncio.run(pipeline.ingest_document("doc.txt", words("a", 40).encode()))
+    version_one = served(pipeline, "doc.txt")
+    
+    calls = []
+    
+    def fail_second_batch():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("embeddings down")
+    
+    pipeline.embed.during = fail_second_batch
+    pipeline.batch_size = 1
+    with pytest.raises(RuntimeError):
+        asyncio.run(pipeline.ingest_document("doc.txt", words("b", 40).encode()))
+    
+    assert served(pipeline, "doc.txt") == version_one
+    assert set(pipeline.store._ids) == version_one  # Staged vectors were discarded
+    assert pipeline.manifest.staged("doc.txt") == []
+
+
+def test_run_updates_changed_files_and_prunes_removed_ones(pipeline, tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "keep.txt").write_text(words("k", 40))
+    (root / "edit.txt").write_text(words("e", 40))
+    (root / "gone.txt").write_text(words("g", 20))
+    stats = asyncio.run(pipeline.run(root))
+    assert stats["chunks_embedded"] == 5
+    kept = served(pipeline, "keep.txt")
+    
+    (root / "edit.txt").write_text(words("e", 20) + " " + words("z", 20))
+    (root / "gone.txt").unlink()
+    pipeline.embed.texts.clear()
+    stats = asyncio.run(pipeline.run(root))
+    assert (stats["files_unchanged"], stats["files_changed"], stats["files_removed"]) == (1, 1, 1)
+    assert pipeline.embed.texts == [words("z", 20)]
+    
+    assert served(pipeline, "keep.txt") == kept
+    assert len(served(pipeline, "edit.txt")) == 2
+    assert served(pipeline, "gone.txt") == set()
+    assert sorted(pipeline.manifest.documents()) == ["edit.txt", "keep.txt"]
+    assert set(pipeline.store._ids) == {
+        vector_id for name in ("edit.txt", "keep.txt")
+        for vector_id in pipeline.manifest.chunk_hashes(name)
+    }
+
+
+def test_first_run_replaces_vectors_of_a_baseline_index(pipeline, tmp_path):
+    # An index built before versioned ids: plain position ids, no manifest
+    baseline = [
+        {'chunk_index': i, 'content': words(p, 20), 'word_count': 20}
+        for i, p in enumerate("ab")
+    ]
+    pipeline.store.upsert_chunks(baseline, [[1.0] * DIMENSION] * 2, "doc.txt")
+    assert set(pipeline.store._ids) == {"doc.txt_0", "doc.txt_1"}
+    
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "doc.txt").write_text(words("a", 20) + " " + words("b", 20))
+    asyncio.run(pipeline.run(root))
+    
+    version = set(pipeline.manifest.chunk_hashes("doc.txt"))
+    assert len(version) == 2 and all("@" in vector_id for vector_id in version)
+    assert set(pipeline.store._ids) == version
+
+
+def test_forced_run_replaces_previous_versions(pipeline, tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "doc.txt").write_text(words("a", 40))
+    asyncio.run(pipeline.run(root))
+    (root / "doc.txt").write_text(words("b", 40))
+    
+    stats = asyncio.run(pipeline.run(root, force=True))
+    assert stats["chunks_embedded"] == 2
+    assert set(pipeline.store._ids) == set(pipeline.manifest.chunk_hashes("doc.txt"))
+    assert len(pipeline.store._ids) == 2
+
+
+def test_api_update_replaces_vectors_of_a_baseline_index(pipeline):
+    pipeline.store.upsert_chunks(
+        [{'chunk_index': 0, 'content': words("old", 20), 'word_count': 20}],
+        [[1.0] * DIMENSION], "doc.txt"
+    )
+    asyncio.run(pipeline.ingest_document("doc.txt", words("new", 20).encode()))
+    assert set(pipeline.store._ids) == set(pipeline.manifest.chunk_hashes("doc.txt"))
+    assert len(pipeline.store._ids) == 1
+
+
+def test_run_waits_for_a_document_leased_by_an_api_job(pipeline, tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "busy.txt").write_text(words("b", 20))
+    (root / "free.txt").write_text(words("f", 20))
+    assert pipeline.manifest.acquire_lease("busy.txt", "job-1", 30)
+    
+    async def scenario():
+        run = asyncio.create_task(pipeline.run(root))
+        await asyncio.sleep(0.3)
+        assert not run.done()
+        # The run does not touch the leased document until the job lets go
+        assert pipeline.manifest.chunk_hashes("busy.txt") == {}
+        pipeline.manifest.release_lease("busy.txt", "job-1")
+        return await asyncio.wait_for(run, 5)
+    
+    stats = asyncio.run(scenario())
+    assert stats["files_changed"] == 2
+    assert len(pipeline.manifest.chunk_hashes("busy.txt")) == 1
+    # Leases are given back once each document is published
+    assert pipeline.manifest.acquire_lease("busy.txt", "job-2", 30)
+    assert pipeline.manifest.acquire_lease("free.txt", "job-2", 30)
+
+
+def test_run_refuses_while_a_server_holds_the_indexes(pipeline, tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "doc.txt").write_text(words("a", 20))
+    pipeline.manifest.hold_indexes(os.getpid() + 1, 30)
+    with pytest.raises(RuntimeError, match="serve.py"):
+        asyncio.run(pipeline.run(root))
+    assert pipeline.manifest.chunk_hashes("doc.txt") == {}
+    
+    # Its own hold, or one left by a server that died, does not count
+    pipeline.manifest.hold_indexes(os.getpid() + 1, -1)
+    pipeline.manifest.hold_indexes(os.getpid(), 30)
+    assert asyncio.run(pipeline.run(root))["files_changed"] == 1
+    
+    pipeline.manifest.release_indexes(os.getpid())
+    assert pipeline.manifest.index_holders() == set()
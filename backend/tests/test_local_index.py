@@ -0,0 +1,173 @@
+"""
+Local vector index: search, journal and compaction, codecs and IVF-PQ
+"""
+
+import numpy as np
+import pytest
+
+import local_index
+from config import settings
+from local_index import LocalVectorStore
+from quantization import VectorCodec
+
+DIMENSION = 16
+
+
+def chunks(count: int, start: int = 0):
+    return [
+        {'chunk_index': start + i, 'content': f"chunk {start + i}", 'word_count': 2}
+        for i in range(count)
+    ]
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def brute_force(store: LocalVectorStore, vectors: dict, query: np.ndarray, k: int):
+    ids = list(store._ids)
+    scores = unit(np.array([vectors[vector_id] for vector_id in ids])) @ unit(query)
+    return [ids[row] for row in np.argsort(-scores)[:k]]
+
+
+@pytest.fixture
+def ann_settings(monkeypatch):
+    monkeypatch.setattr(settings, "ann_pq_m", 4)
+    monkeypatch.setattr(settings, "ann_nlist", 8)
+    monkeypatch.setattr(settings, "ann_nprobe", 8)
+    monkeypatch.setattr(settings, "ann_min_vectors", 200)
+
+
+def test_exact_search_matches_brute_force():
+    rng = np.random.default_rng(0)
+    store = LocalVectorStore(dimension=DIMENSION, mode="exact", codec=VectorCodec("float32"))
+    embeddings = rng.normal(size=(50, DIMENSION))
+    store.upsert_chunks(chunks(50), embeddings.tolist(), "doc")
+    vectors = dict(zip(store._ids, embeddings))
+    
+    for query in rng.normal(size=(5, DIMENSION)):
+        results = store.search(query.tolist(), top_k=5)
+        assert [r['id'] for r in results] == brute_force(store, vectors, query, 5)
+        assert results[0]['content'].startswith("chunk ")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compressed_codecs_keep_scores_close(dtype):
+    rng = np.random.default_rng(1)
+    codec = VectorCodec(dtype)
+    vectors = codec.prepare(rng.normal(size=(100, DIMENSION)))
+    codes, scales = codec.encode(vectors)
+    queries = codec.prepare(rng.normal(size=(4, DIMENSION)))
+    
+    exact = queries @ vectors.T
+    assert np.abs(codec.scores_batch(codes, scales, queries) - exact).max() < 0.02
+    assert np.abs(codec.decode(codes, scales) - vectors).max() < 0.01
+
+
+def test_truncation_renormalizes():
+    codec = VectorCodec("float32", dimensions=8)
+    prepared = codec.prepare(np.random.default_rng(2).normal(size=(3, DIMENSION)))
+    assert prepared.shape == (3, 8)
+    assert np.allclose(np.linalg.norm(prepared, axis=1), 1.0)
+
+
+def test_journal_replays_upserts_and_deletes(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_index, "_COMPACT_MIN_ROWS", 10 ** 9)
+    rng = np.random.default_rng(3)
+    store = LocalVectorStore(str(tmp_path), dimension=DIMENSION, mode="exact",
+                             codec=VectorCodec("float32"))
+    store.upsert_chunks(chunks(20), rng.normal(size=(20, DIMENSION)).tolist(), "a")
+    store.upsert_chunks(chunks(10), rng.normal(size=(10, DIMENSION)).tolist(), "b")
+    store.upsert_chunks(chunks(5), rng.normal(size=(5, DIMENSION)).tolist(), "a")  # Overwrites
+    store.delete_chunks(["a_3"])
+    store.delete_document("b")
+    
+    # Every write is a journal segment; no snapshot has been written yet
+    assert not (tmp_path / "vectors.npy").exists()
+    assert len(list((tmp_path / "segments").glob("*.npz"))) == 5
+    
+    reloaded = LocalVectorStore(str(tmp_path), dimension=DIMENSION, mode="exact",
+                                codec=VectorCodec("float32"))
+    reloaded.connect()
+    assert reloaded._ids == store._ids
+    assert reloaded._metadata == store._metadata
+    assert np.array_equal(reloaded._snapshot.vectors, store._snapshot.vectors)
+    assert reloaded.count == 19
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_index, "_COMPACT_MIN_ROWS", 30)
+    rng = np.random.default_rng(4)
+    store = LocalVectorStore(str(tmp_path), dimension=DIMENSION, mode="exact",
+                             codec=VectorCodec("int8"))
+    for batch in range(4):
+        store.upsert_chunks(chunks(10), rng.normal(size=(10, DIMENSION)).tolist(), f"d{batch}")
+    
+    assert (tmp_path / "vectors.npy").exists()
+    # Only writes after the last snapshot remain in the journal
+    assert len(list((tmp_path / "segments").glob("*.npz"))) == 1
+    
+    reloaded = LocalVectorStore(str(tmp_path), dimension=DIMENSION, mode="exact",
+                                codec=VectorCodec("int8"))
+    reloaded.connect()
+    assert reloaded._ids == store._ids
+    assert np.array_equal(reloaded._snapshot.vectors, store._snapshot.vectors)
+    assert np.array_equal(reloaded._snapshot.scales, store._snapshot.scales)
+
+
+def test_reload_converts_stored_dtype(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_index, "_COMPACT_MIN_ROWS", 10)
+    rng = np.random.default_rng(5)
+    store = LocalVectorStore(str(tmp_path), dimension=DIMENSION, mode="exact",
+                             codec=VectorCodec("float32"))
+    store.upsert_chunks(chunks(20), rng.normal(size=(20, DIMENSION)).tolist(), "a")
+    query = rng.normal(size=DIMENSION).tolist()
+    
+    converted = LocalVectorStore(str(tmp_path), dimension=DIMENSION, mode="exact",
+                                 codec=VectorCodec("int8"))
+    converted.connect()
+    assert converted._snapshot.vectors.dtype == np.int8
+    assert converted.search(query, 1)[0]['id'] == store.search(query, 1)[0]['id']
+
+
+def test_overwrite_does_not_change_published_snapshot():
+    rng = np.random.default_rng(6)
+    store = LocalVectorStore(dimension=DIMENSION, mode="exact", codec=VectorCodec("float32"))
+    store.upsert_chunks(chunks(10), rng.normal(size=(10, DIMENSION)).tolist(), "a")
+    published = store._snapshot
+    before = published.vectors.copy()
+    
+    store.upsert_chunks(chunks(1), rng.normal(size=(1, DIMENSION)).tolist(), "a")
+    assert np.array_equal(published.vectors, before)
+    assert not np.array_equal(store._snapshot.vectors[0], before[0])
+
+
+def test_ivfpq_trains_and_finds_exact_neighbours(tmp_path, ann_settings):
+    rng = np.random.default_rng(7)
+    centers = rng.normal(size=(8, DIMENSION)) * 4
+    embeddings = centers[rng.integers(0, 8, 400)] + rng.normal(size=(400, DIMENSION))
+    store = LocalVectorStore(str(tmp_path), dimension=DIMENSION, mode="ivfpq",
+                             codec=VectorCodec("float32"))
+    for batch in range(4):
+        store.upsert_chunks(
+            chunks(100), embeddings[batch * 100:(batch + 1) * 100].tolist(), f"d{batch}"
+        )
+    assert store.ann.is_trained and store.ann.count == 400
+    vectors = dict(zip(store._ids, embeddings))
+    
+    found = total = 0
+    for query in rng.normal(size=(20, DIMENSION)):
+        expected = set(brute_force(store, vectors, query, 5))
+        found += len(expected & {r['id'] for r in store.search(query.tolist(), top_k=5)})
+        total += 5
+    assert found / total >= 0.9
+    
+    # Deleted ids leave the approximate index too, also after a reload
+    store.delete_document("d0")
+    assert store.ann.count == 300
+    reloaded = LocalVectorStore(str(tmp_path), dimension=DIMENSION, mode="ivfpq",
+                                codec=VectorCodec("float32"))
+    reloaded.connect()
+    assert reloaded.ann.is_trained and reloaded.ann.count == 300
+    results = reloaded.search(embeddings[150].tolist(), top_k=1)
+    assert results[0]['id'] == "d1_50"
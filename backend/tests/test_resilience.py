@@ -0,0 +1,105 @@
+"""
+Circuit breaker and upstream call policy
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, Upstream, UpstreamUnavailable, is_retryable
+
+
+def open_breaker(reset_seconds: float = 0.05) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=reset_seconds)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+async def ok(timeout: float) -> str:
+    return "ok"
+
+
+def test_cancelled_probe_releases_half_open_breaker():
+    async def scenario():
+        breaker = open_breaker()
+        upstream = Upstream("test", deadline=5.0, breaker=breaker)
+        time.sleep(0.06)
+        
+        started = asyncio.Event()
+        
+        async def hang(timeout: float):
+            started.set()
+            await asyncio.sleep(60)
+        
+        probe = asyncio.create_task(upstream.call(hang))
+        await started.wait()
+        with pytest.raises(UpstreamUnavailable):
+            await upstream.call(ok)  # The probe is still in flight
+        
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        
+        assert await upstream.call(ok) == "ok"
+        assert breaker.state == CircuitBreaker.CLOSED
+    
+    asyncio.run(scenario())
+
+
+def test_probe_rejected_before_first_attempt_releases_breaker():
+    breaker = open_breaker()
+    upstream = Upstream("test", deadline=5.0, max_concurrency=1, breaker=breaker)
+    time.sleep(0.06)
+    
+    upstream._threads.acquire()  # No free slot: the probe times out waiting
+    with pytest.raises(UpstreamUnavailable, match="no free slot"):
+        upstream.call_sync(lambda timeout: "ok", deadline=0.01)
+    upstream._threads.release()
+    
+    assert upstream.call_sync(lambda timeout: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = open_breaker()
+    upstream = Upstream("test", deadline=5.0, breaker=breaker)
+    time.sleep(0.06)
+    
+    def fail(timeout: float):
+        raise ConnectionError("down")
+    
+    with pytest.raises(UpstreamUnavailable):
+        upstream.call_sync(fail)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(UpstreamUnavailable, match="circuit open"):
+        upstream.call_sync(lambda timeout: "ok")
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_conflict_is_not_retried():
+    assert not is_retryable(StatusError(409))
+    assert is_retryable(StatusError(429))
+
+
+def test_probe_refused_with_non_retryable_error_keeps_breaker_half_open():
+    breaker = open_breaker()
+    upstream = Upstream("test", deadline=5.0, breaker=breaker)
+    time.sleep(0.06)
+    
+    def bad_request(timeout: float):
+        raise StatusError(400)
+    
+    with pytest.raises(StatusError):
+        upstream.call_sync(bad_request)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    
+    # The probe was released: the next call probes, and its success closes
+    assert upstream.call_sync(lambda timeout: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,42 @@
+"""
+Vector retrieval with hidden (staged or retired) chunks
+"""
+
+import asyncio
+
+import numpy as np
+
+import retrieval
+from local_index import LocalVectorStore
+
+
+class StagedVersion:
+    """Stands in for the document manager while a version is being written"""
+    
+    def __init__(self, hidden: set):
+        self._hidden = hidden
+    
+    def hidden(self, vector_ids):
+        return self._hidden & set(vector_ids)
+    
+    def hidden_count(self):
+        return len(self._hidden)
+
+
+def test_hidden_chunks_do_not_shorten_results(monkeypatch):
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=8)
+    store = LocalVectorStore(dimension=8, mode="exact")
+    chunks = lambda n: [{'chunk_index': i, 'content': f"c{i}", 'word_count': 1} for i in range(n)]
+    # The staged version sits right on top of the query; the served one further away
+    store.upsert_chunks(chunks(5), (query + rng.normal(size=(5, 8)) * 0.01).tolist(), "new")
+    store.upsert_chunks(chunks(10), rng.normal(size=(10, 8)).tolist(), "old")
+    staged = {f"new_{i}" for i in range(5)}
+    
+    monkeypatch.setattr(retrieval, "vector_store", store)
+    monkeypatch.setattr(retrieval, "lexical_index", None)
+    monkeypatch.setattr(retrieval, "document_manager", StagedVersion(staged))
+    
+    results = asyncio.run(retrieval._retrieve(["q"], [query.tolist()], top_k=4))[0]
+    assert len(results) == 4
+    assert all(chunk['document_name'] == "old" for chunk in results)
@@ -0,0 +1,185 @@
+"""
+Token counting for chunking and context packing
+Uses tiktoken when it is installed and its encoding can be loaded,
+otherwise a regex approximation of BPE token counts
+"""
+
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import logging
+import math
+import re
+import threading
+
+from config import settings
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Words, numbers and punctuation pieces, roughly as a BPE pre-tokenizer sees them
+_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]|\S")
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Estimate BPE tokens without a vocabulary
+    
+    Short words are usually one token and longer ones split roughly every
+    six characters, which lands within ~10% of cl100k_base on English prose.
+    """
+    return sum(math.ceil(len(piece) / 6) for piece in _PIECES.findall(text))
+
+
+class Tokenizer:
+    """Token counter with a bounded cache and batched encoding"""
+    
+    def __init__(
+        self,
+        encoding_name: Optional[str] = None,
+        model: Optional[str] = None,
+        cache_size: int = 65536
+    ):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._encoding_name = encoding_name
+        self._model = model
+        self._encoding = None
+        self._loaded = False
+    
+    @property
+    def encoding(self):
+        """The tiktoken encoding, or None to use the approximation (loaded on first use)"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._encoding = self._load_encoding()
+                    self._loaded = True
+        return self._encoding
+    
+    def _load_encoding(self):
+        if tiktoken is None:
+            return None
+        try:
+            if self._encoding_name:
+                return tiktoken.get_encoding(self._encoding_name)
+            try:
+                return tiktoken.encoding_for_model(self._model or "")
+            except KeyError:
+                return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # The BPE files are downloaded on first use; work offline too
+            logger.warning("tiktoken encoding unavailable (%s), using approximate token counts", type(e).__name__)
+            return None
+    
+    @property
+    def name(self) -> str:
+        return self.encoding.name if self.encoding is not None else "approximate"
+    
+    def count(self, text: str) -> int:
+        """Number of tokens in text"""
+        return self.count_batch([text])[0]
+    
+    def count_batch(self, texts: List[str], cache: bool = True) -> List[int]:
+        """
+        Count tokens for many texts, encoding cache misses in one batch
+        
+        tiktoken encodes batches on a thread pool outside the GIL, which is
+        much faster than encoding texts one by one during ingestion.
+        
+        Args:
+            texts: Texts to count
+            cache: Remember the counts (pass False for large one-off texts
+                such as whole chunks, so they don't evict sentences)
+        
+        Returns:
+            Token count per text
+        """
+        if not cache:
+            return self._encode_counts(texts)
+        
+        counts: List[Optional[int]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        
+        with self._lock:
+            for i, text in enumerate(texts):
+                cached = self._cache.get(text)
+                if cached is None:
+                    missing.setdefault(text, []).append(i)
+                else:
+                    self._cache.move_to_end(text)
+                    counts[i] = cached
+            self.hits += len(texts) - sum(len(positions) for positions in missing.values())
+            self.misses += sum(len(positions) for positions in missing.values())
+        
+        if missing:
+            pending = list(missing)
+            computed = self._encode_counts(pending)
+            
+            with self._lock:
+                for text, count in zip(pending, computed):
+                    for i in missing[text]:
+                        counts[i] = count
+                    self._cache[text] = count
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        return counts
+    
+    def _encode_counts(self, texts: List[str]) -> List[int]:
+        encoding = self.encoding
+        if encoding is None:
+            return [approximate_tokens(text) for text in texts]
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+    
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """Cut text into pieces of at most max_tokens (for oversized sentences)"""
+        encoding = self.encoding
+        if encoding is not None:
+            tokens = encoding.encode_ordinary(text)
+            return [
+                encoding.decode(tokens[start:start + max_tokens]).strip()
+                for start in range(0, len(tokens), max_tokens)
+            ]
+        
+        pieces = []
+        current = []
+        current_tokens = 0
+        for word in text.split():
+            word_tokens = approximate_tokens(word)
+            if current and current_tokens + word_tokens > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+                current_tokens = 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            pieces.append(" ".join(current))
+        return pieces
+    
+    def stats(self) -> Dict:
+        """Cache counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "encoding": self.name,
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global tokenizer, matched to the embedding model unless overridden
+tokenizer = Tokenizer(
+    encoding_name=settings.tokenizer_encoding,
+    model=settings.embedding_model,
+    cache_size=settings.tokenizer_cache_size
+)
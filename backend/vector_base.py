@@ -0,0 +1,165 @@
+"""
+Vector store interface shared by the Pinecone and local backends
+"""
+
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import threading
+
+
+def chunk_vector_id(chunk: Dict, document_name: str) -> str:
+    """Stable vector id for a chunk of a document (or the id assigned to the chunk)"""
+    return chunk.get('vector_id') or f"{document_name}_{chunk['chunk_index']}"
+
+
+def chunk_metadata(chunk: Dict, document_name: str, include_content: bool = True) -> Dict:
+    """Metadata stored alongside each chunk's vector (text optional)"""
+    metadata = {
+        'document_name': document_name,
+        'word_count': chunk['word_count'],
+        'chunk_index': chunk['chunk_index']
+    }
+    if include_content:
+        metadata['content'] = chunk['content']
+    # Token counts let retrieval pack context precisely; streaming chunkers
+    # also record where the chunk came from in the file, and extractors the
+    # page and headings it sits under
+    for key in ('token_count', 'byte_start', 'byte_end', 'page', 'heading'):
+        if key in chunk:
+            metadata[key] = chunk[key]
+    return metadata
+
+
+class BaseVectorStore(ABC):
+    """
+    Interface shared by all vector store backends
+    
+    Construction does no I/O. Backends open their connection or files in
+    _connect(), run once by connect(): on first use, or ahead of time by
+    the API's startup task.
+    """
+    
+    backend_name = "base"
+    
+    @property
+    def namespace(self) -> str:
+        """Identifies the physical index, e.g. for ingestion bookkeeping"""
+        return self.backend_name
+    
+    def __init__(self, executor_threads: int = 8):
+        # Backends are synchronous; async callers run operations here
+        self._executor = ThreadPoolExecutor(
+            max_workers=executor_threads,
+            thread_name_prefix=f"{self.backend_name}-store"
+        )
+        self._connect_lock = threading.Lock()
+        self._connected = False
+    
+    @property
+    def connected(self) -> bool:
+        """Whether connect() has completed"""
+        return self._connected
+    
+    def connect(self):
+        """Connect to the backend if not done yet (safe to call from any thread)"""
+        if not self._connected:
+            with self._connect_lock:
+                if not self._connected:
+                    self._connect()
+                    self._connected = True
+    
+    def _connect(self):
+        """Open the backend; runs once, before any other operation"""
+    
+    @abstractmethod
+    def upsert_chunks(
+        self,
+        chunks: List[Dict],
+        embeddings: List[List[float]],
+        document_name: str
+    ) -> int:
+        """Store document chunks with embeddings, returning the number stored"""
+    
+    @abstractmethod
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Return the top_k most similar chunks, best first"""
+    
+    @abstractmethod
+    def fetch(self, vector_ids: List[str]) -> List[Dict]:
+        """Return stored chunks, including their 'values', for the ids that exist"""
+    
+    @abstractmethod
+    def delete_document(self, document_name: str) -> bool:
+        """Delete all chunks for a document"""
+    
+    @abstractmethod
+    def delete_chunks(self, vector_ids: List[str]) -> int:
+        """Delete chunks by vector id, returning how many were requested"""
+    
+    @abstractmethod
+    def get_stats(self) -> Dict:
+        """Get index statistics (must include total_vector_count)"""
+    
+    def needs_content(self) -> bool:
+        """True when chunk text is kept outside the index and has been lost"""
+        return False
+    
+    def store_content(self, chunks: List[Dict], document_name: str) -> int:
+        """Re-store chunk text kept outside the index (no-op when the index holds it)"""
+        return 0
+    
+    async def search_async(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Run search on the store's thread pool without blocking the event loop"""
+        return await self._run_in_executor(
+            self.search, query_embedding, top_k, filter_dict
+        )
+    
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """Search for several queries at once; results are in query order"""
+        return [self.search(embedding, top_k, filter_dict) for embedding in query_embeddings]
+    
+    async def search_batch_async(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """Run every query concurrently on the store's thread pool"""
+        return list(await asyncio.gather(*(
+            self.search_async(embedding, top_k, filter_dict)
+            for embedding in query_embeddings
+        )))
+    
+    async def connect_async(self):
+        """Async variant of connect"""
+        await self._run_in_executor(self.connect)
+    
+    async def fetch_async(self, vector_ids: List[str]) -> List[Dict]:
+        """Async variant of fetch"""
+        return await self._run_in_executor(self.fetch, vector_ids)
+    
+    async def get_stats_async(self) -> Dict:
+        """Async variant of get_stats"""
+        return await self._run_in_executor(self.get_stats)
+    
+    async def _run_in_executor(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
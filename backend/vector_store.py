@@ -1,30 +1,76 @@
 """
-Vector database integration using Pinecone
+Vector database integration using Pinecone or a local in-process index
 """
 
 from typing import List, Dict, Optional
-from pinecone import Pinecone, ServerlessSpec
 from config import settings
+from content_store import ContentStore
+from resilience import pinecone_upstream
+from vector_base import BaseVectorStore, chunk_vector_id, chunk_metadata
+import logging
 import time
 
 
-class VectorStore:
-    """Pinecone vector store for document embeddings"""
+logger = logging.getLogger(__name__)
+
+
+class PineconeVectorStore(BaseVectorStore):
+    """
+    Pinecone vector store for document embeddings
+    
+    With a content store, Pinecone metadata holds only the small filterable
+    fields; chunk text lives in the local store and queries skip metadata.
+    """
     
-    def __init__(self):
-        self.pc = Pinecone(api_key=settings.pinecone_api_key)
+    backend_name = "pinecone"
+    
+    def __init__(self, content_store: Optional[ContentStore] = None):
+        super().__init__(executor_threads=settings.pinecone_pool_threads)
+        self.content_store = content_store
+        self.pc = None
         self.index_name = settings.pinecone_index_name
-        self.index = None
+        self._index = None
+    
+    @property
+    def index(self):
+        """The Pinecone index handle (connects on first use)"""
+        self.connect()
+        return self._index
+    
+    def _request(self, operation: str, **kwargs):
+        """
+        One data-plane request, with PINECONE_DEADLINE, retries and the circuit breaker
+        
+        Args:
+            operation: Index method name ("query", "fetch", "upsert", ...)
+            **kwargs: Its arguments
+        """
+        index = self.index
+        return pinecone_upstream.call_sync(
+            lambda timeout: getattr(index, operation)(**kwargs, _request_timeout=timeout)
+        )
+    
+    def _connect(self):
+        # Imported here: the SDK is slow to import and only needed once connected
+        from pinecone import Pinecone
+        
+        self.pc = Pinecone(
+            api_key=settings.pinecone_api_key,
+            host=settings.pinecone_host,
+            pool_threads=settings.pinecone_pool_threads
+        )
         self._ensure_index_exists()
     
     def _ensure_index_exists(self):
         """Create index if it doesn't exist"""
+        from pinecone import ServerlessSpec
+        
         try:
             # Check if index exists
             existing_indexes = self.pc.list_indexes().names()
             
             if self.index_name not in existing_indexes:
-                print(f"Creating Pinecone index: {self.index_name}")
+                logger.info("Creating Pinecone index: %s", self.index_name)
                 self.pc.create_index(
                     name=self.index_name,
                     dimension=settings.embedding_dimension,
@@ -37,11 +83,14 @@ class VectorStore:
                 # Wait for index to be ready
                 time.sleep(1)
             
-            self.index = self.pc.Index(self.index_name)
-            print(f"Connected to Pinecone index: {self.index_name}")
-            
+            self._index = self.pc.Index(
+                self.index_name,
+                host=settings.pinecone_index_host or ''
+            )
+            logger.info("Connected to Pinecone index: %s", self.index_name)
+        
         except Exception as e:
-            print(f"Error setting up Pinecone: {e}")
+            logger.error("Error setting up Pinecone: %s", e)
             raise
     
     def upsert_chunks(
@@ -61,27 +110,26 @@ class VectorStore:
         Returns:
             Number of chunks stored
         """
+        # Text goes in first so a search never finds a vector without it
+        if self.content_store is not None:
+            self.content_store.put(chunks, document_name)
+        
         vectors = []
         
         for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            vector_id = f"{document_name}_{chunk['chunk_index']}"
-            
             vectors.append({
-                'id': vector_id,
+                'id': chunk_vector_id(chunk, document_name),
                 'values': embedding,
-                'metadata': {
-                    'document_name': document_name,
-                    'content': chunk['content'],
-                    'word_count': chunk['word_count'],
-                    'chunk_index': chunk['chunk_index']
-                }
+                'metadata': chunk_metadata(
+                    chunk, document_name, include_content=self.content_store is None
+                )
             })
         
         # Upsert in batches of 100
         batch_size = 100
         for i in range(0, len(vectors), batch_size):
             batch = vectors[i:i + batch_size]
-            self.index.upsert(vectors=batch)
+            self._request("upsert", vectors=batch)
         
         return len(vectors)
     
@@ -102,39 +150,127 @@ class VectorStore:
         Returns:
             List of matching chunks with scores
         """
-        results = self.index.query(
+        results = self._request(
+            "query",
             vector=query_embedding,
             top_k=top_k,
-            include_metadata=True,
+            include_metadata=self.content_store is None,
             filter=filter_dict
         )
         
-        chunks = []
-        for match in results['matches']:
-            chunks.append({
-                'id': match['id'],
-                'score': match['score'],
-                'document_name': match['metadata']['document_name'],
-                'content': match['metadata']['content'],
-                'word_count': match['metadata']['word_count'],
-                'chunk_index': match['metadata']['chunk_index']
-            })
+        if self.content_store is None:
+            return [
+                {'id': match['id'], 'score': match['score'], **self._chunk_fields(match['metadata'])}
+                for match in results['matches']
+            ]
+        
+        # One local lookup for every match's text and fields
+        matches = results['matches']
+        stored = self.content_store.get_many([match['id'] for match in matches])
+        missing = [match['id'] for match in matches if match['id'] not in stored]
+        if missing:
+            # Vectors upserted before the content store was enabled
+            for chunk in self.fetch(missing):
+                if chunk['content']:
+                    chunk.pop('values')
+                    stored[chunk.pop('id')] = chunk
         
+        chunks = [
+            {'id': match['id'], 'score': match['score'], **stored[match['id']]}
+            for match in matches
+            if match['id'] in stored
+        ]
+        if len(chunks) < len(matches):
+            logger.warning(
+                "%d matches have no stored text; run load_documents.py to restore it",
+                len(matches) - len(chunks)
+            )
         return chunks
     
+    def fetch(self, vector_ids: List[str]) -> List[Dict]:
+        """Fetch chunks with their vectors by id, 100 ids per request"""
+        stored = self.content_store.get_many(vector_ids) if self.content_store is not None else {}
+        chunks = []
+        for i in range(0, len(vector_ids), 100):
+            response = self._request("fetch", ids=vector_ids[i:i + 100])
+            for vector_id, vector in response['vectors'].items():
+                chunks.append({
+                    'id': vector_id,
+                    'values': vector['values'],
+                    **(stored.get(vector_id) or self._chunk_fields(vector['metadata']))
+                })
+        return chunks
+    
+    @staticmethod
+    def _chunk_fields(metadata: Dict) -> Dict:
+        """Chunk fields stored in Pinecone metadata ('content' may be absent)"""
+        fields = {
+            'document_name': metadata['document_name'],
+            'content': metadata.get('content', ''),
+            'word_count': metadata['word_count'],
+            'token_count': metadata.get('token_count'),
+            'chunk_index': metadata['chunk_index']
+        }
+        # Pinecone returns every number as a float
+        if 'page' in metadata:
+            fields['page'] = int(metadata['page'])
+        if 'heading' in metadata:
+            fields['heading'] = metadata['heading']
+        return fields
+    
     def delete_document(self, document_name: str) -> bool:
         """Delete all chunks for a document"""
         try:
-            self.index.delete(filter={'document_name': document_name})
+            self._request("delete", filter={'document_name': document_name})
+            if self.content_store is not None:
+                self.content_store.delete_document(document_name)
             return True
         except Exception as e:
-            print(f"Error deleting document: {e}")
+            logger.warning("Error deleting document %s: %s", document_name, e)
             return False
     
+    def delete_chunks(self, vector_ids: List[str]) -> int:
+        """Delete chunks by vector id"""
+        batch_size = 1000
+        for i in range(0, len(vector_ids), batch_size):
+            self._request("delete", ids=vector_ids[i:i + batch_size])
+        if self.content_store is not None:
+            self.content_store.delete(vector_ids)
+        return len(vector_ids)
+    
     def get_stats(self) -> Dict:
         """Get index statistics"""
-        return self.index.describe_index_stats()
+        return self._request("describe_index_stats")
+    
+    def needs_content(self) -> bool:
+        return self.content_store is not None and not len(self.content_store)
+    
+    def store_content(self, chunks: List[Dict], document_name: str) -> int:
+        if self.content_store is None:
+            return 0
+        return self.content_store.put(chunks, document_name)
+    
+    @property
+    def namespace(self) -> str:
+        return f"pinecone:{self.index_name}"
+
+
+# Backwards-compatible name for the Pinecone backend
+VectorStore = PineconeVectorStore
+
+
+def create_vector_store() -> BaseVectorStore:
+    """Build the backend selected by settings.vector_backend"""
+    backend = settings.vector_backend.lower()
+    if backend == "pinecone":
+        return PineconeVectorStore(
+            ContentStore(settings.content_store_path) if settings.content_store_path else None
+        )
+    if backend == "local":
+        from local_index import LocalVectorStore
+        return LocalVectorStore(settings.local_index_path)
+    raise ValueError(f"Unknown vector backend: {settings.vector_backend}")
 
 
 # Global vector store instance
-vector_store = VectorStore()
+vector_store = create_vector_store()
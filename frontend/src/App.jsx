@@ -16,6 +16,8 @@ function App() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  // The backend keeps the history; follow-ups only send this id
+  const [conversationId, setConversationId] = useState(null);
 
   const sendMessage = async (e) => {
     e.preventDefault();
@@ -33,14 +35,14 @@ function App() {
     };
     setMessages(prev => [...prev, userMessage]);
 
-    await fetchAnswer(userQuestion, messages);
+    await fetchAnswer(userQuestion);
   };
 
   const selectDemoQuestion = (question) => {
     setInput(question);
   };
 
-  const fetchAnswer = async (userQuestion, previousMessages) => {
+  const fetchAnswer = async (userQuestion) => {
     try {
       // Call Python backend
       const response = await fetch(API_URL, {
@@ -50,19 +52,17 @@ function App() {
         },
         body: JSON.stringify({
           question: userQuestion,
-          conversation_history: previousMessages
-            .filter(m => m.role === 'user' || m.role === 'assistant')
-            .slice(-6)
-            .map(m => ({
-              question: m.role === 'user' ? m.content : '',
-              answer: m.role === 'assistant' ? m.content : ''
-            }))
-            .filter(m => m.question || m.answer)
+          conversation_id: conversationId,
+          new_conversation: !conversationId
         })
       });
 
       const data = await response.json();
 
+      if (data.conversation_id) {
+        setConversationId(data.conversation_id);
+      }
+
       if (data.success) {
         // Add assistant message
         setMessages(prev => [...prev, {